@@ -0,0 +1,40 @@
+"""
+Benchmark of the American approximations (Barone-Adesi-Whaley, Bjerksund-
+Stensland 2002): throughput of prices and greeks, and error vs a CRR lattice
+
+Usage: python -m benchmarks.bench_american [number of contracts] [lattice contracts]
+"""
+
+import sys
+import numpy as np
+from models.americanengine import AmericanEngine
+from models.bsengine import BSEngine
+from models.treeengine import TreeEngine
+from benchmarks.bench_kernels import random_options, timeit
+
+
+def main(n=1_000_000, m=1_000):
+    args = random_options(n)
+    # reference: 2000 steps CRR with Richardson on the first m contracts
+    sample = [a[:m] for a in args]
+    ref = TreeEngine("crr", 2000, richardson=True).greeks(*sample)
+    european = BSEngine().greeks(*sample)["Price"]
+
+    print("{} contracts (error vs lattice on {})".format(n, m))
+    print("{:>8} {:>12} {:>14} {:>12} {:>12} {:>12} {:>12}".format(
+        "engine", "time (s)", "contracts/s", "mean error", "max error", "delta error", "vega error"))
+    engines = [("bsm", BSEngine())] + [(m_, AmericanEngine(m_)) for m_ in AmericanEngine.methods]
+    for name, engine in engines:
+        t = timeit(lambda: engine.greeks(*args), repeat=1)
+        res = engine.greeks(*sample)
+        err = np.abs(res["Price"] - ref["Price"])
+        print("{:>8} {:>12.3f} {:>14.0f} {:>12.2e} {:>12.2e} {:>12.2e} {:>12.2e}".format(
+            name, t, n / t, err.mean(), err.max(),
+            np.abs(res["Delta"] - ref["Delta"]).max(), np.abs(res["Vega"] - ref["Vega"]).max()))
+    premium = ref["Price"] - european
+    print("early exercise premium of the lattice: mean {:.2e}, max {:.2e}".format(
+        premium.mean(), premium.max()))
+
+
+if __name__ == "__main__":
+    main(*[int(float(a)) for a in sys.argv[1:3]])
@@ -0,0 +1,53 @@
+"""
+Benchmark of the BSM engine: NumPy path vs numba JIT kernel
+
+Usage: python -m benchmarks.bench_kernels
+"""
+
+import time
+import numpy as np
+from models.bsengine import BSEngine
+from models import bskernel
+
+
+def random_options(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.random(n) < 0.5,
+        rng.uniform(50, 150, n),
+        rng.uniform(50, 150, n),
+        rng.uniform(0, 2, n),
+        rng.uniform(0, 0.05, n),
+        rng.uniform(0.05, 0.8, n),
+        rng.uniform(0, 0.03, n),
+    )
+
+
+def timeit(f, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    engines = {"numpy": BSEngine(kernel="numpy")}
+    if bskernel.kernel_available():
+        engines["numba"] = BSEngine(kernel="numba")
+        # compile outside of the timings
+        engines["numba"].greeks(*random_options(10))
+    else:
+        print("numba not installed: only the NumPy path is timed")
+
+    print("{:>10} {:>8} {:>12} {:>14}".format("options", "kernel", "time (s)", "options/s"))
+    for n in (10**3, 10**5, 10**7):
+        args = random_options(n)
+        for name, engine in engines.items():
+            t = timeit(lambda: engine.greeks(*args), repeat=3 if n < 10**7 else 1)
+            print("{:>10.0e} {:>8} {:>12.4f} {:>14.3e}".format(n, name, t, n / t))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Benchmark of the Monte Carlo engine: 1M paths x 252 steps of an Asian call
+
+Usage: python -m benchmarks.bench_montecarlo [number of paths]
+"""
+
+import sys
+import time
+from models.montecarlo import Asian, MCEngine
+
+
+def main(paths=10**6):
+    payoff = Asian("C", 100)
+    settings = {
+        "plain": dict(antithetic=False, control_variate=False),
+        "antithetic + cv": dict(),
+        "sobol + bridge + cv": dict(sampling="sobol"),
+    }
+    print("{} paths x 252 steps".format(paths))
+    print("{:>20} {:>10} {:>10} {:>10}".format("sampling", "time (s)", "price", "std err"))
+    for name, options in settings.items():
+        engine = MCEngine(paths=paths, steps=252, seed=0, **options)
+        start = time.perf_counter()
+        res = engine.price(payoff, 100, 1, 0.03, 0.25)
+        t = time.perf_counter() - start
+        print("{:>20} {:>10.3f} {:>10.4f} {:>10.2e}".format(name, t, res["Price"], res["StdErr"]))
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6)
@@ -0,0 +1,35 @@
+"""
+Scaling of the multi-process pricer from 1 to N cores
+
+Usage: python -m benchmarks.bench_parallel [number of options]
+"""
+
+import os
+import sys
+import time
+import numpy as np
+from models.parallel import ParallelPricer
+from benchmarks.bench_kernels import random_options
+
+
+def main(n=10**7):
+    args = random_options(n)
+    cores = os.cpu_count()
+    workers = sorted({1, 2, 4, 8, 16, 32, 64, cores} & set(range(1, cores + 1)))
+
+    print("{} options, {} cores".format(n, cores))
+    print("{:>8} {:>12} {:>10}".format("workers", "time (s)", "speedup"))
+    base = None
+    for w in workers:
+        with ParallelPricer(workers=w, shardsize=max(n // (4 * w), 1)) as pricer:
+            # warm the pool up (process start-up is paid once per pricer)
+            pricer.greeks(*[a[: 2 * pricer.shardsize] for a in args])
+            start = time.perf_counter()
+            pricer.greeks(*args)
+            t = time.perf_counter() - start
+        base = t if base is None else base
+        print("{:>8} {:>12.3f} {:>10.2f}".format(w, t, base / t))
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7)
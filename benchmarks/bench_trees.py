@@ -0,0 +1,34 @@
+"""
+Benchmark of the tree engine: 10k American contracts at 500 steps
+
+Usage: python -m benchmarks.bench_trees [number of contracts] [steps]
+"""
+
+import sys
+import time
+import numpy as np
+from models.treeengine import TreeEngine
+from benchmarks.bench_kernels import random_options
+
+
+def main(n=10_000, steps=500):
+    args = random_options(n)
+    # reference: 5000 steps CRR with Richardson on the first contracts
+    ref = TreeEngine("crr", 5000, richardson=True).price(*[a[:20] for a in args])
+
+    print("{} contracts, {} steps".format(n, steps))
+    print("{:>10} {:>11} {:>10} {:>14} {:>12}".format(
+        "method", "richardson", "time (s)", "contracts/s", "max error"))
+    for method in TreeEngine.methods:
+        for richardson in (False, True):
+            engine = TreeEngine(method, steps, richardson=richardson)
+            start = time.perf_counter()
+            price = engine.price(*args)
+            t = time.perf_counter() - start
+            err = np.abs(price[:20] - ref).max()
+            print("{:>10} {:>11} {:>10.3f} {:>14.0f} {:>12.2e}".format(
+                method, str(richardson), t, n / t, err))
+
+
+if __name__ == "__main__":
+    main(*[int(float(a)) for a in sys.argv[1:3]])
@@ -0,0 +1,48 @@
+"""
+Benchmark of the volatility surface: cold fit, warm refit after a quote
+move, and vectorized (K, T) queries
+
+Usage: python -m benchmarks.bench_volsurface [expiries] [strikes per expiry] [queries]
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from models.volsurface import VolSurface, ssvi_slices, svi_variance
+from benchmarks.bench_kernels import timeit
+
+
+def synthetic_chain(expiries, strikes, S=100, r=0.03, q=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    T = np.linspace(0.05, 3, expiries)
+    params = ssvi_slices(0.04 * T, -0.5, 1.0, 0.4)
+    K = np.linspace(0.5 * S, 1.6 * S, strikes)
+    rows = []
+    for t, p in zip(T, params):
+        k = np.log(K / (S * np.exp((r - q) * t)))
+        v = np.sqrt(svi_variance(k, *p) / t) * (1 + 0.002 * rng.standard_normal(strikes))
+        rows.append(pd.DataFrame({"CP": "C", "K": K, "T": t, "v": v}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def main(expiries=20, strikes=100, n=1_000_000):
+    chain = synthetic_chain(expiries, strikes)
+    moved = chain.assign(v=chain["v"] * 1.01)
+    rng = np.random.default_rng(1)
+    K, T = rng.uniform(50, 160, n), rng.uniform(0.01, 3.5, n)
+
+    print("{} expiries x {} strikes, {} queries".format(expiries, strikes, n))
+    print("{:>6} {:>12} {:>12} {:>12} {:>14} {:>12}".format(
+        "model", "fit (ms)", "refit (ms)", "rmse (bp)", "queries/s", "calendar"))
+    for model in VolSurface.models:
+        fit = timeit(lambda: VolSurface(chain, 100, 0.03, 0.01, model=model))
+        surface = VolSurface(chain, 100, 0.03, 0.01, model=model)
+        refit = timeit(lambda: surface.fit(moved))
+        rmse = np.sqrt(np.mean((surface.vol(moved["K"], moved["T"]) - moved["v"]) ** 2))
+        query = timeit(lambda: surface.vol(K, T))
+        print("{:>6} {:>12.1f} {:>12.1f} {:>12.2f} {:>14.0f} {:>12.1e}".format(
+            model, 1e3 * fit, 1e3 * refit, 1e4 * rmse, n / query, surface.calendar_arbitrage()))
+
+
+if __name__ == "__main__":
+    main(*[int(float(a)) for a in sys.argv[1:4]])
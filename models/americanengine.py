@@ -0,0 +1,326 @@
+"""
+Vectorized analytic approximations of American option prices:
+Barone-Adesi-Whaley (1987) and Bjerksund-Stensland (2002)
+"""
+
+import numpy as np
+from models.bsengine import BSEngine
+
+# Gauss-Legendre nodes and weights on [-1, 1] of the bivariate normal CDF
+_GL_NODES, _GL_WEIGHTS = np.polynomial.legendre.leggauss(20)
+
+
+class AmericanEngine(BSEngine):
+    """
+    BSEngine pricing American options with a closed-form approximation.
+
+    It is a drop-in engine of BSOpt and BSOptStrat: greeks() and
+    from_intermediates() return American prices, with Delta, Gamma, Theta and
+    Vega from bumps of the approximation evaluated together in one vectorized
+    pass (the bumped copies of the contracts are stacked). Options that are
+    never worth exercising early (calls without dividend yield, puts with
+    r <= 0) and dead options keep their BSM values, as do the second- and
+    third-order greeks of all_greeks() and the implied volatilities of IVSolver.
+
+    Methods:
+        "baw"   : Barone-Adesi-Whaley quadratic approximation. The critical
+                  price of every contract is found by a vectorized Newton
+                  iteration, all contracts iterating together until each
+                  one has converged
+        "bs2002": Bjerksund-Stensland 2002 two-step flat exercise boundary
+                  (explicit, no iteration, but 16 bivariate normal CDFs
+                  per price); puts come from the put-call transformation
+                  P(S, K, T, r, q, v) = C(K, S, T, q, r, v)
+
+    Both are more accurate for short maturities: see
+    benchmarks/bench_american.py for their errors vs a lattice.
+
+    The approximations are computed in float64 whatever the dtype,
+    the results are returned in the engine's dtype.
+
+    Args:
+        method : "baw" or "bs2002"
+        normal, dtype: as in BSEngine (the numba kernel is not used)
+        tol    : tolerance of the critical price iteration, relative to K
+        maxiter: maximum number of Newton steps
+    """
+
+    methods = ("baw", "bs2002")
+
+    def __init__(self, method="baw", normal=None, dtype=np.float64, tol=1e-8, maxiter=100):
+        if method not in AmericanEngine.methods:
+            raise ValueError("Method must be one of {}".format(", ".join(AmericanEngine.methods)))
+        super().__init__(normal=normal, dtype=dtype)
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+
+    @property
+    def model(self):
+        return self.method
+
+    def _european(self, phi, S, K, T, r, b, v):
+        """
+        Generalized BSM price (cost of carry b), E = exp((b - r) T), N(phi d1) and n(d1)
+        """
+        vsqrtT = v * np.sqrt(T)
+        d1 = (np.log(S / K) + (b + 0.5 * v**2) * T) / vsqrtT
+        E = np.exp((b - r) * T)
+        Nd1, Nd2 = self.N(phi * d1), self.N(phi * (d1 - vsqrtT))
+        price = phi * (S * E * Nd1 - K * np.exp(-r * T) * Nd2)
+        return price, E, Nd1, self.N(d1, cum=0)
+
+    def critical_price(self, phi, K, T, r, b, v):
+        """
+        Barone-Adesi-Whaley critical prices (calls phi = +1, puts phi = -1),
+        by Newton iteration from the seeds of Barone-Adesi and Whaley
+
+        Returns:
+            critical prices and the exponents of the early exercise premium
+        """
+        v2 = v**2
+        M, N = 2 * r / v2, 2 * b / v2
+        # 4 M / (1 - exp(-r T)), whose limit at r = 0 is 8 / (v^2 T)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            discounting = np.where(r == 0, 1 / T, r / -np.expm1(-r * T))
+        root = np.sqrt((N - 1) ** 2 + 8 * discounting / v2)
+        exponent = 0.5 * (1 - N + phi * root)
+
+        # seed: the perpetual critical price, pulled towards K for short maturities
+        perpetual = 0.5 * (1 - N + phi * np.sqrt((N - 1) ** 2 + 4 * M))
+        Sinf = K / (1 - 1 / perpetual)
+        vsqrtT = v * np.sqrt(T)
+        Sx = np.where(
+            phi > 0,
+            K + (Sinf - K) * -np.expm1(-(b * T + 2 * vsqrtT) * K / (Sinf - K)),
+            Sinf + (K - Sinf) * np.exp((b * T - 2 * vsqrtT) * K / (K - Sinf)),
+        )
+
+        # f(S*) = phi (S* - K) - price(S*) - phi (1 - E N(phi d1)) S* / exponent = 0
+        todo = np.arange(Sx.size)
+        for _ in range(self.maxiter):
+            p, k, t, rr, bb, vv, e = [x[todo] for x in (phi, K, T, r, b, v, exponent)]
+            s = Sx[todo]
+            price, E, Nd1, nd1 = self._european(p, s, k, t, rr, bb, vv)
+            f = p * (s - k) - price - p * (1 - E * Nd1) * s / e
+            slope = p * (1 - E * Nd1) - p * (1 - E * Nd1 - p * E * nd1 / (vv * np.sqrt(t))) / e
+            new = s - f / slope
+            # stay on the exercise side of the strike
+            Sx[todo] = np.where(p > 0, np.maximum(new, k), np.clip(new, 1e-12 * k, k))
+            todo = todo[np.abs(f) > self.tol * k]
+            if not todo.size:
+                break
+        return Sx, exponent
+
+    def _baw(self, phi, S, K, T, r, b, v):
+        """
+        Barone-Adesi-Whaley prices of live contracts that may be exercised early
+        """
+        Sx, exponent = self.critical_price(phi, K, T, r, b, v)
+        price, _, _, _ = self._european(phi, S, K, T, r, b, v)
+        _, E, Nd1, _ = self._european(phi, Sx, K, T, r, b, v)
+        A = phi * Sx / exponent * (1 - E * Nd1)
+        hold = phi * (S - Sx) < 0
+        return np.where(hold, price + A * (S / np.where(hold, Sx, S)) ** exponent, phi * (S - K))
+
+    def bivariate_normal(self, a, b, rho):
+        """
+        Bivariate standard normal CDF M(a, b; rho) for |rho| < 0.925, from
+        the Gauss-Legendre quadrature of Genz (2004)
+            M = N(a) N(b) + 1 / (2 pi) int_0^asin(rho) exp(-(a^2 + b^2 - 2 a b sin t) / (2 cos^2 t)) dt
+        """
+        a, b, rho = [np.asarray(x, dtype=float) for x in (a, b, rho)]
+        half = 0.5 * np.arcsin(rho)[..., None]
+        sin = np.sin(half * (_GL_NODES + 1))
+        cos2 = 1 - sin**2
+        integrand = np.exp((a[..., None] * b[..., None] * sin - 0.5 * (a**2 + b**2)[..., None]) / cos2)
+        integral = half[..., 0] * (integrand @ _GL_WEIGHTS)
+        return self.N(a) * self.N(b) + integral / (2 * np.pi)
+
+    def _bs2002_call(self, S, K, T, r, b, v):
+        """
+        Bjerksund-Stensland 2002 call prices (b < r, live contracts)
+        """
+        v2 = v**2
+        t1 = 0.5 * (np.sqrt(5) - 1) * T
+        beta = (0.5 - b / v2) + np.sqrt((b / v2 - 0.5) ** 2 + 2 * r / v2)
+        Binf = beta / (beta - 1) * K
+        B0 = np.where(r - b > 0, np.maximum(K, r / np.where(r - b > 0, r - b, 1.0) * K), K)
+        spread = (Binf - B0) * B0
+        I1 = B0 + (Binf - B0) * -np.expm1(-(b * t1 + 2 * v * np.sqrt(t1)) * K**2 / spread)
+        I2 = B0 + (Binf - B0) * -np.expm1(-(b * T + 2 * v * np.sqrt(T)) * K**2 / spread)
+        alpha1 = (I1 - K) * I1 ** -beta
+        alpha2 = (I2 - K) * I2 ** -beta
+
+        def drift(gamma):
+            return b + (gamma - 0.5) * v2
+
+        def power(gamma):
+            lam = -r + gamma * b + 0.5 * gamma * (gamma - 1) * v2
+            return lam, 2 * b / v2 + 2 * gamma - 1
+
+        def phi(t, gamma, H, I):
+            lam, kappa = power(gamma)
+            vsqrt = v * np.sqrt(t)
+            d = -(np.log(S / H) + drift(gamma) * t) / vsqrt
+            return np.exp(lam * t) * S**gamma * (
+                self.N(d) - (I / S) ** kappa * self.N(d - 2 * np.log(I / S) / vsqrt)
+            )
+
+        # t1 / T is the same for every contract
+        rho = np.sqrt(0.5 * (np.sqrt(5) - 1))
+
+        def psi(gamma, H):
+            lam, kappa = power(gamma)
+            mu1, mu2 = drift(gamma) * t1, drift(gamma) * T
+            s1, s2 = v * np.sqrt(t1), v * np.sqrt(T)
+            e1, e2 = np.log(S / I1), np.log(I2**2 / (S * I1))
+            f1, f2 = np.log(S / H), np.log(I2**2 / (S * H))
+            f3, f4 = np.log(I1**2 / (S * H)), np.log(S * I1**2 / (H * I2**2))
+            M = self.bivariate_normal
+            return np.exp(lam * T) * S**gamma * (
+                M(-(e1 + mu1) / s1, -(f1 + mu2) / s2, rho)
+                - (I2 / S) ** kappa * M(-(e2 + mu1) / s1, -(f2 + mu2) / s2, rho)
+                - (I1 / S) ** kappa * M(-(e1 - mu1) / s1, -(f3 + mu2) / s2, -rho)
+                + (I1 / I2) ** kappa * M(-(e2 - mu1) / s1, -(f4 + mu2) / s2, -rho)
+            )
+
+        value = (
+            alpha2 * S**beta
+            - alpha2 * phi(t1, beta, I2, I2)
+            + phi(t1, 1, I2, I2)
+            - phi(t1, 1, I1, I2)
+            - K * phi(t1, 0, I2, I2)
+            + K * phi(t1, 0, I1, I2)
+            + alpha1 * phi(t1, beta, I1, I2)
+            - alpha1 * psi(beta, I1)
+            + psi(1, I1)
+            - psi(1, K)
+            - K * psi(0, I1)
+            + K * psi(0, K)
+        )
+        return np.where(S < I2, value, S - K)
+
+    def _bs2002(self, phi, S, K, T, r, b, v):
+        """
+        Bjerksund-Stensland 2002 prices of live contracts that may be exercised early
+        """
+        put = phi < 0
+        # put-call transformation: swap S and K, r and q (b -> -b, r -> r - b)
+        S_, K_ = np.where(put, K, S), np.where(put, S, K)
+        r_, b_ = np.where(put, r - b, r), np.where(put, -b, b)
+        with np.errstate(over="ignore", invalid="ignore"):
+            price = self._bs2002_call(S_, K_, T, r_, b_, v)
+        return np.maximum(price, phi * (S - K))
+
+    def american_price(self, phi, S, K, T, r, v, q):
+        """
+        American prices of flat float64 arrays of live contracts
+        (T > 0, v > 0) that may be exercised early, floored at the European
+        price and at the exercise value (the flat boundaries of BS2002 can
+        exercise too early on long high-volatility contracts)
+        """
+        approx = self._baw if self.method == "baw" else self._bs2002
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            price = approx(phi, S, K, T, r, r - q, v)
+        european = self._european(phi, S, K, T, r, r - q, v)[0]
+        return np.maximum(np.maximum(price, european), phi * (S - K))
+
+    def early_exercise(self, iscall, im):
+        """
+        Flat indices of the contracts of intermediates() worth exercising early
+        """
+        iscall = np.broadcast_to(iscall, im["S"].shape).ravel()
+        live = im["live"].ravel()
+        return np.flatnonzero(
+            live & np.where(iscall, im["q"].ravel() > 0, im["r"].ravel() > 0)
+        )
+
+    def from_intermediates(self, CP, im, dS=1e-3, dT=1e-4, dv=1e-4):
+        """
+        American price and greeks from the quantities returned by intermediates()
+
+        Args:
+            dS, dT, dv: bumps of the finite differences (dS relative to S)
+        """
+        res = super().from_intermediates(CP, im)
+        iscall = self.call_mask(CP)
+        res["Price"] = np.maximum(res["Price"], np.where(iscall, 1, -1) * (im["S"] - im["K"]))
+
+        early = self.early_exercise(iscall, im)
+        if early.size:
+            phi = np.where(np.broadcast_to(iscall, im["S"].shape).ravel()[early], 1.0, -1.0)
+            S, K, T, r, v, q = [
+                np.asarray(im[k], dtype=float).ravel()[early] for k in ("S", "K", "T", "r", "v", "q")
+            ]
+            h, tau = dS * S, np.minimum(dT, 0.5 * T)
+            # base, S +/- h, T +/- tau, v +/- dv priced in one pass
+            bumps = {
+                "S": [S, S + h, S - h, S, S, S, S],
+                "T": [T, T, T, T + tau, T - tau, T, T],
+                "v": [v, v, v, v, v, v + dv, v - dv],
+            }
+            n = len(early)
+            stacked = self.american_price(
+                np.tile(phi, 7), np.concatenate(bumps["S"]), np.tile(K, 7),
+                np.concatenate(bumps["T"]), np.tile(r, 7), np.concatenate(bumps["v"]),
+                np.tile(q, 7),
+            ).reshape(7, n)
+            P, Sup, Sdown, Tup, Tdown, vup, vdown = stacked
+
+            values = {
+                "Price": P,
+                "Delta": (Sup - Sdown) / (2 * h),
+                "Gamma": (Sup - 2 * P + Sdown) / h**2,
+                "Theta": -(Tup - Tdown) / (2 * tau),
+                "Vega": (vup - vdown) / (2 * dv),
+            }
+            for key, val in values.items():
+                res[key] = np.array(np.broadcast_to(res[key], im["S"].shape), dtype=self.dtype)
+                res[key].ravel()[early] = val
+
+        delta, price = res["Delta"], res["Price"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lambda_ = delta * im["S"] / price
+        res["Lambda"] = np.where(
+            iscall,
+            np.where((delta < 1e-10) | (price < 1e-10), np.inf, lambda_),
+            np.where((delta > -1e-10) | (price < 1e-10), -np.inf, lambda_),
+        )
+        return res
+
+    def all_from_intermediates(self, CP, im, dr=1e-4):
+        """
+        all_greeks() with the American price, Lambda, first-order greeks and
+        Rho (by a central rate bump). The second- and third-order greeks are
+        all the BSM ones (Volga, Zomma and Speed from the BSM Vega and Gamma)
+        """
+        res = super().all_from_intermediates(CP, im)
+        res.update(self.from_intermediates(CP, im))
+        iscall = self.call_mask(CP)
+        early = self.early_exercise(iscall, im)
+        if early.size:
+            phi = np.where(np.broadcast_to(iscall, im["S"].shape).ravel()[early], 1.0, -1.0)
+            S, K, T, r, v, q = [
+                np.asarray(im[k], dtype=float).ravel()[early] for k in ("S", "K", "T", "r", "v", "q")
+            ]
+            up, down = self.american_price(
+                np.tile(phi, 2), np.tile(S, 2), np.tile(K, 2), np.tile(T, 2),
+                np.concatenate([r + dr, r - dr]), np.tile(v, 2), np.tile(q, 2),
+            ).reshape(2, -1)
+            res["Rho"] = np.array(np.broadcast_to(res["Rho"], im["S"].shape), dtype=self.dtype)
+            res["Rho"].ravel()[early] = (up - down) / (2 * dr)
+        return res
+
+    def greeks(self, CP, S, K, T, r, v, q=0):
+        """
+        American price, Lambda, Delta, Gamma, Theta and Vega (see BSEngine.greeks())
+        """
+        return self.from_intermediates(CP, self.intermediates(S, K, T, r, v, q))
+
+    def early_exercise_premium(self, CP, S, K, T, r, v, q=0):
+        """
+        American minus European (BSM) prices
+        """
+        im = self.intermediates(S, K, T, r, v, q)
+        return self.from_intermediates(CP, im)["Price"] - BSEngine.from_intermediates(self, CP, im)["Price"]
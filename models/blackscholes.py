@@ -3,12 +3,19 @@ Black-Scholes-Merton pricing class
 """
 
 import numpy as np
-from scipy.stats import norm
 import pandas as pd
+from models.bsengine import BSEngine
+from models.impliedvol import IVSolver
 
 
 class BSOpt:
-    def __init__(self, CP, S, K, T, r, v, q=0):
+    # vectorized engine doing the actual computations (BSOpt is a scalar facade)
+    engine = BSEngine()
+
+    # inputs the cached intermediates depend on (the engine sets their dtype and normal backend)
+    cache_inputs = ("S", "K", "T", "r", "v", "q", "engine")
+
+    def __init__(self, CP, S, K, T, r, v, q=0, engine=None):
 
         """BSM Class option
 
@@ -20,7 +27,12 @@ class BSOpt:
             T : time-to-maturity (years)
             v : implied volatility, IV
             q : dividend yield
+            engine: BSEngine of this option (default: the shared float64
+                    BSOpt.engine), e.g. BSEngine(dtype=np.float32), or
+                    AmericanEngine("baw") for an American option
         """
+        if engine is not None:
+            self.engine = engine
         self.CP = BSOpt.valid_option(CP)
         self.S = BSOpt.valid_underlying(S)
         self.K = BSOpt.valid_strike(K)
@@ -29,6 +41,15 @@ class BSOpt:
         self.v = BSOpt.valid_volatility(v)
         self.q = BSOpt.valid_yield(q)
 
+    @classmethod
+    def from_surface(cls, CP, S, K, T, surface, engine=None):
+        """
+        Option priced with the implied volatility of a fitted surface
+        (models.volsurface.VolSurface) at (K, T), and its rate and dividend yield
+        """
+        v = surface.vol(K, T)[()]
+        return cls(CP, S, K, T, surface.r, v, surface.q, engine=engine)
+
     @staticmethod
     def valid_option(CP):
         """
@@ -124,164 +145,112 @@ class BSOpt:
         """
         Standard Normal CDF (or PDF) evaluated at the input point x.
         """
-        if cum:
-            # returns standard normal CDF
-            return norm.cdf(x, loc=0, scale=1)
-        else:
-            # returns standard normal PDF
-            return norm.pdf(x, loc=0, scale=1)
+        return BSOpt.engine.N(x, cum)
+
+    def __setattr__(self, name, value):
+        # reassigning an input invalidates the cached intermediates (and tree results of TreeOpt)
+        if name in type(self).cache_inputs:
+            self.__dict__.pop("_cache", None)
+            self.__dict__.pop("_tree_cache", None)
+        object.__setattr__(self, name, value)
+
+    def intermediates(self):
+        """
+        d1, d2, sqrt(T), discount factors, N(d1), N(d2) and n(d1) of this option.
+        They are computed once and cached until S, K, T, r, v, q or the engine is reassigned.
+        """
+        try:
+            return self._cache
+        except AttributeError:
+            self._cache = self.engine.intermediates(
+                self.S, self.K, self.T, self.r, self.v, self.q
+            )
+            return self._cache
+
+    def _evaluate(self):
+        """
+        Price and greeks of this option from the cached intermediates
+        """
+        return {
+            k: val[()]
+            for k, val in self.engine.from_intermediates(
+                self.CP, self.intermediates()
+            ).items()
+        }
 
     def d1(self):
         """
         Compute the quantity d1 of BSM options pricing
         """
-        return (
-            np.log(self.S / self.K) + (self.r - self.q + 0.5 * self.v**2) * self.T
-        ) / (self.v * np.sqrt(self.T))
+        return self.intermediates()["d1"][()]
 
     def d2(self):
         """
         Compute the quantity d2 of BSM options pricing
         """
-        return self.d1() - self.v * np.sqrt(self.T)
+        return self.intermediates()["d2"][()]
 
     def price(self):
         """
         BSM Premium (Price)
         """
-        if self.CP == "CP":
-            # Call option
-            if self.T > 0:
-                return +self.S * np.exp(-self.q * self.T) * self.N(
-                    self.d1()
-                ) - self.K * np.exp(-self.r * self.T) * self.N(self.d2())
-
-            else:
-                # The call has expired
-                return max(self.S - self.K, 0)
-        else:
-            # the put option
-            if self.T > 0:
-                return -self.S * np.exp(-self.q * self.T) * self.N(
-                    -self.d1()
-                ) + self.K * np.exp(-self.r * self.T) * self.N(-self.d2())
-            else:
-                return max(self.K - self.S, 0)
+        return self._evaluate()["Price"]
 
     def Delta(self):
         """
         BSM delta
         """
-        if self.CP == "C":
-            if self.T > 0:
-                return np.exp(-self.q * self.T) * self.N(self.d1())
-            else:
-                if self.price() > 0:
-                    return +1
-                else:
-                    return 0
-        else:
-            if self.T > 0:
-                return np.exp(-self.q * self.T) * self.N(self.d1()) - 1
-            else:
-                if self.price() > 0:
-                    return -1
-                else:
-                    return 0
+        return self._evaluate()["Delta"]
 
     def Lambda(self):
         """
         BSM Lambda
         """
-        if self.CP == "C":
-            # Call opt
-            if self.delta() < 1e-10 or self.price() < 1e-10:
-                return +np.inf
-            else:
-                return self.delta() * self.S / self.price()
-        else:
-            # Put opt
-            if self.delta() > -1e-10 or self.price() < 1e-10:
-                return -np.inf
-            else:
-                return self.delta() * self.S / self.price()
+        return self._evaluate()["Lambda"]
 
     def Gamma(self):
         """
         BSM Gamma
         Gamma is the same for both calls and puts
         """
-        if self.T > 0:
-            # opt hasnt expired yet
-            return (
-                +np.exp(-self.q * self.T)
-                * self.N(self.d1(), cum=0)
-                / (self.S * self.v * np.sqrt(self.T))
-            )
-        else:
-            # opt has expired
-            return 0
+        return self._evaluate()["Gamma"]
 
     def Theta(self):
-        if self.CP == "C":
-            # call opt
-            if self.T > 0:
-                # call hasnt exired yet
-                return (
-                    -np.exp(-self.q * self.T)
-                    * self.S
-                    * self.v
-                    * self.N(self.d1(), cum=0)
-                    / (2 * np.sqrt(self.T))
-                    + self.q * np.exp(-self.q * self.T) * self.S * self.N(self.d1())
-                    - self.r * np.exp(-self.r * self.T) * self.K * self.N(self.d2())
-                )
-
-            else:
-                # call expired
-                return 0
-        else:
-            # put opt
-            if self.T > 0:
-                # put hasnt expired yet
-                return (
-                    -np.exp(-self.q * self.T)
-                    * self.S
-                    * self.v
-                    * self.N(self.d1(), cum=0)
-                    / (2 * np.sqrt(self.T))
-                    - self.q
-                    * np.exp(-self.q * self.T)
-                    * self.S
-                    * (1 - self.N(self.d1()))
-                    + self.r
-                    * np.exp(-self.r * self.T)
-                    * self.K
-                    * (1 - self.N(self.d2()))
-                )
-            else:
-                # put expired
-                return 0
+        """
+        BSM Theta
+        """
+        return self._evaluate()["Theta"]
 
     def Vega(self):
         """
         BSM Vega
         """
-        if self.T > 0:
-            return (
-                +np.exp(-self.q * self.T)
-                * self.S
-                * np.sqrt(self.T)
-                * self.N(self.d1(), cum=0)
-            )
-        else:
-            return 0
+        return self._evaluate()["Vega"]
+
+    def Rho(self):
+        """
+        BSM Rho
+        """
+        return self.engine.all_from_intermediates(self.CP, self.intermediates())[
+            "Rho"
+        ][()]
+
+    def implied_vol(self, price):
+        """
+        Implied volatility matching the input premium (the other inputs are kept).
+        Returns nan if no volatility reproduces the premium.
+        """
+        return IVSolver(engine=self.engine).solve(
+            self.CP, price, self.S, self.K, self.T, self.r, self.q
+        )["v"][()]
 
     def greeks(self):
+        # one engine pass for all the greeks
+        greeks = self._evaluate()
         return {
-            "Lambda": np.round(BSOpt.Lambda(self), 2),
-            "Delta": np.round(BSOpt.Delta(self), 2),
-            "Gamma": np.round(BSOpt.Gamma(self), 2),
-            "Theta": np.round(BSOpt.Theta(self), 2),
-            "Vega": np.round(BSOpt.Vega(self), 2),
+            "Lambda": np.round(greeks["Lambda"], 2),
+            "Delta": np.round(greeks["Delta"], 2),
+            "Gamma": np.round(greeks["Gamma"], 2),
+            "Theta": np.round(greeks["Theta"], 2),
+            "Vega": np.round(greeks["Vega"], 2),
         }
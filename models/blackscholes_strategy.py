@@ -1,409 +1,500 @@
+import threading
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
+from collections import OrderedDict
+from models import blackscholes
+from models.adaptivegrid import adaptive_grid
+from models.bsengine import BSEngine
+from models.expirypayoff import ExpiryPayoff, breakpoints, lognormal_stats
+from models.optionbook import OptionBook
+from models.montecarlo import MCEngine
+from models.pdeengine import PDEEngine
+
+
+def underlying_set(S, dtype=np.float64):
+    """
+    199 underlying prices from 40% below to 40% above S, in the given dtype
+    """
+    Smin = S * (1 - 0.4)
+    Smax = S * (1 + 0.4)
+    return np.concatenate(
+        [np.linspace(Smin, S, 100, dtype=dtype)[:-1], np.linspace(S, Smax, 100, dtype=dtype)]
+    )
+
+
+class BSOpt(blackscholes.BSOpt):
+    """
+    BSM option of a strategy: the scalar facade of models.blackscholes,
+    plus its prices over a set of underlying prices.
+    Everything is priced by the option's engine, in the engine's dtype.
+    """
+
+    def price(self, *argv):
+        """
+        BSM price at the underlying price(s) argv[0], or at S if not given
+        """
+        if not argv:
+            return super().price()
+        return self.engine.greeks(
+            self.CP, argv[0], self.K, self.T, self.r, self.v, self.q
+        )["Price"]
 
-class BSOpt:
-    """BSOpt."""
+    def underlying_set(self, *argv):
+        """
+        199 underlying prices around argv[0] (or S), in the engine's dtype
+        """
+        S = argv[0] if argv else self.S
+        return underlying_set(S, dtype=self.engine.dtype)
 
+    def setprices(self):
+        """
+        Prices over underlying_set(), in one engine pass
+        """
+        Sset = self.underlying_set()
+        return pd.Series(self.price(Sset), index=Sset)
 
-    def __init__(self, CP, S, K, T, r, v, q = 0):
-        """__init__.
 
-        :param CP:
-        :param S:
-        :param K:
-        :param T:
-        :param r:
-        :param v:
-        :param q:
-        """
-        self.CP = BSOpt.valid_option(CP)
-        self.S  = BSOpt.valid_underlying(S)
-        self.K  = BSOpt.valid_strike(K)
-        self.T  = BSOpt.valid_maturity(T)
-        self.r  = BSOpt.valid_intrate(r)
-        self.v  = BSOpt.valid_volatility(v)
-        self.q  = BSOpt.valid_yield(q)
+class LegCache:
+    """
+    LRU cache of leg prices over a grid of underlying prices.
 
-    @staticmethod
-    def valid_option(CP):
-        """
-        CP: Validate input option type
+    Keys are (CP, K, T, v, S, r, q, grid, model) tuples, values the read-only
+    rows of prices of one long option over the grid.
+    """
 
-        Returns:
-            string: Call or Put
-        """
-        if CP in ["C", "P"]:
-            return CP
-        else:
-            raise ValueError("First class argument 'CP' must be either 'C' or 'P'")
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
 
-    @staticmethod
-    def valid_underlying(S):
-        """
-        Validate input underlying price
-        """
-        if S > 0:
-            return S
-        else:
-            raise ValueError("Second class argument 'S' (strike price) must be greater than 0")
+    def __len__(self):
+        return len(self._rows)
 
-    @staticmethod
-    def valid_strike(K):
+    def get(self, key):
         """
-        Validate input strike price
+        Cached row of the key (None if missing), marked as most recently used
         """
-        if K > 0:
-            return K
+        row = self._rows.get(key)
+        if row is None:
+            self.misses += 1
         else:
-            raise ValueError("Third argument 'K' (strike price) must be greater than 0")
+            self.hits += 1
+            self._rows.move_to_end(key)
+        return row
 
-    @staticmethod
-    def valid_maturity(T):
+    def put(self, key, row):
         """
-        Validate input maturity
+        Insert a row, evicting the least recently used ones beyond maxsize
         """
-        if T >= 0:
-            return T
-        else:
-            raise ValueError("Fourth argument 'T' (maturity) cant be negative")
+        row.flags.writeable = False
+        self._rows[key] = row
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
 
-    @staticmethod
-    def valid_intrate(r):
-        """
-        Validate input interest rate
-        """
-        if r >= 0:
-            return r
-        else:
-            raise ValueError("Fifth argument 'r' (interest rate) cannot be negative")
+    def clear(self):
+        self._rows.clear()
 
-    @staticmethod
-    def valid_volatility(v):
-        """
-        Validate input implied volatility
-        """
-        if v >= 0:
-            return v
-        else:
-            raise ValueError("Sixth argument 'v' (IV, volatility) cant be negative")
 
-    @staticmethod
-    def valid_yield(q):
-        """
-        Validate input divvie yield
+class BSOptStrat:
+    """
+    Option strategy: legs priced over a grid of underlying prices.
+
+    Payoffs are stored per leg as rows of preallocated (legs x grid) NumPy
+    matrices, before and at maturity. Each batch of legs is priced in one
+    broadcast engine call. Pandas objects are built only on demand by
+    get_payoffs(), get_payoffs_exp() and get_payoffs_exp_df().
+
+    Leg prices go through a LegCache, and reprice() revalues only the
+    current payoffs for a new maturity or volatility shift: the payoffs at
+    maturity are computed once, when the legs are added.
+    """
+
+    def __init__(self, S = 100, r = 0.03, q = 0, dtype = np.float64, capacity = 8, cache = None, engine = None,
+                 surface = None):
+        """
+        dtype : float64 or float32, precision of every price and payoff of the
+                strategy (float32 halves the memory of the payoff grids)
+        cache : LegCache of the leg prices (default: a new LegCache), may be
+                shared between strategies
+        engine: engine pricing the legs (default: BSEngine(dtype=dtype)), e.g.
+                models.americanengine.AmericanEngine("baw") for American legs.
+                Its own dtype is used
+        surface: models.volsurface.VolSurface the legs added with v=None
+                 take their implied volatilities from
         """
-        if q >= 0:
-            return q
-        else:
-            raise ValueError("Seventh argument 'q' (divvie yield) cannot be negative")
+        self.S = S
+        self.r = r
+        self.q = q
+        # engine pricing every option of the strategy
+        self.engine = BSEngine(dtype=dtype) if engine is None else engine
+        self.surface = surface
+        self.instruments = OptionBook()
+        self.cache = LegCache() if cache is None else cache
+        self.grid = underlying_set(S, dtype=self.engine.dtype)
+        # payoff rows of the legs, current and at maturity, and unrounded premia
+        self._payoffs = np.zeros((capacity, len(self.grid)), dtype=self.engine.dtype)
+        self._payoffs_exp = np.zeros((capacity, len(self.grid)), dtype=self.engine.dtype)
+        self._premium = np.zeros(capacity, dtype=self.engine.dtype)
 
     @property
-    def params(self):
-        """
-        Returns all input option params
-        """
-        return {
-            "type": self.CP,
-            "S": self.S,
-            "K": self.K,
-            "T": self.T,
-            "r": self.r,
-            "v": self.v,
-            "q": self.q,
-        }
+    def nlegs(self):
+        return len(self.instruments)
+
+    def _reserve(self, n):
+        capacity = self._payoffs.shape[0]
+        if self.nlegs + n <= capacity:
+            return
+        capacity = max(2 * capacity, self.nlegs + n)
+        for name in ("_payoffs", "_payoffs_exp", "_premium"):
+            arr = getattr(self, name)
+            new = np.zeros((capacity,) + arr.shape[1:], dtype=arr.dtype)
+            new[: self.nlegs] = arr[: self.nlegs]
+            setattr(self, name, new)
+
+    def leg_prices(self, iscall, K, T, v):
+        """
+        (legs x grid) prices of long options, from the cache where possible.
+        The missing legs are priced together in one engine call.
+        """
+        dtype = self.engine.dtype
+        iscall, K, T, v = np.broadcast_arrays(
+            iscall, *[np.asarray(x, dtype=dtype) for x in (K, T, v)]
+        )
+        grid = self.grid.tobytes()
+        keys = [
+            (c, k, t, s, self.S, self.r, self.q, grid, self.engine.model)
+            for c, k, t, s in zip(iscall.tolist(), K.tolist(), T.tolist(), v.tolist())
+        ]
+        rows = [self.cache.get(key) for key in keys]
+        miss = np.array([n for n, row in enumerate(rows) if row is None], dtype=int)
+        if miss.size:
+            prices = self.engine.greeks(
+                iscall[miss, None], self.grid, K[miss, None], T[miss, None],
+                self.r, v[miss, None], self.q,
+            )["Price"]
+            for n, row in zip(miss.tolist(), prices):
+                self.cache.put(keys[n], row)
+                rows[n] = row
+        if not rows:
+            return np.empty((0, len(self.grid)), dtype=dtype)
+        return np.stack(rows)
 
-    @staticmethod
-    def N(x, cum=1):
-        """
-        Standard Normal CDF (or PDF) evaluated at the input point x.
-        """
-        if cum:
-            # returns standard normal CDF
-            return norm.cdf(x, loc=0, scale=1)
-        else:
-            # returns standard normal PDF
-            return norm.pdf(x, loc=0, scale=1)
+    def call(self, NP=+1, K = 100, T = 0.25, v = 0.3, M = 100, optprice = None):
+        self.add_legs("C", NP, K, T, v, M, optprice)
 
-    def d1(self, S):
-        """
-        Compute the quantity d1 of BSM options pricing
-        """
-        return (
-            np.log(self.S / self.K) + (self.r - self.q + 0.5 * self.v**2) * self.T
-        ) / (self.v * np.sqrt(self.T))
+    def put(self, NP=+1, K = 100, T = 0.25, v = 0.3, M = 100, optprice = None):
+        self.add_legs("P", NP, K, T, v, M, optprice)
 
-    def d2(self, S):
-        """
-        Compute the quantity d2 of BSM options pricing
+    def add_legs(self, CP, NP, K, T, v, M = 100, optprice = None):
         """
-        return self.d1(S) - self.v * np.sqrt(self.T)
+        Bulk insert of legs (arrays or broadcastable scalars)
 
-    def price(self, argv):
-        """price.
-
-        :param argv:
-        """
-        try:
-            S = argv[0]
-        except:
-            S = self.S
+        Args:
+            CP      : 'C'/'P' labels or boolean call mask
+            NP      : net position (> 0 long, < 0 short)
+            K, T, v : strike, time-to-maturity and implied volatility
+                      (v=None: from the strategy's volatility surface, in one lookup)
+            M       : multiplier
+            optprice: premium of each leg (default: the engine's price at S)
 
-        if self.CP == "C":
-            if self.T > 0:
-                return + S * np.exp(-self.q*self.T) * self.N(self.d1(S)) \
-                    - self.K * np.exp(-self.r*self.T) * self.N(self.d2(S))
-            else:
-                return max(S - self.K, 0)
+        Notes:
+            the payoff of a leg at the underlying price s is
+                (price(s) - premium) * NP * M
+            i.e. the premium is paid (debit) when NP > 0 and received
+            (credit) when NP < 0. At maturity price(s) is the intrinsic value.
+        """
+        dtype = self.engine.dtype
+        if v is None:
+            if self.surface is None:
+                raise ValueError("Legs without volatility need a volatility surface")
+            v = self.surface.vol(K, T)
+        legs = np.broadcast_arrays(
+            self.engine.call_mask(CP), *[np.asarray(x, dtype=dtype) for x in (NP, K, T, v, M)]
+        )
+        iscall, NP, K, T, v, M = [np.ravel(x) for x in legs]
+        n = iscall.size
+
+        if optprice is None:
+            premium = self.engine.greeks(iscall, self.S, K, T, self.r, v, self.q)["Price"]
         else:
-            if self.T > 0:
-                return  - S * np.exp(-self.q*self.T) * self.N(-self.d1(S)) \
-                    + self.K * np.exp(-self.r*self.T) * self.N(-self.d2(S))
-            else:
-                return max(self.K - S, 0)
+            premium = np.broadcast_to(np.asarray(optprice, dtype=dtype), (n,))
+
+        # prices at the current maturity and at expiry, in one pass
+        prices = self.leg_prices(
+            np.tile(iscall, 2), np.tile(K, 2), np.concatenate([T, np.zeros_like(T)]), np.tile(v, 2)
+        )
+        payoffs = (prices - np.tile(premium, 2)[:, None]) * np.tile(NP * M, 2)[:, None]
+
+        self._reserve(n)
+        rows = slice(self.nlegs, self.nlegs + n)
+        self._payoffs[rows] = payoffs[:n]
+        self._payoffs_exp[rows] = payoffs[n:]
+        self._premium[rows] = premium
+
+        # append the data of the given options to the strategy book
+        self.instruments.extend(iscall, NP, K, T, v, M, np.round(premium, 2))
+
+    def set_grid(self, grid):
+        """
+        Move the strategy on a new grid of underlying prices. The payoffs of
+        all the legs are recomputed (current ones at the legs' own maturity).
+        """
+        n = self.nlegs
+        book = self.instruments
+        self.grid = np.asarray(grid, dtype=self.engine.dtype)
+        shape = (self._payoffs.shape[0], len(self.grid))
+        self._payoffs = np.zeros(shape, dtype=self.engine.dtype)
+        self._payoffs_exp = np.zeros(shape, dtype=self.engine.dtype)
+
+        T = book.column("T")
+        prices = self.leg_prices(
+            np.tile(book.iscall, 2),
+            np.tile(book.column("K"), 2),
+            np.concatenate([T, np.zeros_like(T)]),
+            np.tile(book.column("v"), 2),
+        )
+        weights = (book.column("NP") * book.column("M")).astype(self.engine.dtype)
+        payoffs = (prices - np.tile(self._premium[:n], 2)[:, None]) * np.tile(weights, 2)[:, None]
+        self._payoffs[:n] = payoffs[:n]
+        self._payoffs_exp[:n] = payoffs[n:]
+
+    def refine_grid(self, points = 199, tol = None):
+        """
+        Replace the uniform grid with an adaptive one on the same range
+        (see models.adaptivegrid.adaptive_grid): refined around the strikes
+        and the breakevens at maturity, and where the current payoff bends
+
+        Args:
+            points: maximum number of grid points
+            tol   : tolerance on the linear interpolation of the current payoff
+        """
+        book = self.instruments
+        weights = book.column("NP") * book.column("M")
+
+        def payoff(S):
+            prices = self.engine.greeks(
+                book.iscall[:, None], S, book.column("K")[:, None], book.column("T")[:, None],
+                self.r, book.column("v")[:, None], self.q,
+            )["Price"]
+            return weights @ prices - weights @ self._premium[: self.nlegs]
+
+        nodes = np.concatenate([book.column("K"), self.expiry_payoff().breakevens()])
+        self.set_grid(
+            adaptive_grid(
+                self.grid[0], self.grid[-1], points, nodes=nodes, f=payoff, tol=tol,
+                dtype=self.engine.dtype,
+            )
+        )
 
-    def Delta(self):
+    def remaining(self, T = None, horizon = 0):
         """
-        BSM delta
-        """
-        if self.CP == "C":
-            if self.T > 0:
-                return np.exp(-self.q * self.T) * self.N(self.d1())
-            else:
-                if self.price() > 0:
-                    return +1
-                else:
-                    return 0
-        else:
-            if self.T > 0:
-                return np.exp(-self.q * self.T) * self.N(self.d1()) - 1
-            else:
-                if self.price() > 0:
-                    return -1
-                else:
-                    return 0
+        Time-to-maturity of each leg at the horizon (years from now): legs
+        expired before the horizon have T = 0, i.e. are valued at intrinsic
 
-    def Lambda(self):
+        Args:
+            T      : common time-to-maturity of every leg (default: their own)
+            horizon: time elapsed from now
         """
-        BSM Lambda
-        """
-        if self.CP == "C":
-            # Call opt
-            if self.delta() < 1e-10 or self.price() < 1e-10:
-                return +np.inf
-            else:
-                return self.delta() * self.S / self.price()
-        else:
-            # Put opt
-            if self.delta() > -1e-10 or self.price() < 1e-10:
-                return -np.inf
-            else:
-                return self.delta() * self.S / self.price()
+        T = self.instruments.column("T") if T is None else np.full(self.nlegs, T)
+        return np.maximum(T - horizon, 0)
 
-    def Gamma(self):
+    def reprice(self, T = None, dv = 0, horizon = 0):
         """
-        BSM Gamma
-        Gamma is the same for both calls and puts
-        """
-        if self.T > 0:
-            # opt hasnt expired yet
-            return (
-                +np.exp(-self.q * self.T)
-                * self.N(self.d1(), cum=0)
-                / (self.S * self.v * np.sqrt(self.T))
-            )
-        else:
-            # opt has expired
-            return 0
-
-    def Theta(self):
-        """Theta."""
-        if self.CP == "C":
-            # call opt
-            if self.T > 0:
-                # call hasnt exired yet
-                return (
-                    -np.exp(-self.q * self.T)
-                    * self.S
-                    * self.v
-                    * self.N(self.d1(), cum=0)
-                    / (2 * np.sqrt(self.T))
-                    + self.q * np.exp(-self.q * self.T) * self.S * self.N(self.d1())
-                    - self.r * np.exp(-self.r * self.T) * self.K * self.N(self.d2())
-                )
+        Incremental update of the current payoffs: every leg is revalued at
+        its remaining maturity (see remaining()) and the volatility v + dv,
+        keeping its premium. Payoffs at maturity are not recomputed.
 
-            else:
-                # call expired
-                return 0
-        else:
-            # put opt
-            if self.T > 0:
-                # put hasnt expired yet
-                return (
-                    -np.exp(-self.q * self.T)
-                    * self.S
-                    * self.v
-                    * self.N(self.d1(), cum=0)
-                    / (2 * np.sqrt(self.T))
-                    - self.q
-                    * np.exp(-self.q * self.T)
-                    * self.S
-                    * (1 - self.N(self.d1()))
-                    + self.r
-                    * np.exp(-self.r * self.T)
-                    * self.K
-                    * (1 - self.N(self.d2()))
-                )
-            else:
-                # put expired
-                return 0
-
-    def Vega(self):
-        """
-        BSM Vega
+        Returns:
+            the new current strategy payoff, as get_payoffs()
         """
-        if self.T > 0:
-            return (
-                +np.exp(-self.q * self.T)
-                * self.S
-                * np.sqrt(self.T)
-                * self.N(self.d1(), cum=0)
-            )
-        else:
-            return 0
-
-    def greeks(self):
-        """greeks."""
-        return {
-            "Lambda": np.round(BSOpt.Lambda(self), 2),
-            "Delta": np.round(BSOpt.Delta(self), 2),
-            "Gamma": np.round(BSOpt.Gamma(self), 2),
-            "Theta": np.round(BSOpt.Theta(self), 2),
-            "Vega": np.round(BSOpt.Vega(self), 2),
-        }
-
-    def underlying_set(self, *argv):
-        try:
-            S = argv[0]
-        except:
-            S = self.S
-        Smin = S * (1 - 0.4)
-        Smax = S * (1 + 0.4)
-        return list(np.linspace(Smin, S, 100)[:-1]) + list(np.linspace(S, Smax, 100))
-
-    def setprices(self):
-        """setprices."""
-        oprices = [self.price(p) for p in self.underlying_set()]
-        oprices = pd.Series(oprices, index = self.underlying_set())
-        return oprices
-
-
-class BSOptStrat:
-    """BSOptStrat."""
-
-    def __init__(self, S = 100, r = 0.03, q = 0):
-        self.S = S
-        self.r = r
-        self.q = q
-        self.instruments = []
-        self.payoffs = BSOptStrat.init_payoffs(S)
-        self.payoffs_exp = BSOptStrat.init_payoffs(S)
-        self.payoffs_exp_df = pd.DataFrame()
-
-    def init_payoffs(S):
-        ss = pd.Series([0] * len(BSOpt.underlying_set(0, S)), index = BSOpt.underlying_set(0, S))
-        return ss
-
-    def call(self, NP=+1, K = 100, T = 0.25, v = 0.3, M = 100, optprice = None):
-        option = BSOpt("C", self.S, K, T, self.r, v, q = self.q)
-
-        # call payoff before exp
-        if option is not None:
-            call_price = optprice
-        else:
-            call_price = option.price()
+        n = self.nlegs
+        book = self.instruments
+        prices = self.leg_prices(
+            book.iscall, book.column("K"), self.remaining(T, horizon), book.column("v") + dv
+        )
+        self._payoffs[:n] = (prices - self._premium[:n, None]) * (
+            book.column("NP") * book.column("M")
+        ).astype(self.engine.dtype)[:, None]
+        return self.get_payoffs()
 
+    def horizon_payoffs(self, horizons, dv = 0):
         """
-        Notes:
-        Generating the set of payoff for at different underlying prices
-        Here: option.setprices() are the prices of the call, i.e., as if it were long)
-        - if NP > 0, price must be paid (debit), then:
-          payoffs = option.setprices() * NP * M - Call price * NP * M
-        - If NP < 0, the price is to be received, then:
-          payoffs = Call price * abs(NP) * M - option.setprices() * abs(NP) * M
-                  = option.setprices() * NP * M  - Call price * NP * M
+        Strategy payoff on the (horizon x grid) grid: at each horizon the
+        surviving legs are priced with their remaining maturity, the expired
+        ones at intrinsic value. All the legs and horizons go in one engine call.
 
-        Summary: ( option.setprices() - call_price ) * NP * M
+        Returns:
+            ndarray of shape (len(horizons), len(grid))
         """
-        payoffs = (option.setprices() - call_price) * NP * M
+        n = self.nlegs
+        book = self.instruments
+        horizons = np.asarray(horizons, dtype=self.engine.dtype)
+        T = np.maximum(book.column("T")[:, None, None] - horizons[:, None], 0)
+        prices = self.engine.greeks(
+            book.iscall[:, None, None], self.grid, book.column("K")[:, None, None], T,
+            self.r, (book.column("v") + dv)[:, None, None], self.q,
+        )["Price"]
+        weights = (book.column("NP") * book.column("M")).astype(self.engine.dtype)
+        return np.tensordot(weights, prices, axes=1) - weights @ self._premium[:n]
 
-        # update strategy instruments with current instrument data
-        self.update_strategy("C", call_price, NP, K, T, v, M, payoffs)
+    def pde_payoffs(self, engine = None, dv = 0, horizon = 0):
+        """
+        Current strategy payoff over the grid with every leg solved on a
+        Crank-Nicolson PDE (American exercise by default): one solve per time
+        step for all the legs, the grid being the output grid of the solver
 
-        # update strategy with current instrument data at maturity
-        self.option_at_exp("C", call_price, NP, K, v, M)
+        Args:
+            engine    : PDEEngine (default: PDEEngine(), American)
+            dv, horizon: volatility shift and horizon, as in reprice()
 
-    def put(self, NP=+1, K = 100, T = 0.25, v = 0.3, M = 100, optprice = None):
-        option = BSOpt("P", self.S, K, T, self.r, v, q=self.q)
+        Returns:
+            Series of the payoff indexed by the grid, as get_payoffs()
+        """
+        engine = PDEEngine() if engine is None else engine
+        n = self.nlegs
+        book = self.instruments
+        prices = engine.solve(
+            book.iscall, book.column("K"), self.remaining(None, horizon), self.r,
+            book.column("v") + dv, self.q, grid=self.grid,
+        )["Price"]
+        weights = book.column("NP") * book.column("M")
+        return pd.Series(weights @ (prices - self._premium[:n, None]), index=self.grid)
 
-        if optprice is not None:
-            put_price = optprice
-        else:
-            put_price = option.price()
+    def exotic_payoff(self, payoff, T = 0.25, v = 0.3, NP = +1, M = 100, engine = None):
+        """
+        Current payoff over the grid of a path-dependent leg (Asian, barrier,
+        lookback, see models.montecarlo), to be shown next to the vanilla
+        legs. The grid and the spot are priced on the same Monte Carlo paths;
+        the leg is not added to the strategy.
 
-        # generate the set of payoff for at diff underlying prices
-        payoffs = (option.setprices() - put_price) * NP * M
+        Returns:
+            DataFrame indexed by the grid with columns Payoff (NP * M *
+            (value - premium at the spot)) and StdErr (of NP * M * value)
+        """
+        engine = MCEngine() if engine is None else engine
+        res = engine.price(payoff, np.append(self.grid, self.S), T, self.r, v, self.q)
+        premium = res["Price"][-1]
+        return pd.DataFrame(
+            {
+                "Payoff": NP * M * (res["Price"][:-1] - premium),
+                "StdErr": abs(NP * M) * res["StdErr"][:-1],
+            },
+            index=self.grid,
+        )
+
+    def get_greeks(
+        self, T = None, dv = 0, horizon = 0, names = ("Delta", "Gamma", "Vega", "Theta", "Rho")
+    ):
+        """
+        Net greeks of the strategy over the grid: the greeks of all the legs
+        are computed in one engine pass and summed with NP * M weights
+
+        Args:
+            T, dv, horizon: maturity, volatility shift and horizon, as in reprice()
+            names         : greeks to return (any key of BSEngine.all_greeks)
 
-        self.update_strategy("P", put_price, NP, K, T, v, M, payoffs)
+        Returns:
+            DataFrame indexed by the grid, one column per greek
+        """
+        book = self.instruments
+        im = self.engine.intermediates(
+            self.grid, book.column("K")[:, None], self.remaining(T, horizon)[:, None], self.r,
+            (book.column("v") + dv)[:, None], self.q,
+        )
+        res = self.engine.all_from_intermediates(book.iscall[:, None], im)
+        weights = (book.column("NP") * book.column("M")).astype(self.engine.dtype)
+        return pd.DataFrame({k: weights @ res[k] for k in names}, index=self.grid)
 
-        self.option_at_exp("P", put_price, NP, K, v, M)
+    def expiry_payoff(self):
+        """
+        Exact piecewise-linear payoff at maturity (breakevens, max profit and
+        max loss without any grid), see models.expirypayoff.ExpiryPayoff
+        """
+        return ExpiryPayoff.from_strategy(self)
 
-    def update_strategy(self, CP, price, NP, K, T, v, M, payoffs):
-        self.update_payoffs(payoffs, T=T)
+    def terminal_distribution(self, dv = 0, sigma = None):
+        """
+        Maturity and volatility of the lognormal terminal distribution used by
+        probabilities(): the common expiry of the legs (where the payoff at
+        maturity is realized) and the at-the-money volatility plus dv
 
-        # create dict w/ the data of the given option
-        inst = {"CP": CP,
-                "NP": NP,
-                "K": K,
-                "T": T,
-                "v": v,
-                "M": M,
-                "Pr": round(price, 2)}
+        Args:
+            dv   : volatility shift (scalar or array of scenarios)
+            sigma: volatility of the underlying up to the expiry. Default: the
+                   strategy's surface at K = S if any, else the volatility of
+                   the leg whose strike is closest to S
 
-        # concat new instrument to total strategy instrument list
-        self.instruments.append(inst)
+        Raises:
+            ValueError: if the legs expire at different dates (calendar and
+                        diagonal strategies have no single payoff at maturity)
+        """
+        book = self.instruments
+        T = np.unique(book.column("T"))
+        if len(T) != 1:
+            raise ValueError(
+                "Probabilities at maturity need legs with a single expiry, got {}".format(list(T))
+            )
+        T = T[0]
+        if sigma is None:
+            if self.surface is not None:
+                sigma = self.surface.vol(self.S, T)
+            else:
+                sigma = book.column("v")[np.argmin(np.abs(book.column("K") - self.S))]
+        return T, sigma + np.asarray(dv)
 
-    def update_payoffs(self, payoffs, T = 0):
-        if T > 0:
-            self.payoffs = payoffs + self.payoffs
-        else:
-            self.payoffs_exp = payoffs + self.payoffs_exp
+    def probabilities(self, dv = 0, mu = None, sigma = None):
+        """
+        Closed-form probability of profit, expected P&L and expected shortfall
+        of the payoff at maturity under lognormal dynamics, without simulation
+        (see models.expirypayoff.lognormal_stats). The distribution runs from
+        today's S to the common expiry of the legs (see terminal_distribution)
 
+        Args:
+            dv   : volatility shift (scalar or array of scenarios)
+            mu   : drift of the underlying (default: the risk-free rate)
+            sigma: volatility of the underlying (default: at the money)
 
-    def option_at_exp(self, CP, price, NP, K, v, M):
-        """
-        calculates the payoff of the option at maturity T=0
+        Returns:
+            dict of PoP, Expected and Shortfall (floats, or arrays shaped as dv)
         """
-        option = BSOpt(CP, self.S, K, 0, self.r, v, q=self.q)
+        T, sigma = self.terminal_distribution(dv, sigma)
+        res = self.expiry_payoff().lognormal_stats(
+            self.S, T, sigma, self.r if mu is None else mu, self.q
+        )
+        return {k: val.item() if val.ndim == 0 else val for k, val in res.items()}
 
-        # opt payoff at maturity:
-        # - Call: (max(S - K; 0) - C) * NP * M
-        # - Put:  (P - max(S - K; 0)) * NP * M
-        payoffs_exp = (option.setprices() - price) * NP * M
-
-        # Update the dataframe of payoff at maturity of single options with the new current inserted option
-        self.update_payoffs_exp_df(payoffs_exp)
+    def early_exercise_premium(self, dv = 0, horizon = 0):
+        """
+        Net early exercise premium of the legs at S: engine prices (e.g.
+        American ones of an AmericanEngine) minus BSM prices, times NP * M.
+        Zero for the default BSM engine.
 
-        # Update the strategy payoff at maturity with the one of the new current inserted option
-        self.update_payoffs(payoffs_exp, T = 0)
+        Args:
+            dv     : volatility shift
+            horizon: time elapsed from now (legs are priced with their remaining maturity)
+        """
+        book = self.instruments
+        args = (
+            book.iscall, self.S, book.column("K"), self.remaining(horizon = horizon),
+            self.r, book.column("v") + dv, self.q,
+        )
+        premia = self.engine.greeks(*args)["Price"] - BSEngine(dtype=self.engine.dtype).greeks(*args)["Price"]
+        weights = (book.column("NP") * book.column("M")).astype(self.engine.dtype)
+        return float(weights @ premia)
 
+    @property
+    def payoffs(self):
+        return self.get_payoffs()
 
-    def update_payoffs_exp_df(self, payoffs_exp):
-        # concat new option payoff with current df
-        self.payoffs_exp_df = pd.concat([self.payoffs_exp_df, pd.DataFrame(payoffs_exp)], axis = 1)
+    @property
+    def payoffs_exp(self):
+        return self.get_payoffs_exp()
 
-        # update cols
-        self.payoffs_exp_df.columns = [n for n in range(1, self.payoffs_exp_df.shape[1] + 1)]
+    @property
+    def payoffs_exp_df(self):
+        return self.get_payoffs_exp_df()
 
     def describe_strat(self):  # , stratname=None):
         '''
@@ -414,27 +505,169 @@ class BSOptStrat:
         # create dict of options inserted in the strategy
         StratData = dict()
 
-        strat_cost = 0
         for n, o in enumerate(self.instruments):
             # key of the dictionary (option number)
-            StratData["Option_{}".format(n + 1)] = 0
+            StratData["Option_{}".format(n + 1)] = o.as_dict()
 
-            # compute total strat cost: sum of Net Liquidation Value of option
-            # NLV = price * net position * multiplier
-            strat_cost = strat_cost + o["Pr"] * o["NP"] * o["M"]
-
-        # Save the cost
-        StratData["Cost"] = strat_cost
+        # total strat cost: sum of Net Liquidation Value of options
+        # NLV = price * net position * multiplier
+        StratData["Cost"] = self.instruments.cost()
         return StratData
 
     def get_payoffs_exp_df(self):
         # returns df w/ the payoff at maturity of the strat's option
-        return self.payoffs_exp_df
+        return pd.DataFrame(
+            self._payoffs_exp[: self.nlegs].T,
+            index=self.grid,
+            columns=range(1, self.nlegs + 1),
+        )
 
     def get_payoffs(self):
         # returns current strat payoff
-        return self.payoffs
+        return pd.Series(self._payoffs[: self.nlegs].sum(axis=0), index=self.grid)
 
     def get_payoffs_exp(self):
         # returns strat payoff at maturity
-        return self.payoffs_exp
+        return pd.Series(self._payoffs_exp[: self.nlegs].sum(axis=0), index=self.grid)
+
+
+def strategy_probabilities(strategies, dv = 0, mu = None, sigma = None):
+    """
+    probabilities() of many strategies at once: their legs are padded to the
+    same count with empty legs and evaluated in one vectorized pass
+
+    Args:
+        strategies   : sequence of BSOptStrat, each with a single expiry
+        dv, mu, sigma: volatility shift, drift and volatility (default: at the
+                       money, see BSOptStrat.terminal_distribution), scalars
+                       or one per strategy
+
+    Returns:
+        dict of arrays PoP, Expected and Shortfall, one value per strategy
+    """
+    L = max(s.nlegs for s in strategies)
+    iscall = np.zeros((len(strategies), L), dtype=bool)
+    K, weights, premium = np.zeros((3, len(strategies), L))
+    for n, s in enumerate(strategies):
+        book = s.instruments
+        iscall[n, : s.nlegs] = book.iscall
+        K[n, : s.nlegs] = book.column("K")
+        weights[n, : s.nlegs] = book.column("NP") * book.column("M")
+        premium[n, : s.nlegs] = s._premium[: s.nlegs]
+    sigmas = [sigma] * len(strategies) if np.ndim(sigma) == 0 else sigma
+    T, sigma = np.array(
+        [s.terminal_distribution(sigma = v) for s, v in zip(strategies, sigmas)], dtype=float
+    ).T
+    S, r, q = np.array([(s.S, s.r, s.q) for s in strategies], dtype=float).T
+    return lognormal_stats(
+        *breakpoints(iscall, K, weights, premium), S, T, sigma + dv, r if mu is None else mu, q
+    )
+
+
+class PayoffLattice:
+    """
+    Payoffs of a strategy on the whole (horizon x dv x S) lattice of
+    slider states: horizon (time elapsed from now), parallel volatility
+    shift dv and underlying price S. At each horizon the legs are priced
+    with their remaining maturity, expired legs at intrinsic value.
+
+    The lattice is filled in blocks of horizons, each one a single
+    broadcast engine call over (legs, horizon, dv, S). fill() may run in a
+    background thread (start()): lookup() returns None for the states not
+    computed yet, so that callers can fall back to a live computation.
+
+    Args:
+        strategy: BSOptStrat, whose legs and premia are copied
+        horizons: horizons of the lattice
+        dvset   : volatility shifts of the lattice
+        blocksize: maximum number of prices computed by one engine call
+    """
+
+    def __init__(self, strategy, horizons, dvset, blocksize=2_000_000):
+        n = strategy.nlegs
+        book = strategy.instruments
+        dtype = strategy.engine.dtype
+        self.engine = strategy.engine
+        self.S, self.r, self.q = strategy.S, strategy.r, strategy.q
+        self.grid = strategy.grid.copy()
+        self.iscall = book.iscall.copy()
+        self.K = book.column("K").astype(dtype)
+        self.T = book.column("T").astype(dtype)
+        self.v = book.column("v").astype(dtype)
+        self.weights = (book.column("NP") * book.column("M")).astype(dtype)
+        self.cost = self.weights @ strategy._premium[:n]
+
+        self.horizons = np.asarray(horizons, dtype=dtype)
+        self.dvset = np.asarray(dvset, dtype=dtype)
+        self.values = np.zeros((len(self.horizons), len(self.dvset), len(self.grid)), dtype=dtype)
+        self.ready = np.zeros(len(self.horizons), dtype=bool)
+        per_T = max(n, 1) * len(self.dvset) * len(self.grid)
+        self.rows = max(1, blocksize // per_T)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def axis(vmin, vmax, step):
+        """
+        Values taken by a slider from vmin to vmax with the given step
+        (snapped on vmin + k * step and clipped to vmax)
+        """
+        return np.unique(np.clip(vmin + step * np.arange(np.ceil((vmax - vmin) / step) + 1), vmin, vmax))
+
+    @property
+    def progress(self):
+        """
+        Fraction of the lattice already computed
+        """
+        return self.ready.mean() if self.ready.size else 1.0
+
+    @property
+    def done(self):
+        return bool(self.ready.all())
+
+    def fill(self):
+        """
+        Compute the lattice block by block (stops early after cancel())
+        """
+        col = (slice(None), None, None, None)
+        for start in range(0, len(self.horizons), self.rows):
+            if self._stop.is_set():
+                return
+            block = slice(start, start + self.rows)
+            prices = self.engine.greeks(
+                self.iscall[col],
+                self.grid,
+                self.K[col],
+                np.maximum(self.T[col] - self.horizons[block, None, None], 0),
+                self.r,
+                self.v[col] + self.dvset[:, None],
+                self.q,
+            )["Price"]
+            self.values[block] = np.tensordot(self.weights, prices, axes=1) - self.cost
+            self.ready[block] = True
+
+    def start(self):
+        """
+        Fill the lattice in a background thread
+        """
+        self._thread = threading.Thread(target=self.fill, daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._stop.set()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def lookup(self, horizon, dv):
+        """
+        Strategy payoff over the grid at the lattice state (horizon, dv), or None
+        if the state is not on the lattice or not computed yet
+        """
+        i = int(np.abs(self.horizons - horizon).argmin())
+        j = int(np.abs(self.dvset - dv).argmin())
+        if not (self.ready[i] and np.isclose(self.horizons[i], horizon) and np.isclose(self.dvset[j], dv)):
+            return None
+        return self.values[i, j]
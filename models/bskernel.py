@@ -0,0 +1,114 @@
+"""
+Element-wise BSM kernel, JIT-compiled with numba when it is installed
+
+The kernel computes the price and the greeks of each option in a single loop
+iteration, so no temporary arrays are created. Without numba the same kernel
+is not used (a Python loop would be far slower than NumPy):
+kernel_available() tells the engines whether to fall back to their NumPy path.
+"""
+
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# order of the rows of the kernel output
+OUTPUTS = ("Price", "Lambda", "Delta", "Gamma", "Theta", "Vega")
+
+SQRT2 = math.sqrt(2)
+SQRT2PI = math.sqrt(2 * math.pi)
+
+
+def kernel_available():
+    """
+    True if the JIT kernel can be used
+    """
+    return numba is not None
+
+
+def _greeks_loop(iscall, S, K, T, r, v, q, out):
+    """
+    Price and greeks of element i in out[:, i] (see OUTPUTS for the row order).
+    Same conventions as BSEngine.greeks, dead options (T = 0 or v = 0) included.
+    """
+    for i in prange(S.shape[0]):
+        s, k, t, rr, vv, qq = S[i], K[i], T[i], r[i], v[i], q[i]
+        sqrtT = math.sqrt(t)
+        Dq = math.exp(-qq * t)
+        Dr = math.exp(-rr * t)
+        SDq = s * Dq
+        KDr = k * Dr
+
+        if t > 0 and vv > 0:
+            vsqrtT = vv * sqrtT
+            d1 = (math.log(s / k) + (rr - qq + 0.5 * vv * vv) * t) / vsqrtT
+            d2 = d1 - vsqrtT
+            Nd1 = 0.5 * math.erfc(-d1 / SQRT2)
+            Nd2 = 0.5 * math.erfc(-d2 / SQRT2)
+            nd1 = math.exp(-0.5 * d1 * d1) / SQRT2PI
+            gamma = Dq * nd1 / (s * vsqrtT)
+            vega = SDq * sqrtT * nd1
+            decay = -SDq * vv * nd1 / (2 * sqrtT)
+        else:
+            Nd1 = 1.0 if SDq > KDr else 0.0
+            Nd2 = Nd1
+            gamma = 0.0
+            vega = 0.0
+            decay = 0.0
+
+        if iscall[i]:
+            price = SDq * Nd1 - KDr * Nd2
+            delta = Dq * Nd1
+            theta = decay + qq * SDq * Nd1 - rr * KDr * Nd2
+        else:
+            price = KDr * (1 - Nd2) - SDq * (1 - Nd1)
+            delta = Dq * (Nd1 - 1)
+            theta = decay - qq * SDq * (1 - Nd1) + rr * KDr * (1 - Nd2)
+
+        if not t > 0:
+            theta = 0.0
+        if not (t > 0 and vv > 0) and not price > 0:
+            delta = 0.0
+
+        if iscall[i]:
+            if delta < 1e-10 or price < 1e-10:
+                lambda_ = math.inf
+            else:
+                lambda_ = delta * s / price
+        else:
+            if delta > -1e-10 or price < 1e-10:
+                lambda_ = -math.inf
+            else:
+                lambda_ = delta * s / price
+
+        out[0, i] = price
+        out[1, i] = lambda_
+        out[2, i] = delta
+        out[3, i] = gamma
+        out[4, i] = theta
+        out[5, i] = vega
+
+
+if numba is not None:
+    prange = numba.prange
+    _greeks_jit = numba.njit(parallel=True, cache=True)(_greeks_loop)
+else:
+    prange = range
+    _greeks_jit = None
+
+
+def greeks_kernel(iscall, S, K, T, r, v, q):
+    """
+    Price and greeks of 1-d contiguous input arrays with the JIT kernel
+    (outputs have the floating point type of S)
+
+    Returns:
+        dict of arrays with keys Price, Lambda, Delta, Gamma, Theta, Vega
+    """
+    out = np.empty((len(OUTPUTS), S.shape[0]), dtype=S.dtype)
+    _greeks_jit(iscall, S, K, T, r, v, q, out)
+    return dict(zip(OUTPUTS, out))
@@ -0,0 +1,230 @@
+"""
+Exact piecewise-linear payoff at maturity of option strategies
+"""
+
+import numpy as np
+from models import normdist
+
+
+def breakpoints(CP, K, weights, premium):
+    """
+    Piecewise-linear form of the payoffs at maturity of many strategies at once
+
+    Args:
+        CP, K, weights, premium: boolean call mask, strikes, NP * M and premia,
+                                 arrays of shape (..., legs)
+
+    Returns:
+        x, y, slopes of shape (..., legs + 1): the breakpoints (0 and the
+        sorted strikes), the payoff at each breakpoint and the slope of the
+        segment starting there (the last one extends to +inf)
+    """
+    iscall, K, weights, premium = np.broadcast_arrays(
+        np.asarray(CP, dtype=bool), *[np.asarray(x, dtype=float) for x in (K, weights, premium)]
+    )
+    cost = (weights * premium).sum(axis=-1, keepdims=True)
+    # payoff at S = 0: the puts pay their strikes
+    y0 = (weights * K * ~iscall).sum(axis=-1, keepdims=True) - cost
+    # slope below the lowest strike: -w of every put
+    slope0 = -(weights * ~iscall).sum(axis=-1, keepdims=True)
+
+    # slope change at each strike: +w for every leg (a put adds +w going
+    # from slope -w below K to 0 above K, a call from 0 to +w)
+    order = np.argsort(K, axis=-1)
+    K = np.take_along_axis(K, order, axis=-1)
+    kinks = np.take_along_axis(weights, order, axis=-1)
+
+    zeros = np.zeros(K.shape[:-1] + (1,))
+    x = np.concatenate([zeros, K], axis=-1)
+    slopes = slope0 + np.concatenate([zeros, np.cumsum(kinks, axis=-1)], axis=-1)
+    # legs cancelling out leave rounding residues: snap them to flat
+    tol = 1e-12 * np.abs(weights).sum(axis=-1, keepdims=True)
+    slopes = np.where(np.abs(slopes) <= tol, 0.0, slopes)
+    y = y0 + np.concatenate(
+        [zeros, np.cumsum(slopes[..., :-1] * np.diff(x, axis=-1), axis=-1)], axis=-1
+    )
+    return x, y, slopes
+
+
+def extrema(x, y, slopes):
+    """
+    Max profit and max loss of payoffs in breakpoints() form (+/-inf if unbounded)
+    """
+    max_profit = np.where(slopes[..., -1] > 0, np.inf, y.max(axis=-1))
+    max_loss = np.where(slopes[..., -1] < 0, -np.inf, y.min(axis=-1))
+    return max_profit, max_loss
+
+
+def breakeven_range(x, y, slopes):
+    """
+    Lowest and highest breakevens of payoffs in breakpoints() form
+    (nan where the payoff never crosses zero)
+    """
+    end = np.concatenate([x[..., 1:], np.full(x.shape[:-1] + (1,), np.inf)], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.where(y == 0, x, x - y / slopes)
+    found = (y == 0) | ((slopes != 0) & (root >= x) & (root <= end))
+    lower = np.where(found, root, np.inf).min(axis=-1)
+    upper = np.where(found, root, -np.inf).max(axis=-1)
+    return np.where(np.isfinite(lower), lower, np.nan), np.where(np.isfinite(upper), upper, np.nan)
+
+
+def _lognormal_interval(lo, hi, F, vsqrtT):
+    """
+    P(lo < S_T <= hi) and E[S_T 1{lo < S_T <= hi}] for a lognormal S_T with
+    mean F and log-volatility vsqrtT: digital and asset-or-nothing closed forms
+    """
+    N = normdist.get_backend().cdf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zlo = (np.log(lo / F) + 0.5 * vsqrtT**2) / vsqrtT
+        zhi = (np.log(hi / F) + 0.5 * vsqrtT**2) / vsqrtT
+    # empty intervals (lo = hi, including lo = hi = inf) weigh nothing
+    empty = ~(hi > lo)
+    prob = np.where(empty, 0.0, N(zhi) - N(zlo))
+    asset = np.where(empty, 0.0, F * (N(zhi - vsqrtT) - N(zlo - vsqrtT)))
+    return prob, asset
+
+
+def lognormal_stats(x, y, slopes, S, T, sigma, mu, q=0):
+    """
+    Probability of profit, expected P&L and expected shortfall at maturity of
+    payoffs in breakpoints() form, for S_T lognormal with drift mu - q and
+    volatility sigma. Exact: the part of every linear segment [a, b) above
+    (or below) zero contributes in closed form
+        E[payoff 1{lo < S_T <= hi}] = y_a P + slope (A - a P)
+    with P the digital and A the asset-or-nothing value of [lo, hi].
+
+    Args:
+        S, T, sigma, mu, q: spot, maturity, volatility, drift and dividend
+                            yield, broadcastable against x[..., 0]
+
+    Returns:
+        dict of arrays PoP (probability of profit), Expected (expected P&L)
+        and Shortfall (expected P&L given a loss, nan if no loss is possible)
+    """
+    S, T, sigma, mu, q = [np.asarray(a, dtype=float)[..., None] for a in (S, T, sigma, mu, q)]
+    F = S * np.exp((mu - q) * T)
+    vsqrtT = np.maximum(sigma * np.sqrt(T), 1e-12)
+
+    a = x
+    b = np.concatenate([x[..., 1:], np.full(x.shape[:-1] + (1,), np.inf)], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.clip(a - y / slopes, a, b)
+
+    def expectation(lo, hi):
+        prob, asset = _lognormal_interval(lo, hi, F, vsqrtT)
+        # the payoff at lo, written from a so that infinite ends never multiply zero
+        value = np.where(prob > 0, y * prob + slopes * (asset - a * prob), 0.0)
+        return prob.sum(axis=-1), value.sum(axis=-1)
+
+    # part of each segment where the payoff is positive, and where it is negative
+    flat = slopes == 0
+    pop, gain = expectation(
+        np.where(slopes > 0, root, np.where(flat & ~(y > 0), b, a)),
+        np.where(slopes < 0, root, b),
+    )
+    pol, loss = expectation(
+        np.where(slopes < 0, root, np.where(flat & ~(y < 0), b, a)),
+        np.where(slopes > 0, root, b),
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shortfall = np.where(pol > 0, loss / pol, np.nan)
+    return {"PoP": pop, "Expected": gain + loss, "Shortfall": shortfall}
+
+
+class ExpiryPayoff:
+    """
+    P&L at maturity of a set of European legs, as a piecewise-linear function
+    of the underlying price S >= 0 with kinks at the strikes:
+
+        payoff(S) = sum_i w_i * (max(+/-(S - K_i), 0) - premium_i)
+
+    It is stored as sorted breakpoints x (0 and the distinct strikes),
+    the payoff y at each breakpoint and the slope of each segment
+    [x_j, x_j+1) (the last one extends to +inf). Breakevens and extrema are
+    exact, and evaluating the payoff at any S costs one binary search.
+
+    Args:
+        CP     : 'C'/'P' labels or boolean call mask
+        K      : strike prices
+        weights: signed size of each leg, NP * M
+        premium: premium of each leg (paid when weights > 0)
+    """
+
+    def __init__(self, CP, K, weights, premium):
+        iscall = np.asarray(CP)
+        if iscall.dtype != bool:
+            if not np.all((iscall == "C") | (iscall == "P")):
+                raise ValueError("Argument 'CP' must contain only 'C' or 'P'")
+            iscall = iscall == "C"
+        iscall, K, weights, premium = [
+            np.ravel(x)
+            for x in np.broadcast_arrays(
+                iscall, *[np.asarray(x, dtype=float) for x in (K, weights, premium)]
+            )
+        ]
+        self.cost = float(weights @ premium)
+
+        x, y, slopes = breakpoints(iscall, K, weights, premium)
+        # repeated strikes: keep the last breakpoint, whose slope holds to the right
+        last = np.append(np.diff(x) > 0, True)
+        self.x, self.y, self.slopes = x[last], y[last], slopes[last]
+
+    @classmethod
+    def from_strategy(cls, strategy):
+        """
+        Payoff at maturity of the legs of a BSOptStrat
+        """
+        book = strategy.instruments
+        return cls(
+            book.iscall,
+            book.column("K"),
+            book.column("NP") * book.column("M"),
+            strategy._premium[: strategy.nlegs],
+        )
+
+    def __call__(self, S):
+        """
+        Payoff at the underlying price(s) S, by binary search of the segments
+        """
+        S = np.asarray(S, dtype=float)
+        j = np.searchsorted(self.x, S, side="right") - 1
+        j = np.clip(j, 0, len(self.x) - 1)
+        return self.y[j] + self.slopes[j] * (S - self.x[j])
+
+    def breakevens(self):
+        """
+        Sorted underlying prices where the payoff at maturity crosses (or
+        touches) zero. A segment lying on zero contributes its endpoints.
+        """
+        x, y, m = self.x, self.y, self.slopes
+        roots = [x[y == 0]]
+        # finite segments with a sign change strictly inside
+        y0, y1 = y[:-1], y[1:]
+        inside = (y0 * y1 < 0)
+        roots.append(x[:-1][inside] - y0[inside] / m[:-1][inside])
+        # last segment towards +inf
+        if m[-1] != 0 and y[-1] * m[-1] < 0:
+            roots.append([x[-1] - y[-1] / m[-1]])
+        return np.unique(np.concatenate(roots))
+
+    def lognormal_stats(self, S, T, sigma, mu, q=0):
+        """
+        Probability of profit, expected P&L and expected shortfall for a
+        lognormal underlying, see models.expirypayoff.lognormal_stats()
+        """
+        return lognormal_stats(self.x, self.y, self.slopes, S, T, sigma, mu, q)
+
+    @property
+    def max_profit(self):
+        """
+        Maximum payoff at maturity (inf if unbounded)
+        """
+        return np.inf if self.slopes[-1] > 0 else self.y.max()
+
+    @property
+    def max_loss(self):
+        """
+        Minimum payoff at maturity, a negative number for a loss (-inf if unbounded)
+        """
+        return -np.inf if self.slopes[-1] < 0 else self.y.min()
@@ -0,0 +1,173 @@
+"""
+Vectorized BSM implied volatility solver
+"""
+
+import numpy as np
+from models.bsengine import BSEngine
+
+
+class IVSolver:
+    """
+    Implied volatility of whole option chains at once.
+
+    Every quote is inverted on its out-of-the-money side (in-the-money quotes
+    are mapped through put-call parity), which leaves only the time value
+    and keeps the inversion well conditioned.
+    Starting from the Corrado-Miller closed-form approximation, each quote
+    takes Newton steps with Vega, safeguarded by a bracket [lo, hi] which
+    is tightened at every iteration: whenever a Newton step leaves the bracket
+    (deep ITM/OTM or near-expiry quotes, where Vega vanishes) a bisection
+    step is taken instead. Only quotes not yet converged are iterated.
+
+    Args:
+        engine : BSEngine used for the pricing (default: a new BSEngine).
+                 The solver works in the engine's dtype
+        tol    : absolute tolerance on the price
+        vtol   : tolerance on the width of the volatility bracket
+                 (both tolerances are floored at the resolution of the dtype)
+        vmin   : lower end of the initial volatility bracket
+        vmax   : upper end of the initial volatility bracket
+        maxiter: maximum number of iterations
+    """
+
+    def __init__(
+        self, engine=None, tol=1e-10, vtol=1e-12, vmin=1e-6, vmax=5.0, maxiter=100
+    ):
+        self.engine = BSEngine() if engine is None else engine
+        self.tol = tol
+        self.vtol = vtol
+        self.vmin = vmin
+        self.vmax = vmax
+        self.maxiter = maxiter
+
+    @staticmethod
+    def initial_guess(C, F, X, T):
+        """
+        Corrado-Miller approximation of the implied volatility of a call
+
+        Args:
+            C: call price
+            F: discounted forward S * exp(-qT)
+            X: discounted strike K * exp(-rT)
+            T: time-to-maturity (years)
+        """
+        h = C - 0.5 * (F - X)
+        disc = np.maximum(h**2 - (F - X) ** 2 / np.pi, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.sqrt(2 * np.pi) / (F + X) * (h + np.sqrt(disc)) / np.sqrt(T)
+
+    def otm_price_vega(self, isotmcall, S, K, T, r, v, q):
+        """
+        Price and Vega of the out-of-the-money side of each quote
+        """
+        im = self.engine.intermediates(S, K, T, r, v, q)
+        SDq = im["S"] * im["Dq"]
+        KDr = im["K"] * im["Dr"]
+        price = np.where(
+            isotmcall,
+            SDq * im["Nd1"] - KDr * im["Nd2"],
+            KDr * (1 - im["Nd2"]) - SDq * (1 - im["Nd1"]),
+        )
+        vega = SDq * im["sqrtT"] * im["nd1"]
+        return price, vega
+
+    def solve(self, CP, price, S, K, T, r, q=0):
+        """
+        Implied volatility of the input quotes (arrays or broadcastable scalars)
+
+        Quotes outside the no-arbitrage bounds, expired quotes and quotes
+        not converged within maxiter are flagged instead of raising.
+
+        Returns:
+            dict of arrays:
+                v         : implied volatility (nan where no solution exists)
+                converged : True where the solver converged
+                iterations: number of iterations taken by each quote
+        """
+        iscall = BSEngine.call_mask(CP)
+        iscall, price, S, K, T, r, q = np.broadcast_arrays(
+            iscall,
+            *[np.asarray(x, dtype=self.engine.dtype) for x in (price, S, K, T, r, q)],
+        )
+        shape = price.shape
+        iscall, price, S, K, T, r, q = [
+            np.ravel(x) for x in (iscall, price, S, K, T, r, q)
+        ]
+
+        F = S * np.exp(-q * T)
+        X = K * np.exp(-r * T)
+
+        # map every quote on its out-of-the-money side through put-call parity
+        isotmcall = F <= X
+        otm = np.where(
+            iscall == isotmcall, price, price - np.where(iscall, F - X, X - F)
+        )
+
+        # the time value must lie in (0, upper bound of the OTM option)
+        upper = np.where(isotmcall, F, X)
+        valid = (T > 0) & (otm > 0) & (otm < upper)
+
+        # prices are resolved to a few ulps of the forward
+        eps = np.finfo(self.engine.dtype).eps
+        ptol = np.maximum(self.tol, 16 * eps * upper)
+
+        v = np.full(price.shape, np.nan, dtype=self.engine.dtype)
+        converged = np.zeros(price.shape, dtype=bool)
+        iterations = np.zeros(price.shape, dtype=int)
+
+        # initial guess on the call price of the same strike
+        guess = self.initial_guess(np.where(isotmcall, otm, otm + F - X), F, X, T)
+        guess = np.where(np.isfinite(guess), guess, 0.5 * (self.vmin + self.vmax))
+        v[valid] = np.clip(guess[valid], 2 * self.vmin, 0.5 * self.vmax)
+
+        lo = np.full(price.shape, self.vmin, dtype=self.engine.dtype)
+        hi = np.full(price.shape, self.vmax, dtype=self.engine.dtype)
+
+        active = np.flatnonzero(valid)
+        for n in range(self.maxiter):
+            if active.size == 0:
+                break
+            va = v[active]
+            model, vega = self.otm_price_vega(
+                isotmcall[active], S[active], K[active], T[active], r[active], va, q[active]
+            )
+            diff = model - otm[active]
+
+            # tighten the bracket: the price is increasing in the volatility
+            lo[active] = np.where(diff < 0, va, lo[active])
+            hi[active] = np.where(diff > 0, va, hi[active])
+            iterations[active] = n + 1
+
+            vtol = np.maximum(self.vtol, 16 * eps * va)
+            collapsed = hi[active] - lo[active] <= vtol
+            # a bracket collapsed onto vmin or vmax means the quote is out of
+            # the [price(vmin), price(vmax)] range: stop, but not converged
+            inner = (lo[active] > self.vmin) & (hi[active] < self.vmax)
+            ok = (np.abs(diff) <= ptol[active]) | (collapsed & inner)
+            done = ok | collapsed
+            converged[active[ok]] = True
+
+            # Newton step, or bisection when it leaves the bracket
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = va - diff / vega
+            inside = np.isfinite(step) & (step > lo[active]) & (step < hi[active])
+            v[active] = np.where(
+                done, va, np.where(inside, step, 0.5 * (lo[active] + hi[active]))
+            )
+            active = active[~done]
+
+        # quotes above the price at vmax (or below the one at vmin) are not converged
+        v[~converged] = np.nan
+
+        return {
+            "v": v.reshape(shape),
+            "converged": converged.reshape(shape),
+            "iterations": iterations.reshape(shape),
+        }
+
+
+def implied_vol(CP, price, S, K, T, r, q=0):
+    """
+    Shortcut for IVSolver().solve(CP, price, S, K, T, r, q)
+    """
+    return IVSolver().solve(CP, price, S, K, T, r, q)
@@ -0,0 +1,346 @@
+"""
+Vectorized Monte Carlo engine for path-dependent payoffs under GBM
+
+Paths are generated as (steps x paths) blocks in chunks of at most
+`chunksize` paths, for a unit spot: GBM paths scale with the spot, so every
+payoff is a function of a few per-path statistics (terminal, average,
+maximum, minimum) which are simply multiplied by each spot of a whole grid.
+Only one chunk of paths is alive at a time.
+
+Example:
+    engine = MCEngine(paths=10**6, steps=252, seed=42)
+    res = engine.price(Asian("C", 100), S=100, T=1, r=0.03, v=0.25)
+    res["Price"], res["StdErr"]
+"""
+
+import warnings
+from abc import ABC, abstractmethod
+import numpy as np
+from models.bsengine import BSEngine
+
+try:
+    from scipy.special import ndtri
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+
+class Payoff(ABC):
+    """
+    Payoff at maturity of a path, from per-path statistics
+
+    Subclasses set `stats` (the statistics they read among "last", "mean",
+    "gmean", "max", "min") and `CP`, `K` of the vanilla option used as
+    control variate (K = None: the terminal price is used instead).
+    """
+
+    stats = ("last",)
+
+    def __init__(self, CP, K=None):
+        if CP not in ("C", "P"):
+            raise ValueError("Argument 'CP' must be either 'C' or 'P'")
+        self.CP = CP
+        self.K = K
+        self.phi = 1.0 if CP == "C" else -1.0
+
+    @abstractmethod
+    def __call__(self, stats):
+        """
+        Payoff of each path from the dict of its statistics
+        """
+
+
+class Vanilla(Payoff):
+    """
+    European call or put
+    """
+
+    def __call__(self, stats):
+        return np.maximum(self.phi * (stats["last"] - self.K), 0)
+
+
+class Asian(Payoff):
+    """
+    Fixed-strike Asian option on the arithmetic (or geometric) average of the
+    monitoring dates
+    """
+
+    def __init__(self, CP, K, average="arithmetic"):
+        super().__init__(CP, K)
+        if average not in ("arithmetic", "geometric"):
+            raise ValueError("Average must be either 'arithmetic' or 'geometric'")
+        self.average = average
+        self.stats = ("last", "mean" if average == "arithmetic" else "gmean")
+
+    def __call__(self, stats):
+        avg = stats["mean" if self.average == "arithmetic" else "gmean"]
+        return np.maximum(self.phi * (avg - self.K), 0)
+
+
+class Barrier(Payoff):
+    """
+    Knock-in or knock-out call or put, with the barrier H monitored at
+    the dates of the paths (discrete monitoring)
+
+    Args:
+        kind: "up-and-out", "up-and-in", "down-and-out" or "down-and-in"
+    """
+
+    kinds = ("up-and-out", "up-and-in", "down-and-out", "down-and-in")
+
+    def __init__(self, CP, K, H, kind="up-and-out"):
+        super().__init__(CP, K)
+        if kind not in Barrier.kinds:
+            raise ValueError("Kind must be one of {}".format(", ".join(Barrier.kinds)))
+        self.H = H
+        self.kind = kind
+        self.stats = ("last", "max" if kind.startswith("up") else "min")
+
+    def __call__(self, stats):
+        if self.kind.startswith("up"):
+            touched = stats["max"] >= self.H
+        else:
+            touched = stats["min"] <= self.H
+        alive = ~touched if self.kind.endswith("out") else touched
+        return np.where(alive, np.maximum(self.phi * (stats["last"] - self.K), 0), 0.0)
+
+
+class Lookback(Payoff):
+    """
+    Lookback option: floating strike (K = None, call S_T - min, put max - S_T)
+    or fixed strike (call max - K, put K - min), the spot included in the extrema
+    """
+
+    stats = ("last", "max", "min")
+
+    def __call__(self, stats):
+        if self.K is None:
+            return np.where(self.phi > 0, stats["last"] - stats["min"], stats["max"] - stats["last"])
+        extremum = stats["max"] if self.phi > 0 else stats["min"]
+        return np.maximum(self.phi * (extremum - self.K), 0)
+
+
+def _bridge_plan(steps):
+    """
+    Brownian bridge construction order over the dates 1..steps (date 0 is W = 0):
+    the terminal date first, then recursively the middle of every interval.
+
+    Returns:
+        list of (date, left, right, wleft, wright, sd): W[date] =
+        wleft W[left] + wright W[right] + sd z (right = -1: no right end)
+    """
+    plan = [(steps, 0, -1, 0.0, 0.0, np.sqrt(steps))]
+    intervals = [(0, steps)]
+    while intervals:
+        split = []
+        for left, right in intervals:
+            if right - left < 2:
+                continue
+            mid = (left + right) // 2
+            span = right - left
+            plan.append(
+                (mid, left, right, (right - mid) / span, (mid - left) / span,
+                 np.sqrt((mid - left) * (right - mid) / span))
+            )
+            split += [(left, mid), (mid, right)]
+        intervals = split
+    return plan
+
+
+class MCEngine:
+    """
+    Monte Carlo pricer of Payoff objects with a standard error on every price
+
+    Args:
+        paths          : number of paths (antithetic pairs count as two paths)
+        steps          : number of monitoring dates (equally spaced up to T)
+        antithetic     : if True every normal draw z is also used as -z
+        control_variate: if True the vanilla option of the payoff (or the
+                         terminal price) is used as control variate, with
+                         its BSM closed form as known mean
+        sampling       : "pseudo" (PCG64) or "sobol" (scrambled Sobol points,
+                         needs scipy). Sobol prices are averaged over
+                         `replicates` independent scramblings, whose spread
+                         gives the standard error
+        brownian_bridge: build the paths by Brownian bridge, so the first
+                         (best distributed) Sobol coordinates drive the
+                         coarse shape of the paths (default: with Sobol)
+        replicates     : number of independent Sobol scramblings
+        seed           : seed of every draw: the same seed, chunksize and
+                         settings give the same prices
+        chunksize      : maximum number of paths generated at once
+    """
+
+    samplings = ("pseudo", "sobol")
+
+    def __init__(
+        self, paths=100_000, steps=252, antithetic=True, control_variate=True,
+        sampling="pseudo", brownian_bridge=None, replicates=8, seed=0, chunksize=2**14,
+    ):
+        if sampling not in MCEngine.samplings:
+            raise ValueError("Sampling must be one of {}".format(", ".join(MCEngine.samplings)))
+        if sampling == "sobol" and qmc is None:
+            raise ValueError("Sobol sampling needs scipy")
+        if chunksize < 2:
+            raise ValueError("Argument 'chunksize' must be at least 2")
+        self.paths = paths
+        self.steps = steps
+        self.antithetic = antithetic
+        self.control_variate = control_variate
+        self.sampling = sampling
+        self.brownian_bridge = sampling == "sobol" if brownian_bridge is None else brownian_bridge
+        self.replicates = replicates if sampling == "sobol" else 1
+        self.seed = seed
+        # antithetic chunks hold whole pairs
+        self.chunksize = chunksize - chunksize % 2 if antithetic else chunksize
+
+    def normals(self):
+        """
+        Standard normal draws of each replicate, in chunks laid out as
+        (steps x paths), so that every date is a contiguous row. With
+        antithetic sampling the second half of the paths are the negated draws.
+
+        Yields:
+            (replicate, ndarray of shape (steps, paths in chunk))
+        """
+        per_replicate = self.paths // self.replicates
+        draws = per_replicate // 2 if self.antithetic else per_replicate
+        block = self.chunksize // 2 if self.antithetic else self.chunksize
+        seeds = np.random.SeedSequence(self.seed).spawn(self.replicates)
+
+        for rep, seed in enumerate(seeds):
+            if self.sampling == "sobol":
+                sampler = qmc.Sobol(self.steps, scramble=True, seed=np.random.default_rng(seed))
+            else:
+                rng = np.random.default_rng(seed)
+            for start in range(0, draws, block):
+                n = min(block, draws - start)
+                if self.sampling == "sobol":
+                    with warnings.catch_warnings():
+                        # chunks of any size: the balance warning of Sobol does not apply
+                        warnings.simplefilter("ignore", UserWarning)
+                        u = sampler.random(n)
+                    z = ndtri(np.clip(u.T, 1e-16, 1 - 1e-16))
+                else:
+                    z = rng.standard_normal((self.steps, n))
+                if self.antithetic:
+                    pairs = np.empty((self.steps, 2 * n))
+                    pairs[:, :n] = z
+                    np.negative(z, out=pairs[:, n:])
+                    z = pairs
+                yield rep, z
+
+    def brownian(self, z):
+        """
+        Brownian paths at the dates 1..steps (in units of sqrt(dt), as
+        (steps x paths) rows) driven by the normal draws z: their cumulative
+        sums, or the Brownian bridge of the draws taken in construction order
+        """
+        if not self.brownian_bridge:
+            # row by row: much faster than np.cumsum along the first axis
+            for date in range(1, len(z)):
+                np.add(z[date], z[date - 1], out=z[date])
+            return z
+        W = np.empty((self.steps + 1, z.shape[1]))
+        W[0] = 0.0
+        for row, (date, left, right, wl, wr, sd) in enumerate(_bridge_plan(self.steps)):
+            np.multiply(z[row], sd, out=W[date])
+            if left > 0:
+                W[date] += wl * W[left]
+            if right >= 0:
+                W[date] += wr * W[right]
+        return W[1:]
+
+    def statistics(self, z, T, r, v, q, needed):
+        """
+        Per-path statistics of unit-spot GBM paths driven by the draws z
+        """
+        dt = T / self.steps
+        logS = self.brownian(z)
+        logS *= v * np.sqrt(dt)
+        logS += ((r - q - 0.5 * v**2) * dt * np.arange(1, self.steps + 1))[:, None]
+
+        stats = {}
+        if "gmean" in needed:
+            stats["gmean"] = np.exp(logS.mean(axis=0))
+        stats["last"] = np.exp(logS[-1])
+        if {"mean", "max", "min"} & set(needed):
+            paths = np.exp(logS, out=logS)
+            if "mean" in needed:
+                stats["mean"] = paths.mean(axis=0)
+            # the spot (1) is part of the extrema
+            if "max" in needed:
+                stats["max"] = np.maximum(paths.max(axis=0), 1.0)
+            if "min" in needed:
+                stats["min"] = np.minimum(paths.min(axis=0), 1.0)
+        return stats
+
+    def price(self, payoff, S, T, r, v, q=0):
+        """
+        Discounted expected payoff and its standard error
+
+        Args:
+            payoff: Payoff object
+            S     : spot, or array of spots (e.g. a strategy grid) priced
+                    with the same paths (common random numbers)
+            T, r, v, q: maturity, risk-free rate, volatility, dividend yield
+
+        Returns:
+            dict of Price, StdErr (shaped as S)
+        """
+        S = np.asarray(S, dtype=float)
+        spots = S.ravel()
+        disc = np.exp(-r * T)
+
+        use_cv = self.control_variate
+        if use_cv:
+            if payoff.K is None:
+                control = lambda stats: stats["last"]
+                mean_control = spots * np.exp((r - q) * T)
+            else:
+                control = Vanilla(payoff.CP, payoff.K)
+                mean_control = BSEngine().greeks(payoff.CP, spots, payoff.K, T, r, v, q)["Price"] / disc
+
+        # running sums of the samples (antithetic pairs are one sample)
+        R, G = self.replicates, len(spots)
+        n = np.zeros(R)
+        sy, sx = np.zeros((R, G)), np.zeros((R, G))
+        syy, sxy, sxx = np.zeros(G), np.zeros(G), np.zeros(G)
+
+        needed = set(payoff.stats) | {"last"}
+        for rep, z in self.normals():
+            unit = self.statistics(z, T, r, v, q, needed)
+            stats = {k: val[:, None] * spots for k, val in unit.items()}
+            y = payoff(stats)
+            x = control(stats) if use_cv else np.zeros_like(y)
+            if self.antithetic:
+                h = len(y) // 2
+                y, x = 0.5 * (y[:h] + y[h:]), 0.5 * (x[:h] + x[h:])
+            n[rep] += len(y)
+            sy[rep] += y.sum(axis=0)
+            sx[rep] += x.sum(axis=0)
+            syy += (y * y).sum(axis=0)
+            sxy += (x * y).sum(axis=0)
+            sxx += (x * x).sum(axis=0)
+
+        N = n.sum()
+        my, mx = sy.sum(axis=0) / N, sx.sum(axis=0) / N
+        vxx, vxy, vyy = sxx / N - mx**2, sxy / N - mx * my, syy / N - my**2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = np.where(vxx > 0, vxy / vxx, 0.0) if use_cv else np.zeros(G)
+        shift = beta * (mx - mean_control) if use_cv else 0.0
+
+        if self.replicates > 1:
+            # spread of the independent (control-adjusted) replicate estimates
+            est = sy / n[:, None] - (beta * (sx / n[:, None] - mean_control) if use_cv else 0)
+            price = est.mean(axis=0)
+            stderr = est.std(axis=0, ddof=1) / np.sqrt(R)
+        else:
+            price = my - shift
+            var = np.maximum(vyy - 2 * beta * vxy + beta**2 * vxx, 0)
+            stderr = np.sqrt(var / max(N - 1, 1))
+
+        return {
+            "Price": (disc * price).reshape(S.shape),
+            "StdErr": (disc * stderr).reshape(S.shape),
+        }
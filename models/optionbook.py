@@ -0,0 +1,191 @@
+"""
+Columnar book of option legs
+"""
+
+import numpy as np
+
+
+class OptionLeg:
+    """
+    Lightweight view on one row of an OptionBook (no data is copied)
+    """
+
+    __slots__ = ("book", "idx")
+
+    def __init__(self, book, idx):
+        self.book = book
+        self.idx = idx
+
+    @property
+    def CP(self):
+        return "C" if self.book.column("CP")[self.idx] else "P"
+
+    @property
+    def NP(self):
+        return self.book.column("NP")[self.idx]
+
+    @property
+    def K(self):
+        return self.book.column("K")[self.idx]
+
+    @property
+    def T(self):
+        return self.book.column("T")[self.idx]
+
+    @property
+    def v(self):
+        return self.book.column("v")[self.idx]
+
+    @property
+    def M(self):
+        return self.book.column("M")[self.idx]
+
+    @property
+    def Pr(self):
+        return self.book.column("Pr")[self.idx]
+
+    def as_dict(self):
+        """
+        Leg data as the dictionary used by the strategy descriptions
+        """
+        return {col: getattr(self, col) for col in OptionBook.columns}
+
+    def __repr__(self):
+        return "OptionLeg({})".format(
+            ", ".join("{}={}".format(k, v) for k, v in self.as_dict().items())
+        )
+
+
+class OptionBook:
+    """
+    Option legs stored as contiguous NumPy columns:
+        CP: True for calls, False for puts
+        NP: net position (> 0 long, < 0 short)
+        K : strike price
+        T : time-to-maturity (years)
+        v : implied volatility
+        M : multiplier
+        Pr: option price
+
+    Columns are over-allocated and grown geometrically, so appending legs one
+    at a time is amortized O(1). Rows are accessed through OptionLeg views.
+    """
+
+    columns = ("CP", "NP", "K", "T", "v", "M", "Pr")
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        self._data = {
+            col: np.empty(capacity, dtype=bool if col == "CP" else float)
+            for col in OptionBook.columns
+        }
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx):
+        if not -self.size <= idx < self.size:
+            raise IndexError("OptionBook index out of range")
+        return OptionLeg(self, idx % self.size)
+
+    def __iter__(self):
+        for idx in range(self.size):
+            yield OptionLeg(self, idx)
+
+    def column(self, col):
+        """
+        View of the used part of a column
+        """
+        return self._data[col][: self.size]
+
+    @property
+    def iscall(self):
+        return self.column("CP")
+
+    def _reserve(self, n):
+        capacity = len(self._data["K"])
+        if self.size + n <= capacity:
+            return
+        capacity = max(2 * capacity, self.size + n)
+        for col, arr in self._data.items():
+            new = np.empty(capacity, dtype=arr.dtype)
+            new[: self.size] = arr[: self.size]
+            self._data[col] = new
+
+    def append(self, CP, NP, K, T, v, M, Pr):
+        """
+        Insert a single leg
+        """
+        self.extend([CP], [NP], [K], [T], [v], [M], [Pr])
+
+    def extend(self, CP, NP, K, T, v, M, Pr):
+        """
+        Bulk insert of legs (arrays or broadcastable scalars).
+        CP may be 'C'/'P' labels or a boolean call mask.
+        """
+        CP = np.asarray(CP)
+        if CP.dtype != bool:
+            if not np.all((CP == "C") | (CP == "P")):
+                raise ValueError("Argument 'CP' must contain only 'C' or 'P'")
+            CP = CP == "C"
+        cols = np.broadcast_arrays(
+            CP, *[np.asarray(x, dtype=float) for x in (NP, K, T, v, M, Pr)]
+        )
+        n = cols[0].size
+        self._reserve(n)
+        for col, val in zip(OptionBook.columns, cols):
+            self._data[col][self.size : self.size + n] = np.ravel(val)
+        self.size += n
+
+    def select(self, mask):
+        """
+        New book with the legs selected by a boolean mask (or index array)
+        """
+        book = OptionBook(capacity=0)
+        book.extend(*[self.column(col)[mask] for col in OptionBook.columns])
+        return book
+
+    def nlv(self):
+        """
+        Net Liquidation Value of each leg: price * net position * multiplier
+        """
+        return self.column("Pr") * self.column("NP") * self.column("M")
+
+    def cost(self, by=None):
+        """
+        Cost of entering the legs, i.e. the sum of their NLVs.
+
+        Args:
+            by: None for the total cost, or a column name (or an array of
+                labels, one per leg) to get the cost of each group
+
+        Returns:
+            float, or dict {group label: cost}
+        """
+        nlv = self.nlv()
+        if by is None:
+            return nlv.sum()
+        keys, inverse = self._groups(by)
+        return dict(zip(keys.tolist(), np.bincount(inverse, weights=nlv)))
+
+    def groupby(self, by):
+        """
+        Split the book in sub-books by the values of a column (or array of labels)
+
+        Returns:
+            dict {group label: OptionBook}
+        """
+        keys, inverse = self._groups(by)
+        return {key: self.select(inverse == n) for n, key in enumerate(keys.tolist())}
+
+    def _groups(self, by):
+        labels = self.column(by) if isinstance(by, str) else np.asarray(by)
+        if len(labels) != self.size:
+            raise ValueError("Group labels must have one entry per leg")
+        return np.unique(labels, return_inverse=True)
+
+    def to_dicts(self):
+        """
+        Legs as a list of dictionaries
+        """
+        return [leg.as_dict() for leg in self]
@@ -0,0 +1,160 @@
+"""
+Multi-process pricing of very large option books
+
+The book is split in shards priced by a ProcessPoolExecutor. Inputs and outputs
+live in multiprocessing.shared_memory blocks: workers attach to them by name
+and read/write their own slice, so no large array is ever pickled, and
+results land directly in input order.
+"""
+
+import os
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from models.bsengine import BSEngine
+
+
+# order of the input rows in the shared input block (CP stored as 1.0 / 0.0)
+INPUTS = ("CP", "S", "K", "T", "r", "v", "q")
+
+
+def _price_shard(inname, outname, n, dtype, keys, start, stop, engine_kwargs, higher_order):
+    """
+    Worker: price options [start, stop) of the shared input block
+    """
+    shm_in = shared_memory.SharedMemory(name=inname)
+    shm_out = shared_memory.SharedMemory(name=outname)
+    try:
+        inputs = np.ndarray((len(INPUTS), n), dtype=dtype, buffer=shm_in.buf)
+        outputs = np.ndarray((len(keys), n), dtype=dtype, buffer=shm_out.buf)
+
+        engine = BSEngine(**engine_kwargs)
+        evaluate = engine.all_greeks if higher_order else engine.greeks
+        cols = inputs[:, start:stop]
+        res = evaluate(cols[0] > 0.5, *cols[1:])
+        for row, key in enumerate(keys):
+            outputs[row, start:stop] = res[key]
+
+        # drop the views before closing the shared blocks
+        del inputs, outputs, cols
+    finally:
+        shm_in.close()
+        shm_out.close()
+
+
+class ParallelPricer:
+    """
+    Parallel executor for BSM prices and greeks of large books.
+
+    Args:
+        workers     : number of worker processes (default: all the cores)
+        shardsize   : number of options priced by each task
+        higher_order: if True compute all_greeks() instead of greeks()
+        normal, kernel, dtype: options of the BSEngine used by the workers
+
+    Books not larger than one shard (or with a single worker) are priced in
+    the calling process. The pool is created on first use and kept alive
+    until close() (or the end of a with block), so repeated calls do not pay
+    the process start-up again.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        shardsize=500_000,
+        higher_order=False,
+        normal=None,
+        kernel="numpy",
+        dtype=np.float64,
+    ):
+        if shardsize < 1:
+            raise ValueError("Argument 'shardsize' must be a positive integer")
+        self.workers = os.cpu_count() if workers is None else workers
+        if self.workers < 1:
+            raise ValueError("Argument 'workers' must be a positive integer")
+        self.shardsize = shardsize
+        self.higher_order = higher_order
+        self.engine_kwargs = {"normal": normal, "kernel": kernel, "dtype": dtype}
+        self.engine = BSEngine(**self.engine_kwargs)
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Shut the worker pool down
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def greeks(self, CP, S, K, T, r, v, q=0):
+        """
+        Price and greeks of the book (arrays or broadcastable scalars)
+
+        Returns:
+            dict of arrays, as BSEngine.greeks (or all_greeks)
+        """
+        evaluate = self.engine.all_greeks if self.higher_order else self.engine.greeks
+        dtype = self.engine.dtype
+        args = np.broadcast_arrays(
+            self.engine.call_mask(CP),
+            *[np.asarray(x, dtype=dtype) for x in (S, K, T, r, v, q)],
+        )
+        shape = args[0].shape
+        n = args[0].size
+
+        if self.workers == 1 or n <= self.shardsize:
+            return evaluate(*args)
+
+        # output keys, from a tiny in-process evaluation
+        keys = list(evaluate(True, 1.0, 1.0, 1.0, 0.0, 0.2, 0.0))
+
+        shm_in = shared_memory.SharedMemory(create=True, size=len(INPUTS) * n * dtype.itemsize)
+        shm_out = shared_memory.SharedMemory(create=True, size=len(keys) * n * dtype.itemsize)
+        try:
+            inputs = np.ndarray((len(INPUTS), n), dtype=dtype, buffer=shm_in.buf)
+            for row, arg in enumerate(args):
+                inputs[row] = np.ravel(arg)
+
+            if self.pool is None:
+                # no plain fork: it deadlocks once numba's threading layer is running
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            futures = [
+                self.pool.submit(
+                    _price_shard,
+                    shm_in.name,
+                    shm_out.name,
+                    n,
+                    dtype.str,
+                    keys,
+                    start,
+                    min(start + self.shardsize, n),
+                    self.engine_kwargs,
+                    self.higher_order,
+                )
+                for start in range(0, n, self.shardsize)
+            ]
+            wait(futures)
+            for f in futures:
+                # re-raise worker errors
+                f.result()
+
+            outputs = np.ndarray((len(keys), n), dtype=dtype, buffer=shm_out.buf)
+            res = {key: outputs[row].reshape(shape).copy() for row, key in enumerate(keys)}
+            del inputs, outputs
+            return res
+        finally:
+            shm_in.close()
+            shm_in.unlink()
+            shm_out.close()
+            shm_out.unlink()
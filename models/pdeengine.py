@@ -0,0 +1,261 @@
+"""
+Crank-Nicolson finite-difference engine for European and American options
+
+One solve gives the price of an option over a whole grid of underlying prices
+(e.g. the S grid of the GUIs) together with Delta, Gamma and Theta from
+the grid, instead of one closed-form evaluation per point.
+"""
+
+import numpy as np
+from models.bsengine import BSEngine
+
+try:
+    from scipy.linalg import solve_banded
+except ImportError:
+    solve_banded = None
+
+
+def _thomas(ab, rhs):
+    """
+    NumPy fallback of scipy.linalg.solve_banded((1, 1), ab, rhs) for
+    tridiagonal systems in banded storage
+    """
+    n = len(rhs)
+    upper, diag, lower = ab
+    cp, dp = np.empty(n), np.empty(n)
+    cp[0], dp[0] = upper[1] / diag[0] if n > 1 else 0.0, rhs[0] / diag[0]
+    for i in range(1, n):
+        denom = diag[i] - lower[i - 1] * cp[i - 1]
+        cp[i] = upper[i + 1] / denom if i < n - 1 else 0.0
+        dp[i] = (rhs[i] - lower[i - 1] * dp[i - 1]) / denom
+    x = np.empty(n)
+    x[-1] = dp[-1]
+    for i in range(n - 2, -1, -1):
+        x[i] = dp[i] - cp[i] * x[i + 1]
+    return x
+
+
+def _stencils(x):
+    """
+    Non-uniform three-point first and second derivative weights at the
+    interior nodes of x: rows (previous, current, next) node
+    """
+    hm, hp = np.diff(x)[:-1], np.diff(x)[1:]
+    d1 = np.array([-hp / (hm * (hm + hp)), (hp - hm) / (hm * hp), hm / (hp * (hm + hp))])
+    d2 = np.array([2 / (hm * (hm + hp)), -2 / (hm * hp), 2 / (hp * (hm + hp))])
+    return d1, d2
+
+
+class PDEEngine:
+    """
+    Crank-Nicolson solver of the BSM PDE on a non-uniform grid of prices.
+
+    The output grid (any sorted positive prices, e.g. BSOptStrat.grid or
+    get_Sset()) is used as is as part of the computational grid, which is
+    only extended with geometrically spaced nodes down to S = 0 and up to
+    a far boundary, and with the strikes: prices and greeks on the output
+    grid need no interpolation. Every time step is one tridiagonal solve for
+    all the contracts at once (their systems are stacked as blocks of one
+    banded matrix). The first `rannacher` steps are replaced by two implicit
+    Euler half steps each, which damps the oscillations of Crank-Nicolson
+    around the kinks of the payoffs.
+
+    Early exercise (American options) is enforced at every step by
+        "penalty": the penalty iteration of Forsyth and Vetzal, a few
+                   tridiagonal solves per step
+        "psor"   : projected SOR, with a red-black ordering of the nodes so
+                   that every sweep is vectorized
+
+    Args:
+        steps    : number of time steps
+        american : if True the options can be exercised at every step
+        exercise : "penalty" or "psor"
+        rannacher: number of Crank-Nicolson steps replaced by implicit half steps
+        tol      : tolerance of the early exercise iterations
+        maxiter  : maximum number of early exercise iterations per step
+                   (penalty solves, or ten times as many PSOR sweeps)
+        omega    : relaxation factor of PSOR
+        growth   : spacing growth of the nodes added outside the output grid
+        width    : number of standard deviations of log(S) covered by the grid
+    """
+
+    exercises = ("penalty", "psor")
+
+    def __init__(
+        self, steps=200, american=True, exercise="penalty", rannacher=2, tol=1e-8,
+        maxiter=100, omega=1.5, growth=1.1, width=5,
+    ):
+        if exercise not in PDEEngine.exercises:
+            raise ValueError("Exercise must be one of {}".format(", ".join(PDEEngine.exercises)))
+        if not 0 <= rannacher < steps:
+            raise ValueError("Argument 'rannacher' must be in [0, steps)")
+        self.steps = steps
+        self.american = american
+        self.exercise = exercise
+        self.rannacher = rannacher
+        self.tol = tol
+        self.maxiter = maxiter
+        self.omega = omega
+        self.growth = growth
+        self.width = width
+
+    def computational_grid(self, grid, K, T, v):
+        """
+        Output grid extended with the strikes, with nodes down to 0 and up to
+        the far boundary (spacing growing geometrically from the grid's own)
+
+        Returns:
+            the computational grid and the positions of the output grid in it
+        """
+        grid = np.asarray(grid, dtype=float)
+        if grid.ndim != 1 or grid.size < 2 or grid[0] <= 0 or np.any(np.diff(grid) <= 0):
+            raise ValueError("The grid must be a sorted array of positive prices")
+
+        h = np.diff(grid)
+        left, step = [], h[0]
+        while grid[0] - step * self.growth > 0:
+            left.append(grid[0] - step)
+            step = step * self.growth + h[0]
+        far = max(2 * grid[-1], np.max(K * np.exp(self.width * v * np.sqrt(T))))
+        right, step = [], h[-1] * self.growth
+        while grid[-1] + step < far:
+            right.append(grid[-1] + step)
+            step = step * self.growth + h[-1]
+        right.append(far)
+
+        x = np.union1d(np.concatenate([[0.0], left, grid, right]), K[(K > 0) & (K < far)])
+        return x, np.searchsorted(x, grid)
+
+    def _boundaries(self, phi, K, r, q, x, tau):
+        """
+        Dirichlet values at S = 0 and at the far boundary after a time tau
+        """
+        low = np.where(phi < 0, K * np.exp(-r * tau), 0.0)
+        high = np.where(phi > 0, x[-1] * np.exp(-q * tau) - K * np.exp(-r * tau), 0.0)
+        if self.american:
+            low = np.where(phi < 0, K, low)
+            high = np.maximum(high, phi * (x[-1] - K))
+        return low, high
+
+    def _solve(self, ab, rhs):
+        """
+        One banded solve of the stacked (contracts x nodes) systems
+        """
+        solver = solve_banded if solve_banded is not None else lambda _, a, b: _thomas(a, b)
+        return solver((1, 1), ab, rhs.ravel()).reshape(rhs.shape)
+
+    def _penalty(self, ab, rhs, V, payoff):
+        """
+        Penalty iteration: nodes below the exercise value get a large
+        penalty pulling them onto it, until the penalized set is stable
+        """
+        big = 1 / self.tol
+        active = V < payoff
+        for _ in range(self.maxiter):
+            pen = np.where(active, big, 0.0)
+            pen[:, [0, -1]] = 0.0
+            banded = ab.copy()
+            banded[1] += pen.ravel()
+            V = self._solve(banded, rhs + pen * payoff)
+            new = V < payoff
+            if np.array_equal(new, active):
+                break
+            active = new
+        return np.maximum(V, payoff)
+
+    def _psor(self, ab, lower, diag, upper, rhs, payoff):
+        """
+        Projected SOR with red-black ordering of the interior nodes, started
+        from the projected solution of the unconstrained step: the sweeps only
+        have to correct the nodes around the exercise boundary
+        """
+        omega = self.omega
+        V = np.maximum(self._solve(ab, rhs), payoff)
+        V[:, 0], V[:, -1] = rhs[:, 0], rhs[:, -1]
+        colors = [np.arange(1 + c, V.shape[1] - 1, 2) for c in (0, 1)]
+        for _ in range(self.maxiter * 10):
+            change = 0.0
+            for i in colors:
+                j = i - 1
+                gs = (rhs[:, i] - lower[:, j] * V[:, i - 1] - upper[:, j] * V[:, i + 1]) / diag[:, j]
+                new = np.maximum(payoff[:, i], V[:, i] + omega * (gs - V[:, i]))
+                change = max(change, np.abs(new - V[:, i]).max())
+                V[:, i] = new
+            if change <= self.tol:
+                break
+        return V
+
+    def solve(self, CP, K, T, r, v, q=0, grid=None):
+        """
+        Prices and greeks of options over a grid of underlying prices
+
+        Args:
+            CP, K, T, r, v, q: as in BSEngine.greeks(), one value (or array
+                               of values) per contract
+            grid: sorted positive underlying prices where the results are returned
+
+        Returns:
+            dict of arrays Price, Delta, Gamma, Theta, of shape
+            (contracts..., len(grid))
+        """
+        args = np.broadcast_arrays(
+            BSEngine.call_mask(CP), *[np.asarray(a, dtype=float) for a in (K, T, r, v, q)]
+        )
+        shape = args[0].shape
+        iscall, K, T, r, v, q = [np.ravel(a)[:, None] for a in args]
+        phi = np.where(iscall, 1.0, -1.0)
+
+        x, out = self.computational_grid(grid, K[:, 0], T[:, 0], v[:, 0])
+        d1, d2 = _stencils(x)
+        alpha, beta = 0.5 * v**2 * x[1:-1] ** 2, (r - q) * x[1:-1]
+        # L V = alpha V'' + beta V' - r V on the interior nodes: (lower, diag, upper)
+        L = [alpha * d2[k] + beta * d1[k] for k in range(3)]
+        L[1] = L[1] - r
+
+        payoff = np.maximum(phi * (x - K), 0.0)
+        V = payoff.copy()
+        n, N = V.shape
+        dt = T / self.steps
+
+        # half steps of implicit Euler first (Rannacher), then Crank-Nicolson:
+        # both solve (I - dt/2 L) V_new = rhs
+        schedule = [True] * (2 * self.rannacher) + [False] * (self.steps - self.rannacher)
+        h = 0.5 * dt
+        lower, diag, upper = -h * L[0], 1 - h * L[1], -h * L[2]
+        ab = np.zeros((3, n, N))
+        ab[1] = 1.0
+        ab[0, :, 2:] = upper
+        ab[1, :, 1:-1] = diag
+        ab[2, :, :-2] = lower
+        ab = ab.reshape(3, n * N)
+
+        tau = np.zeros_like(T)
+        for half in schedule:
+            previous = V
+            rhs = V.copy()
+            if not half:
+                rhs[:, 1:-1] += h * (L[0] * V[:, :-2] + L[1] * V[:, 1:-1] + L[2] * V[:, 2:])
+            tau = tau + (h if half else dt)
+            low, high = self._boundaries(phi, K, r, q, x, tau)
+            rhs[:, :1], rhs[:, -1:] = low, high
+
+            if not self.american:
+                V = self._solve(ab, rhs)
+            elif self.exercise == "penalty":
+                V = self._penalty(ab, rhs, V, payoff)
+            else:
+                V = self._psor(ab, lower, diag, upper, rhs, payoff)
+
+        # greeks from the grid: non-uniform stencils at the output nodes
+        price = V[:, out]
+        hm, hp = x[out] - x[out - 1], x[out + 1] - x[out]
+        Vm, V0, Vp = V[:, out - 1], V[:, out], V[:, out + 1]
+        delta = (-hp / (hm * (hm + hp))) * Vm + ((hp - hm) / (hm * hp)) * V0 + (hm / (hp * (hm + hp))) * Vp
+        gamma = 2 * (Vm / (hm * (hm + hp)) - V0 / (hm * hp) + Vp / (hp * (hm + hp)))
+        # calendar time derivative from the last step (half step if all steps are)
+        last = h if schedule[-1] else dt
+        with np.errstate(divide="ignore", invalid="ignore"):
+            theta = np.where(T > 0, -(V - previous)[:, out] / last, 0.0)
+
+        res = {"Price": price, "Delta": delta, "Gamma": gamma, "Theta": theta}
+        return {k: val.reshape(shape + (len(out),)) for k, val in res.items()}
@@ -0,0 +1,235 @@
+"""
+Vectorized screener of option strategies over an option chain
+
+Every vertical, strangle, butterfly and iron condor of each expiry of a chain
+is enumerated as a row of indices into a per-chain table of prices and greeks,
+and scored without building any BSOptStrat: the payoff at maturity of a whole
+chunk of candidates comes from expirypayoff.breakpoints(), and its exact
+extrema, breakevens, probability of profit and expected P&L under lognormal
+dynamics from the same breakpoints. Candidates are generated and scored in
+chunks of at most `chunksize` rows, and only the running top ones are kept,
+so the peak memory does not depend on the number of combinations.
+
+Example:
+    screener = StrategyScreener(chain, S=100, r=0.03)
+    best = screener.screen(["short iron condor", "bull call"], top=20, by="PoP")
+"""
+
+import numpy as np
+import pandas as pd
+from models.bsengine import BSEngine
+from models.impliedvol import IVSolver
+from models import expirypayoff
+
+
+# family: (leg types, net positions), legs ordered as the candidate index columns
+FAMILIES = {
+    "bull call": ("CC", (+1, -1)),
+    "bear call": ("CC", (-1, +1)),
+    "bull put": ("PP", (+1, -1)),
+    "bear put": ("PP", (-1, +1)),
+    "long strangle": ("PC", (+1, +1)),
+    "short strangle": ("PC", (-1, -1)),
+    "long butterfly": ("CCC", (+1, -2, +1)),
+    "short butterfly": ("CCC", (-1, +2, -1)),
+    "short iron condor": ("PPCC", (+1, -1, -1, +1)),
+    "long iron condor": ("PPCC", (-1, +1, +1, -1)),
+}
+
+GREEKS = ("Delta", "Gamma", "Theta", "Vega")
+
+
+def _pairs(idx):
+    """
+    All (low, high) strike pairs of indices sorted by strike
+    """
+    i, j = np.triu_indices(len(idx), k=1)
+    return np.column_stack([idx[i], idx[j]])
+
+
+class StrategyScreener:
+    """
+    Enumerate and score the strategies of an option chain
+
+    Args:
+        chain    : DataFrame (or dict of arrays) with columns CP, K, T and
+                   price and/or v. Missing implied volatilities are solved
+                   from the prices, missing prices come from the engine
+        S, r, q  : spot, risk-free rate and dividend yield
+        M        : multiplier of every leg
+        sigma    : volatility of the terminal distribution (default: the
+                   at-the-money implied volatility of each expiry)
+        mu       : drift of the terminal distribution (default: r)
+        engine   : BSEngine used for the prices and greeks
+        chunksize: maximum number of candidates scored at once
+    """
+
+    def __init__(
+        self, chain, S, r, q=0, M=100, sigma=None, mu=None, engine=None, chunksize=100_000
+    ):
+        if chunksize < 1:
+            raise ValueError("Argument 'chunksize' must be a positive integer")
+        self.engine = BSEngine() if engine is None else engine
+        self.S, self.r, self.q, self.M = S, r, q, M
+        self.mu = r if mu is None else mu
+        self.chunksize = chunksize
+
+        chain = pd.DataFrame(chain)
+        if "price" not in chain and "v" not in chain:
+            raise ValueError("The chain needs a 'price' or a 'v' column")
+        iscall = BSEngine.call_mask(chain["CP"].to_numpy())
+        K = chain["K"].to_numpy(dtype=float)
+        T = chain["T"].to_numpy(dtype=float)
+        if "v" in chain:
+            v = chain["v"].to_numpy(dtype=float)
+        else:
+            prices = chain["price"].to_numpy(dtype=float)
+            v = IVSolver(self.engine).solve(iscall, prices, S, K, T, r, q)["v"]
+
+        # per-chain table, sorted by expiry, type and strike
+        order = np.lexsort((K, iscall, T))
+        self.iscall, self.K, self.T, self.v = iscall[order], K[order], T[order], v[order]
+        res = self.engine.greeks(self.iscall, S, self.K, self.T, r, self.v, q)
+        self.price = (
+            chain["price"].to_numpy(dtype=float)[order] if "price" in chain else res["Price"]
+        )
+        self.greeks = {key: res[key] for key in GREEKS}
+
+        # volatility of the terminal distribution of each option's expiry
+        self.expiries = np.unique(self.T)
+        if sigma is None:
+            sigma = np.empty(len(self.expiries))
+            for n, t in enumerate(self.expiries):
+                at = np.flatnonzero(self.T == t)
+                dist = np.abs(self.K[at] - S)
+                sigma[n] = self.v[at][dist == dist.min()].mean()
+        self.sigma = np.broadcast_to(np.asarray(sigma, dtype=float), self.expiries.shape)
+
+    def table(self):
+        """
+        Per-chain table of prices and greeks the candidates index into
+        """
+        return pd.DataFrame(
+            {
+                "CP": np.where(self.iscall, "C", "P"),
+                "K": self.K,
+                "T": self.T,
+                "v": self.v,
+                "Price": self.price,
+                **self.greeks,
+            }
+        )
+
+    def _expiry(self, t):
+        """
+        Indices of the calls and of the puts of one expiry, sorted by strike
+        """
+        at = self.T == t
+        return np.flatnonzero(at & self.iscall), np.flatnonzero(at & ~self.iscall)
+
+    def _enumerate(self, family):
+        """
+        Index arrays (candidates x legs) of one family, expiry by expiry
+        """
+        for t in self.expiries:
+            calls, puts = self._expiry(t)
+            if family in ("bull call", "bear call"):
+                yield _pairs(calls)
+            elif family in ("bull put", "bear put"):
+                yield _pairs(puts)
+            elif family in ("long strangle", "short strangle"):
+                p, c = np.meshgrid(puts, calls, indexing="ij")
+                keep = self.K[p] < self.K[c]
+                yield np.column_stack([p[keep], c[keep]])
+            elif family in ("long butterfly", "short butterfly"):
+                wings = _pairs(calls)
+                Kc = self.K[calls]
+                mid = 0.5 * (self.K[wings[:, 0]] + self.K[wings[:, 1]])
+                j = np.minimum(np.searchsorted(Kc, mid), max(len(calls) - 1, 0))
+                keep = (Kc[j] == mid) if len(calls) else np.zeros(len(wings), dtype=bool)
+                yield np.column_stack([wings[keep, 0], calls[j[keep]], wings[keep, 1]])
+            else:
+                # put pairs x call pairs: crossed in blocks of put pairs
+                pput, pcall = _pairs(puts), _pairs(calls)
+                if not len(pput) or not len(pcall):
+                    continue
+                block = max(self.chunksize // len(pcall), 1)
+                for start in range(0, len(pput), block):
+                    pp = pput[start : start + block]
+                    a, b = np.meshgrid(np.arange(len(pp)), np.arange(len(pcall)), indexing="ij")
+                    a, b = a.ravel(), b.ravel()
+                    keep = self.K[pp[a, 1]] < self.K[pcall[b, 0]]
+                    yield np.column_stack([pp[a[keep]], pcall[b[keep]]])
+
+    def candidates(self, family):
+        """
+        Index arrays (candidates x legs) of one family, in chunks of at most chunksize rows
+        """
+        if family not in FAMILIES:
+            raise ValueError(
+                "Unknown family '{}', must be one of {}".format(family, ", ".join(FAMILIES))
+            )
+        for idx in self._enumerate(family):
+            for start in range(0, len(idx), self.chunksize):
+                yield idx[start : start + self.chunksize]
+
+    def score(self, idx, NP):
+        """
+        Score candidate strategies
+
+        Args:
+            idx: (candidates x legs) indices into the chain table, all legs
+                 of a candidate sharing the same expiry
+            NP : net position of each leg
+
+        Returns:
+            dict of arrays with keys Cost (as in BSOptStrat.describe_strat),
+            MaxProfit, MaxLoss, BreakevenLow, BreakevenHigh (nan if none),
+            PoP, Expected and the net Delta, Gamma, Theta, Vega
+        """
+        idx = np.asarray(idx)
+        weights = np.asarray(NP, dtype=float) * self.M
+        premium = self.price[idx]
+        x, y, slopes = expirypayoff.breakpoints(self.iscall[idx], self.K[idx], weights, premium)
+
+        out = {"Cost": premium @ weights}
+        out["MaxProfit"], out["MaxLoss"] = expirypayoff.extrema(x, y, slopes)
+        out["BreakevenLow"], out["BreakevenHigh"] = expirypayoff.breakeven_range(x, y, slopes)
+
+        T = self.T[idx[:, 0]]
+        sigma = self.sigma[np.searchsorted(self.expiries, T)]
+        stats = expirypayoff.lognormal_stats(x, y, slopes, self.S, T, sigma, self.mu, self.q)
+        out.update(stats)
+        for key in GREEKS:
+            out[key] = self.greeks[key][idx] @ weights
+        return out
+
+    def screen(self, families=None, top=20, by="Expected", ascending=False):
+        """
+        Best candidates of the given families (default: all), ranked by one score
+
+        Returns:
+            DataFrame of the `top` candidates with their family, expiry,
+            strikes (low to high leg order of the family) and scores
+        """
+        families = list(FAMILIES) if families is None else list(families)
+        sign = 1 if ascending else -1
+        best = None
+        for family in families:
+            _, NP = FAMILIES[family]
+            for idx in self.candidates(family):
+                if not len(idx):
+                    continue
+                res = self.score(idx, NP)
+                # running top: only the best `top` of each chunk can make it
+                key = np.where(np.isnan(res[by]), np.inf, sign * res[by])
+                keep = np.argpartition(key, top - 1)[:top] if len(key) > top else np.arange(len(key))
+                chunk = pd.DataFrame({key_: val[keep] for key_, val in res.items()})
+                chunk.insert(0, "Family", family)
+                chunk.insert(1, "T", self.T[idx[keep, 0]])
+                chunk.insert(2, "Strikes", [tuple(k) for k in self.K[idx[keep]]])
+                best = chunk if best is None else pd.concat([best, chunk], ignore_index=True)
+                best = best.sort_values(by, ascending=ascending, kind="stable").head(top)
+        if best is None:
+            return pd.DataFrame()
+        return best.reset_index(drop=True)
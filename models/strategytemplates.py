@@ -0,0 +1,214 @@
+"""
+Registry of option strategy templates
+
+A template is a list of leg specs (CP, NP, dK, v, dT):
+    CP: 'C' or 'P'
+    NP: net position (> 0 long, < 0 short)
+    dK: strike offset, in units of the strike width: K = S * (1 + dK * width)
+    v : implied volatility
+    dT: expiry offset (years) added to the strategy maturity (default 0)
+
+Templates compile to leg arrays and can be instantiated over whole arrays of
+spots, maturities and strike widths at once. New templates are registered
+with register_template(), or loaded from a JSON file with load_templates().
+"""
+
+import json
+import numpy as np
+from models.bsengine import BSEngine
+
+
+class StrategyTemplate:
+    """
+    Named strategy made of leg specs, stored as leg arrays
+
+    Args:
+        name       : name of the strategy
+        legs       : sequence of (CP, NP, dK, v) or (CP, NP, dK, v, dT) tuples
+        description: text describing the strategy
+    """
+
+    def __init__(self, name, legs, description=""):
+        if not legs:
+            raise ValueError("A strategy template needs at least one leg")
+        legs = [tuple(leg) + (0.0,) * (5 - len(leg)) for leg in legs]
+        CP, NP, dK, v, dT = zip(*legs)
+        self.name = name
+        self.description = description
+        self.iscall = BSEngine.call_mask(np.array(CP))
+        self.NP = np.array(NP, dtype=float)
+        self.dK = np.array(dK, dtype=float)
+        self.v = np.array(v, dtype=float)
+        self.dT = np.array(dT, dtype=float)
+
+    def __len__(self):
+        return len(self.NP)
+
+    def compile(self, S, T, width=0.05):
+        """
+        Leg arrays of the template instances
+
+        Args:
+            S, T, width: spot, maturity and strike width of the instances
+                         (arrays or broadcastable scalars)
+
+        Returns:
+            dict of arrays CP, NP, K, T, v of shape (instances..., legs),
+            ready for BSOptStrat.add_legs or a BSEngine
+        """
+        S, T, width = [np.asarray(x, dtype=float)[..., None] for x in (S, T, width)]
+        K = S * (1 + self.dK * width)
+        T = T + self.dT
+        shape = np.broadcast_shapes(K.shape, T.shape)
+        return {
+            "CP": np.broadcast_to(self.iscall, shape),
+            "NP": np.broadcast_to(self.NP, shape),
+            "K": np.broadcast_to(K, shape),
+            "T": np.broadcast_to(T, shape),
+            "v": np.broadcast_to(self.v, shape),
+        }
+
+    def evaluate(self, S, T, r=0.03, q=0, width=0.05, M=100, engine=None):
+        """
+        Cost and net greeks at the spot of every template instance,
+        with all the legs of all the instances priced in one engine call
+
+        Returns:
+            dict of arrays with keys Cost, Delta, Gamma, Theta, Vega
+        """
+        engine = BSEngine() if engine is None else engine
+        legs = self.compile(S, T, width)
+        S = np.asarray(S, dtype=float)[..., None]
+        res = engine.greeks(
+            legs["CP"], S, legs["K"], legs["T"], np.asarray(r)[..., None],
+            legs["v"], np.asarray(q)[..., None],
+        )
+        weights = legs["NP"] * M
+        out = {"Cost": (res["Price"] * weights).sum(axis=-1)}
+        for key in ("Delta", "Gamma", "Theta", "Vega"):
+            out[key] = (res[key] * weights).sum(axis=-1)
+        return out
+
+    def build(self, strategy, T, width=0.05):
+        """
+        Add the legs of the template instance (at the strategy spot) to a BSOptStrat
+        """
+        strategy.add_legs(**self.compile(strategy.S, T, width))
+        return strategy
+
+
+# registered templates, in registration order
+TEMPLATES = dict()
+
+
+def register_template(name, legs, description="", replace=False):
+    """
+    Register a new strategy template (see StrategyTemplate)
+    """
+    if name in TEMPLATES and not replace:
+        raise ValueError("Strategy template '{}' already registered".format(name))
+    TEMPLATES[name] = StrategyTemplate(name, legs, description)
+    return TEMPLATES[name]
+
+
+def get_template(name):
+    """
+    Registered template by name
+    """
+    try:
+        return TEMPLATES[name]
+    except KeyError:
+        raise ValueError("Unknown strategy template '{}'".format(name)) from None
+
+
+def template_names():
+    """
+    Names of the registered templates
+    """
+    return tuple(TEMPLATES)
+
+
+def load_templates(path, replace=False):
+    """
+    Register the templates of a JSON file: a list of objects with keys
+    "name", "legs" (list of [CP, NP, dK, v] or [CP, NP, dK, v, dT]) and
+    optionally "description"
+    """
+    with open(path) as f:
+        specs = json.load(f)
+    return [
+        register_template(s["name"], s["legs"], s.get("description", ""), replace)
+        for s in specs
+    ]
+
+
+# Naked
+register_template("Long Call", [("C", +1, 0, 0.30)])
+register_template("Short Call", [("C", -1, 0, 0.30)])
+register_template("Long Put", [("P", +1, 0, 0.30)])
+register_template("Short Put", [("P", -1, 0, 0.30)])
+
+# Bull Spreads
+register_template("Bull Call Spread", [("C", +1, -1, 0.30), ("C", -1, +1, 0.20)])
+register_template("Bull Put Spread", [("P", +1, -1, 0.30), ("P", -1, +1, 0.20)])
+
+# Bear Spreads
+register_template("Bear Call Spread", [("C", +1, +1, 0.20), ("C", -1, -1, 0.30)])
+register_template("Bear Put Spread", [("P", +1, +1, 0.20), ("P", -1, -1, 0.30)])
+
+# Strips
+register_template("Top Strip", [("C", -1, 0, 0.25), ("P", -2, 0, 0.25)])
+register_template("Bottom Strip", [("C", +1, 0, 0.25), ("P", +2, 0, 0.25)])
+
+# Straps
+register_template("Top Strap", [("C", -2, 0, 0.25), ("P", -1, 0, 0.25)])
+register_template("Bottom Strap", [("C", +2, 0, 0.25), ("P", +1, 0, 0.25)])
+
+# Straddles
+register_template("Top Straddle", [("C", -1, 0, 0.25), ("P", -1, 0, 0.25)])
+register_template("Bottom Straddle", [("C", +1, 0, 0.25), ("P", +1, 0, 0.25)])
+
+# Strangles
+register_template("Top Strangle", [("C", -1, +1, 0.20), ("P", -1, -1, 0.30)])
+register_template("Bottom Strangle", [("C", +1, +1, 0.20), ("P", +1, -1, 0.30)])
+
+# Butterflies
+register_template(
+    "Top Butterfly", [("C", +1, -2, 0.30), ("C", +1, +2, 0.20), ("C", -2, 0, 0.25)]
+)
+register_template(
+    "Bottom Butterfly", [("C", -1, -2, 0.30), ("C", -1, +2, 0.20), ("C", +2, 0, 0.25)]
+)
+
+# Iron Condors
+register_template(
+    "Top Iron Condor",
+    [("P", +1, -2, 0.30), ("P", -1, -1, 0.25), ("C", +1, +2, 0.20), ("C", -1, +1, 0.15)],
+)
+register_template(
+    "Bottom Iron Condor",
+    [("P", -1, -2, 0.30), ("P", +1, -1, 0.25), ("C", -1, +2, 0.20), ("C", +1, +1, 0.15)],
+)
+
+# Calendars and diagonals (back month three months after the strategy maturity)
+register_template(
+    "Call Calendar",
+    [("C", -1, 0, 0.25), ("C", +1, 0, 0.25, 0.25)],
+    description="A Call Calendar consists of one short Call and one long Call with the same strike price,\n"
+    "the long Call expiring later. You hope the underlying price will stay close to the strike\n"
+    "until the short Call expires. This strategy requires an initial investment.",
+)
+register_template(
+    "Put Calendar",
+    [("P", -1, 0, 0.25), ("P", +1, 0, 0.25, 0.25)],
+    description="A Put Calendar consists of one short Put and one long Put with the same strike price,\n"
+    "the long Put expiring later. You hope the underlying price will stay close to the strike\n"
+    "until the short Put expires. This strategy requires an initial investment.",
+)
+register_template(
+    "Call Diagonal",
+    [("C", -1, +1, 0.20), ("C", +1, 0, 0.25, 0.25)],
+    description="A Call Diagonal consists of one short OTM Call and one long ATM Call expiring later.\n"
+    "You hope the underlying price will rise slowly towards the short strike.\n"
+    "This strategy requires an initial investment.",
+)
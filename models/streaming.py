@@ -0,0 +1,68 @@
+"""
+Chunked streaming evaluation of BSM prices and greeks
+
+Input chunks come from any iterable: an in-process generator, or a file reader
+such as pandas.read_csv(path, chunksize=...). Only one chunk of inputs and
+outputs is alive at a time, so the peak memory is bounded by the chunk size.
+
+Example:
+    reader = pd.read_csv("universe.csv", chunksize=500_000)
+    for res in stream_greeks(reader, chunksize=100_000, higher_order=True):
+        res.to_csv("greeks.csv", mode="a", header=False)
+"""
+
+import numpy as np
+import pandas as pd
+from models.bsengine import BSEngine
+
+
+# input columns of every chunk (q is optional and defaults to 0)
+COLUMNS = ("CP", "S", "K", "T", "r", "v", "q")
+
+
+def _column(chunk, col, piece):
+    """
+    Slice of one input column (scalar entries of dict chunks are broadcast)
+    """
+    if col == "q" and col not in chunk:
+        return 0
+    val = chunk[col]
+    if isinstance(val, pd.Series):
+        return val.to_numpy()[piece]
+    if np.ndim(val) == 0:
+        return val
+    return np.asarray(val)[piece]
+
+
+def stream_greeks(chunks, engine=None, chunksize=100_000, higher_order=False):
+    """
+    Lazily evaluate price and greeks chunk by chunk
+
+    Args:
+        chunks      : iterable of DataFrames or dicts of arrays with columns
+                      CP, S, K, T, r, v and optionally q
+        engine      : BSEngine used for the computations (default: a new BSEngine)
+        chunksize   : maximum number of options evaluated at once; larger
+                      input chunks are split
+        higher_order: if True yield all_greeks() instead of greeks()
+
+    Yields:
+        one result per (split) input chunk, in input order: a DataFrame
+        with the index of the input rows for DataFrame chunks, a dict of
+        arrays otherwise
+    """
+    if chunksize < 1:
+        raise ValueError("Argument 'chunksize' must be a positive integer")
+    engine = BSEngine() if engine is None else engine
+    evaluate = engine.all_greeks if higher_order else engine.greeks
+
+    for chunk in chunks:
+        # number of rows from the broadcast columns (dict entries may be scalars)
+        n = np.broadcast(*[np.asarray(chunk[col]) for col in COLUMNS if col in chunk]).size
+        for start in range(0, n, chunksize):
+            piece = slice(start, min(start + chunksize, n))
+            res = evaluate(*[_column(chunk, col, piece) for col in COLUMNS])
+            if isinstance(chunk, pd.DataFrame):
+                yield pd.DataFrame(res, index=chunk.index[piece])
+            else:
+                yield res
@@ -0,0 +1,278 @@
+"""
+Vectorized binomial (CRR) and trinomial tree engine for American options
+"""
+
+import numpy as np
+from models.blackscholes import BSOpt
+from models.bsengine import BSEngine
+
+
+class TreeEngine:
+    """
+    Lattice pricer of European and American options, with the greeks() of BSEngine.
+
+    The backward induction is vectorized across the nodes of a time step and
+    across contracts: a chunk of contracts is a (nodes x contracts) buffer,
+    updated in place over one (binomial) or two (trinomial) fewer nodes per
+    step. Every node lies on a price level S exp(k dx) whose exercise value
+    is computed once, so early exercise costs one maximum per step.
+    Delta, Gamma and Theta come from the nodes of the first steps, Vega from
+    a central volatility bump priced in the same induction as the contracts.
+
+    Args:
+        method    : "crr" (Cox-Ross-Rubinstein binomial) or "trinomial"
+        steps     : number of time steps
+        american  : if True the options can be exercised at every node
+        smoothing : if True the last step uses BSM prices instead of the
+                    payoff (smooths the convergence in the number of steps)
+        richardson: if True extrapolate from steps and steps // 2 as
+                    2 * P(steps) - P(steps // 2), for accuracy at low steps
+        chunksize : number of contracts inducted at once
+        dtype     : float64 (default) or float32
+    """
+
+    methods = ("crr", "trinomial")
+
+    def __init__(
+        self, method="crr", steps=200, american=True, smoothing=True, richardson=False,
+        chunksize=256, dtype=np.float64,
+    ):
+        if method not in TreeEngine.methods:
+            raise ValueError("Method must be one of {}".format(", ".join(TreeEngine.methods)))
+        if steps < (8 if richardson else 4):
+            raise ValueError("Argument 'steps' is too small for the greeks of the tree")
+        self.method = method
+        self.steps = steps
+        self.american = american
+        self.smoothing = smoothing
+        self.richardson = richardson
+        self.chunksize = chunksize
+        self.bsengine = BSEngine(dtype=dtype)
+        self.dtype = self.bsengine.dtype
+
+    def _levels(self, phi, S, K, T, r, v, q, dt, dx, last):
+        """
+        Node prices and exercise values of every price level S exp(k dx),
+        k = -last..last, and the option values at the nodes of the last
+        inducted step (BSM prices over one step when smoothing, else the payoff)
+        """
+        k = np.arange(-last, last + 1, dtype=self.dtype)[:, None]
+        nodes = S * np.exp(k * dx)
+        exercise = np.maximum(phi * (nodes - K), 0)
+        if not self.smoothing:
+            return nodes, exercise, exercise.copy()
+        values = self.bsengine.greeks(phi > 0, nodes, K, dt, r, v, q)["Price"]
+        return nodes, exercise, np.maximum(values, exercise) if self.american else values
+
+    def _crr(self, phi, S, K, T, r, v, q, steps):
+        """
+        CRR induction of a chunk of contracts (rows of shape (1, n)), in place
+        on a (nodes x contracts) buffer. The node j of step i lies on the
+        price level 2j - i, so the exercise values of a step are a strided
+        slice of the level exercise values.
+        """
+        dt = T / steps
+        dx = v * np.sqrt(dt)
+        u = np.exp(dx)
+        p = (np.exp((r - q) * dt) - 1 / u) / (u - 1 / u)
+        pdisc, qdisc = np.exp(-r * dt) * p, np.exp(-r * dt) * (1 - p)
+
+        last = steps - 1 if self.smoothing else steps
+        nodes, exercise, V = self._levels(phi, S, K, T, r, v, q, dt, dx, last)
+        # terminal nodes are the levels -last, -last + 2, ..., last
+        V = np.ascontiguousarray(V[::2])
+        tmp = np.empty_like(V)
+
+        saved = {}
+        for i in range(last - 1, -1, -1):
+            new, up = V[: i + 1], tmp[: i + 1]
+            np.multiply(V[1 : i + 2], pdisc, out=up)
+            new *= qdisc
+            new += up
+            if self.american:
+                np.maximum(new, exercise[last - i : last + i + 1 : 2], out=new)
+            if i <= 2:
+                saved[i] = (nodes[last - i : last + i + 1 : 2], new.copy())
+
+        (S1, V1), (S2, V2) = saved[1], saved[2]
+        price = V[0]
+        delta = (V1[1] - V1[0]) / (S1[1] - S1[0])
+        up = (V2[2] - V2[1]) / (S2[2] - S2[1])
+        down = (V2[1] - V2[0]) / (S2[1] - S2[0])
+        gamma = (up - down) / (0.5 * (S2[2] - S2[0]))
+        theta = (V2[1] - price) / (2 * dt[0])
+        return price, delta, gamma, theta
+
+    def _trinomial(self, phi, S, K, T, r, v, q, steps):
+        """
+        Trinomial induction (Boyle: u = exp(v sqrt(2 dt))) of a chunk of
+        contracts, in place as _crr(). The node j of step i lies on the
+        price level j - i.
+        """
+        dt = T / steps
+        half = np.exp(v * np.sqrt(dt / 2))
+        drift = np.exp((r - q) * dt / 2)
+        pu = ((drift - 1 / half) / (half - 1 / half)) ** 2
+        pd = ((half - drift) / (half - 1 / half)) ** 2
+        disc = np.exp(-r * dt)
+        pu, pm, pd = disc * pu, disc * (1 - pu - pd), disc * pd
+
+        last = steps - 1 if self.smoothing else steps
+        nodes, exercise, V = self._levels(phi, S, K, T, r, v, q, dt, 2 * np.log(half), last)
+        tmp, tmp2 = np.empty_like(V), np.empty_like(V)
+
+        for i in range(last - 1, -1, -1):
+            new, acc, mid = V[: 2 * i + 1], tmp[: 2 * i + 1], tmp2[: 2 * i + 1]
+            np.multiply(V[2 : 2 * i + 3], pu, out=acc)
+            np.multiply(V[1 : 2 * i + 2], pm, out=mid)
+            acc += mid
+            new *= pd
+            new += acc
+            if self.american:
+                np.maximum(new, exercise[last - i : last + i + 1], out=new)
+            if i == 1:
+                S1, V1 = nodes[last - 1 : last + 2], new.copy()
+
+        price = V[0]
+        delta = (V1[2] - V1[0]) / (S1[2] - S1[0])
+        up = (V1[2] - V1[1]) / (S1[2] - S1[1])
+        down = (V1[1] - V1[0]) / (S1[1] - S1[0])
+        gamma = (up - down) / (0.5 * (S1[2] - S1[0]))
+        theta = (V1[1] - price) / dt[0]
+        return price, delta, gamma, theta
+
+    def _induction(self, phi, S, K, T, r, v, q, steps):
+        """
+        Price, Delta, Gamma and Theta of flat contract arrays, chunk by chunk
+        """
+        induct = self._crr if self.method == "crr" else self._trinomial
+        out = np.empty((4, len(S)), dtype=self.dtype)
+        for start in range(0, len(S), self.chunksize):
+            piece = slice(start, start + self.chunksize)
+            out[:, piece] = induct(*[x[None, piece] for x in (phi, S, K, T, r, v, q)], steps)
+        return out
+
+    def _evaluate(self, phi, S, K, T, r, v, q, steps):
+        """
+        _induction() with the Richardson extrapolation, if enabled
+        """
+        res = self._induction(phi, S, K, T, r, v, q, steps)
+        if self.richardson:
+            res = 2 * res - self._induction(phi, S, K, T, r, v, q, steps // 2)
+        return res
+
+    def greeks(self, CP, S, K, T, r, v, q=0, dv=0.01):
+        """
+        Price, Lambda, Delta, Gamma, Theta and Vega, as BSEngine.greeks()
+
+        Args:
+            CP, S, K, T, r, v, q: as in BSEngine.greeks() (arrays or broadcastable scalars)
+            dv: volatility bump of the central difference giving Vega
+
+        Returns:
+            dict of arrays with keys Price, Lambda, Delta, Gamma, Theta, Vega
+        """
+        args = np.broadcast_arrays(
+            BSEngine.call_mask(CP), *[np.asarray(x, dtype=self.dtype) for x in (S, K, T, r, v, q)]
+        )
+        shape = args[0].shape
+        iscall, S, K, T, r, v, q = [np.ravel(x) for x in args]
+        phi = np.where(iscall, 1.0, -1.0).astype(self.dtype)
+
+        # expired or zero-volatility options have a deterministic payoff: no tree needed
+        res = self.bsengine.greeks(iscall, S, K, T, r, v, q)
+        if self.american:
+            res["Price"] = np.maximum(res["Price"], phi * (S - K))
+        live = np.flatnonzero((T > 0) & (v > 0))
+
+        if live.size:
+            # the contracts and their volatility bumps go through the same induction
+            n = live.size
+            bumped = [np.tile(x[live], 3) for x in (phi, S, K, T, r, v, q)]
+            bumped[5] = bumped[5] + np.repeat([0, dv, -dv], n).astype(self.dtype)
+            bumped[5][2 * n :] = np.maximum(bumped[5][2 * n :], 1e-8)
+            price, delta, gamma, theta = self._evaluate(*bumped, self.steps)
+
+            res["Price"][live] = price[:n]
+            res["Delta"][live] = delta[:n]
+            res["Gamma"][live] = gamma[:n]
+            res["Theta"][live] = theta[:n]
+            res["Vega"][live] = (price[n : 2 * n] - price[2 * n :]) / (
+                bumped[5][n : 2 * n] - bumped[5][2 * n :]
+            )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lambda_ = res["Delta"] * S / res["Price"]
+        res["Lambda"] = np.where(
+            iscall,
+            np.where((res["Delta"] < 1e-10) | (res["Price"] < 1e-10), np.inf, lambda_),
+            np.where((res["Delta"] > -1e-10) | (res["Price"] < 1e-10), -np.inf, lambda_),
+        )
+        return {k: res[k].reshape(shape) for k in ("Price", "Lambda", "Delta", "Gamma", "Theta", "Vega")}
+
+    def price(self, CP, S, K, T, r, v, q=0):
+        """
+        Prices only (no volatility bumps): one induction per contract
+        """
+        args = np.broadcast_arrays(
+            BSEngine.call_mask(CP), *[np.asarray(x, dtype=self.dtype) for x in (S, K, T, r, v, q)]
+        )
+        shape = args[0].shape
+        iscall, S, K, T, r, v, q = [np.ravel(x) for x in args]
+        phi = np.where(iscall, 1.0, -1.0).astype(self.dtype)
+
+        price = self.bsengine.greeks(iscall, S, K, T, r, v, q)["Price"]
+        if self.american:
+            price = np.maximum(price, phi * (S - K))
+        live = np.flatnonzero((T > 0) & (v > 0))
+        if live.size:
+            price[live] = self._evaluate(
+                *[x[live] for x in (phi, S, K, T, r, v, q)], self.steps
+            )[0]
+        return price.reshape(shape)
+
+
+class TreeOpt(BSOpt):
+    """
+    BSOpt priced on a TreeEngine lattice (American exercise by default):
+    price(), Delta(), ..., greeks() come from the tree, d1() and d2() remain
+    the BSM quantities.
+
+    Args:
+        CP, S, K, T, r, v, q: as in BSOpt
+        tree: TreeEngine of this option (default: TreeOpt.tree, CRR with 200 steps)
+    """
+
+    tree = TreeEngine()
+
+    # the tree results also depend on the option type and on the lattice
+    cache_inputs = BSOpt.cache_inputs + ("CP", "tree")
+
+    def __init__(self, CP, S, K, T, r, v, q=0, tree=None):
+        super().__init__(CP, S, K, T, r, v, q)
+        if tree is not None:
+            self.tree = tree
+
+    def _evaluate(self):
+        """
+        Price and greeks of this option on the tree, cached until an input changes
+        """
+        try:
+            return self._tree_cache
+        except AttributeError:
+            self._tree_cache = {
+                k: val[()]
+                for k, val in self.tree.greeks(
+                    self.CP, self.S, self.K, self.T, self.r, self.v, self.q
+                ).items()
+            }
+            return self._tree_cache
+
+    def Rho(self, dr=1e-4):
+        """
+        Tree Rho, by central difference of the rate
+        """
+        up, down = self.tree.price(
+            self.CP, self.S, self.K, self.T, np.array([self.r + dr, self.r - dr]), self.v, self.q
+        )
+        return (up - down) / (2 * dr)
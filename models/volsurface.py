@@ -0,0 +1,363 @@
+"""
+SVI / SSVI implied volatility surface fitted to option chains
+
+Every expiry of a chain is a slice of total implied variance w(k) = v^2 T as
+a function of the log forward moneyness k = log(K / F), parametrized by the
+raw SVI of Gatheral
+    w(k) = a + b (rho (k - m) + sqrt((k - m)^2 + sigma^2))
+either fitted slice by slice ("svi") or as an SSVI surface (Gatheral and
+Jacquier) whose slices are raw SVI too. Queries of arrays of (K, T) are
+answered from the cached (expiries x 5) raw parameters: total variance is
+interpolated linearly in T at constant moneyness between the slices.
+
+Example:
+    surface = VolSurface(chain, S=100, r=0.03)
+    v = surface.vol(K, T)
+"""
+
+import numpy as np
+import pandas as pd
+from models.bsengine import BSEngine
+from models.impliedvol import IVSolver
+
+
+RAW = ("a", "b", "rho", "m", "sigma")
+
+
+def svi_variance(k, a, b, rho, m, sigma):
+    """
+    Raw SVI total variance at the log moneyness k (broadcast arrays)
+    """
+    z = k - m
+    return a + b * (rho * z + np.sqrt(z**2 + sigma**2))
+
+
+def ssvi_slices(theta, rho, eta, gamma):
+    """
+    Raw SVI parameters (slices x 5) of the SSVI slices with ATM total
+    variances theta and the power-law curvature
+        phi(theta) = eta / (theta^gamma (1 + theta)^(1 - gamma))
+    """
+    theta = np.asarray(theta, dtype=float)
+    phi = eta / (theta**gamma * (1 + theta) ** (1 - gamma))
+    rho = np.broadcast_to(rho, theta.shape)
+    return np.column_stack(
+        [0.5 * theta * (1 - rho**2), 0.5 * theta * phi, rho, -rho / phi, np.sqrt(1 - rho**2) / phi]
+    )
+
+
+def levenberg_marquardt(fun, x, maxiter=200, tol=1e-12):
+    """
+    Batched Levenberg-Marquardt: independent least squares problems solved
+    together, each one with its own damping
+
+    Args:
+        fun: function of x (batch x params) returning the residuals
+             (batch x obs) and their Jacobian (batch x obs x params)
+        x  : initial parameters (batch x params)
+
+    Returns:
+        the fitted parameters and the final sums of squared residuals
+    """
+    x = np.array(x, dtype=float)
+    res, jac = fun(x)
+    cost = np.einsum("bn,bn->b", res, res)
+    lam = np.full(len(x), 1e-3)
+    eye = np.eye(x.shape[1])
+    for _ in range(maxiter):
+        JTJ = np.einsum("bnp,bnq->bpq", jac, jac)
+        grad = np.einsum("bnp,bn->bp", jac, res)
+        A = JTJ + lam[:, None, None] * (JTJ * eye + 1e-12 * eye)
+        step = np.linalg.solve(A, -grad[..., None])[..., 0]
+        # bounded steps: the parametrizations saturate (tanh, exp) far from the data
+        step *= np.minimum(1, 1 / np.maximum(np.abs(step).max(axis=1, keepdims=True), 1e-300))
+        trial = x + step
+        res_t, jac_t = fun(trial)
+        cost_t = np.einsum("bn,bn->b", res_t, res_t)
+        better = cost_t < cost
+        gain = np.where(better, cost - cost_t, 0.0)
+        x = np.where(better[:, None], trial, x)
+        res = np.where(better[:, None], res_t, res)
+        jac = np.where(better[:, None, None], jac_t, jac)
+        cost = np.where(better, cost_t, cost)
+        lam = np.where(better, lam / 3, lam * 4)
+        # stop once every problem has converged or is damped to a halt
+        if np.all(np.where(better, gain <= tol * (1 + cost), lam > 1e10)):
+            break
+    return x, cost
+
+
+class VolSurface:
+    """
+    Implied volatility surface fitted to the quotes of an option chain.
+
+    "svi": every slice is fitted with its own raw SVI parameters. All
+           the slices are fitted at once by a batched Levenberg-Marquardt
+           in an unconstrained parametrization (b > 0, |rho| < 1,
+           sigma > 0, minimum variance a + b sigma sqrt(1 - rho^2) > 0),
+           with a penalty on the calendar spread arbitrage against the
+           previous slice on a grid of moneyness.
+    "ssvi": one SSVI surface, free of calendar and butterfly arbitrage by
+           construction: ATM total variances increasing with T, global
+           rho, and eta (1 + |rho|) <= 2, gamma in (0, 1/2].
+
+    Queries go through the increasing envelope of the slices in T (so that
+    the surface is never calendar arbitrageable, even where the penalty of
+    "svi" is not enough), and the total variance is interpolated linearly
+    in T at constant log moneyness between the slices, from w = 0 at T = 0
+    before the first expiry and at constant implied volatility after the last.
+
+    Refits (fit()) start from the previous parameters when the expiries are
+    unchanged: after small quote moves the fit takes a few iterations only.
+
+    Args:
+        chain   : DataFrame (or dict of arrays) with columns CP, K, T and
+                  price and/or v (missing implied volatilities are solved
+                  from the prices)
+        S, r, q : spot, risk-free rate and dividend yield of the chain
+        model   : "svi" or "ssvi"
+        engine  : BSEngine solving the implied volatilities and pricing greeks()
+        calendar: weight of the calendar arbitrage penalty of "svi"
+        maxiter : maximum number of Levenberg-Marquardt iterations
+    """
+
+    models = ("svi", "ssvi")
+
+    def __init__(self, chain, S, r, q=0, model="svi", engine=None, calendar=1e2, maxiter=200):
+        if model not in VolSurface.models:
+            raise ValueError("Model must be one of {}".format(", ".join(VolSurface.models)))
+        self.S, self.r, self.q = S, r, q
+        self.model = model
+        self.engine = BSEngine() if engine is None else engine
+        self.calendar = calendar
+        self.maxiter = maxiter
+        self._x = None
+        self.fit(chain)
+
+    def forward(self, T):
+        """
+        Forward prices of the maturities T
+        """
+        return self.S * np.exp((self.r - self.q) * np.asarray(T, dtype=float))
+
+    def quotes(self, chain):
+        """
+        Log moneyness, total variance and expiry of the valid quotes of a chain
+        """
+        chain = pd.DataFrame(chain)
+        if "price" not in chain and "v" not in chain:
+            raise ValueError("The chain needs a 'price' or a 'v' column")
+        K = chain["K"].to_numpy(dtype=float)
+        T = chain["T"].to_numpy(dtype=float)
+        if "v" in chain:
+            v = chain["v"].to_numpy(dtype=float)
+        else:
+            iscall = BSEngine.call_mask(chain["CP"].to_numpy())
+            prices = chain["price"].to_numpy(dtype=float)
+            v = IVSolver(self.engine).solve(iscall, prices, self.S, K, T, self.r, self.q)["v"]
+        keep = np.isfinite(v) & (v > 0) & (T > 0) & (K > 0)
+        K, T, v = K[keep], T[keep], v[keep]
+        return np.log(K / self.forward(T)), v**2 * T, T
+
+    def fit(self, chain):
+        """
+        (Re)fit the surface to the quotes of a chain, warm started from the
+        current parameters when the expiries are the same
+        """
+        k, w, T = self.quotes(chain)
+        expiries = np.unique(T)
+        if not len(expiries):
+            raise ValueError("The chain has no valid quote")
+        if self.model == "svi" and np.min(np.unique(T, return_counts=True)[1]) < 5:
+            raise ValueError("Raw SVI needs at least 5 quotes per expiry")
+
+        # (slices x quotes) padded quotes and their mask
+        slot = np.searchsorted(expiries, T)
+        count = np.bincount(slot, minlength=len(expiries))
+        order = np.argsort(slot, kind="stable")
+        col = np.arange(len(T)) - np.repeat(np.cumsum(count) - count, count)
+        kk = np.zeros((len(expiries), count.max()))
+        ww = np.zeros_like(kk)
+        mask = np.zeros_like(kk, dtype=bool)
+        kk[slot[order], col], ww[slot[order], col] = k[order], w[order]
+        mask[slot[order], col] = True
+
+        warm = self._x is not None and np.array_equal(expiries, self.expiries)
+        self.expiries = expiries
+        self.kgrid = np.linspace(k.min(), k.max(), 21)
+        if self.model == "svi":
+            self._fit_svi(kk, ww, mask, warm)
+        else:
+            self._fit_ssvi(kk, ww, mask, warm)
+        return self
+
+    @staticmethod
+    def _raw(x):
+        """
+        Raw SVI parameters (slices x 5) from the unconstrained ones
+        (log minimum variance, log b, atanh rho, m, log sigma)
+        """
+        b, rho, sigma = np.exp(x[:, 1]), np.tanh(x[:, 2]), np.exp(x[:, 4])
+        a = np.exp(x[:, 0]) - b * sigma * np.sqrt(1 - rho**2)
+        return np.column_stack([a, b, rho, x[:, 3], sigma])
+
+    @staticmethod
+    def _svi_jacobian(k, x):
+        """
+        Total variances of the slices at k (slices x points) and their
+        derivatives w.r.t. the unconstrained parameters (slices x points x 5)
+        """
+        a, b, rho, m, sigma = [p[:, None] for p in VolSurface._raw(x).T]
+        c = np.sqrt(1 - rho**2)
+        z = k - m
+        R = np.sqrt(z**2 + sigma**2)
+        w = a + b * (rho * z + R)
+        jac = np.stack(
+            [
+                np.broadcast_to(np.exp(x[:, :1]), z.shape),
+                b * (rho * z + R - sigma * c),
+                b * sigma * rho * c + b * z * c**2,
+                -b * (rho + z / R),
+                b * sigma * (sigma / R - c),
+            ],
+            axis=-1,
+        )
+        return w, jac
+
+    def _fit_svi(self, k, w, mask, warm):
+        if warm:
+            x = self._x
+        else:
+            # start from the SSVI fit of the chain: every slice starts from a smile
+            # consistent with the other expiries
+            self._fit_ssvi(k, w, mask, warm=False)
+            a, b, rho, m, sigma = self.params.T
+            rho = np.clip(rho, -1 + 1e-9, 1 - 1e-9)
+            x = np.column_stack(
+                [np.log(a + b * sigma * np.sqrt(1 - rho**2)), np.log(b), np.arctanh(rho), m, np.log(sigma)]
+            )
+
+        weight = np.sqrt(self.calendar)
+        kgrid = np.broadcast_to(self.kgrid, (len(w), len(self.kgrid)))
+
+        def fun(x):
+            model, jac = self._svi_jacobian(k, x)
+            res = np.where(mask, model - w, 0.0)
+            jac = np.where(mask[..., None], jac, 0.0)
+            # calendar penalty: slice i below slice i - 1 (at its current parameters)
+            grid, gjac = self._svi_jacobian(kgrid, x)
+            below = np.zeros_like(grid)
+            below[1:] = np.maximum(state["previous"][:-1] - grid[1:], 0)
+            active = below > 0
+            pen = weight * below
+            pjac = np.where(active[..., None], -weight * gjac, 0.0)
+            return np.concatenate([res, pen], axis=1), np.concatenate([jac, pjac], axis=1)
+
+        # Gauss-Seidel on the calendar penalty: previous slices held at their last fit
+        state = {"previous": self._svi_jacobian(kgrid, x)[0]}
+        for _ in range(5):
+            x, _ = levenberg_marquardt(fun, x, self.maxiter)
+            grid = self._svi_jacobian(kgrid, x)[0]
+            if np.all(np.diff(grid, axis=0) >= -1e-10):
+                break
+            state["previous"] = grid
+        self._x = x
+        self.params = self._raw(x)
+
+    def _ssvi(self, y):
+        """
+        Raw SVI parameters of the SSVI surface of the unconstrained parameters
+        y = (atanh rho, logit of eta (1 + |rho|) / 2, logit of 2 gamma, log theta increments)
+        """
+        rho = np.tanh(y[0])
+        eta = 2 / (1 + np.abs(rho)) / (1 + np.exp(-y[1]))
+        gamma = 0.5 / (1 + np.exp(-y[2]))
+        theta = np.cumsum(np.exp(y[3:]))
+        return ssvi_slices(theta, rho, eta, gamma)
+
+    def _fit_ssvi(self, k, w, mask, warm):
+        n = len(w)
+        if warm:
+            y = self._x
+        else:
+            # ATM total variances: the quote nearest to k = 0 of each slice
+            atm = np.where(mask, np.abs(k), np.inf).argmin(axis=1)
+            theta = np.maximum.accumulate(np.maximum(w[np.arange(n), atm], 1e-6))
+            y = np.concatenate([[0.0, 0.0, 0.0], np.log(np.maximum(np.diff(theta, prepend=0), 1e-8))])
+
+        p = len(y)
+        h = 1e-7 * np.maximum(1, np.abs(y))
+
+        def fun(Y):
+            # the parameters and their bumps are one batch of surfaces
+            batch = np.vstack([Y[0], Y[0] + np.diag(h)])
+            res = np.stack([
+                np.where(mask, svi_variance(k, *self._ssvi(yy).T[..., None]) - w, 0.0).ravel()
+                for yy in batch
+            ])
+            return res[:1], ((res[1:] - res[0]) / h[:, None]).T[None]
+
+        y, _ = levenberg_marquardt(fun, y[None], self.maxiter)
+        self._x = y[0]
+        self.params = self._ssvi(y[0])
+
+    def slices(self):
+        """
+        Raw SVI parameters of the slices, one row per expiry
+        """
+        return pd.DataFrame(self.params, index=pd.Index(self.expiries, name="T"), columns=RAW)
+
+    def total_variance(self, k, T):
+        """
+        Total implied variance at the log forward moneyness k and maturity T
+        (broadcast arrays), from the increasing envelope of the slices
+        """
+        k, T = np.broadcast_arrays(np.asarray(k, dtype=float), np.asarray(T, dtype=float))
+        # every slice at every query moneyness, made non-decreasing in T
+        W = svi_variance(k[..., None], *self.params.T)
+        W = np.maximum.accumulate(np.maximum(W, 0), axis=-1)
+
+        E = self.expiries
+        i = np.clip(np.searchsorted(E, T, side="right") - 1, 0, len(E) - 1)
+        j = np.minimum(i + 1, len(E) - 1)
+        Wi = np.take_along_axis(W, i[..., None], -1)[..., 0]
+        Wj = np.take_along_axis(W, j[..., None], -1)[..., 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(j > i, (T - E[i]) / (E[j] - E[i]), 0.0)
+        inside = Wi + weight * (Wj - Wi)
+        # before the first expiry from w = 0, after the last one at constant volatility
+        return np.where(T < E[0], Wi * T / E[0], np.where(T > E[-1], Wj * T / E[-1], inside))
+
+    def vol(self, K, T):
+        """
+        Implied volatilities of the strikes K and maturities T (broadcast arrays)
+        """
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=float), np.asarray(T, dtype=float))
+        k = np.log(K / self.forward(T))
+        w = self.total_variance(k, np.maximum(T, self.expiries[0] * 1e-6))
+        # expired options: volatility of the first slice at the same moneyness
+        return np.sqrt(w / np.maximum(T, self.expiries[0] * 1e-6))
+
+    def calendar_arbitrage(self, k=None):
+        """
+        Largest decrease of the raw slices' total variance from an expiry to
+        the next one over the log moneyness k (default: the fitted range).
+        0 means no calendar arbitrage before the envelope of total_variance()
+        """
+        k = self.kgrid if k is None else np.asarray(k, dtype=float)
+        W = svi_variance(k[:, None], *self.params.T)
+        return float(max(0.0, -np.diff(W, axis=1).min(initial=0)))
+
+    def greeks(self, CP, K, T, S=None, engine=None):
+        """
+        Prices and greeks of options with the surface volatilities: one
+        vectorized vol() lookup and one engine pass (engine.greeks())
+
+        Args:
+            CP, K, T: option types, strikes and maturities (broadcast arrays)
+            S       : underlying prices (default: the spot of the surface)
+            engine  : engine pricing the options (default: the surface engine)
+        """
+        engine = self.engine if engine is None else engine
+        S = self.S if S is None else S
+        return engine.greeks(CP, S, K, T, self.r, self.vol(K, T), self.q)
@@ -7,7 +7,8 @@ from matplotlib.widgets import Slider
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 import matplotlib.pyplot as plt
-from models.blackscholes import BSOpt
+from models.bsengine import BSEngine
+from models.adaptivegrid import adaptive_grid
 
 plt.style.use("seaborn-dark")
 
@@ -229,7 +230,7 @@ class PlotGUI:
         self.q = self.get_q()
         self.Smin = self.get_Smin(self.K)
         self.Smax = self.get_Smax(self.K)
-        self.Sset = self.get_Sset(self.Smin, self.Smax)
+        self.Sset = self.get_Sset(self.Smin, self.Smax, self.K)
 
         # Descriptions
         self.descrelief = "flat"
@@ -495,11 +496,12 @@ class PlotGUI:
         return round(K * (1 + 0.6), 0)
 
     @staticmethod
-    def get_Sset(Smin, Smax):
+    def get_Sset(Smin, Smax, K):
         """
-        Generation of 150 underlying prices for the plots
+        Generation of 150 underlying prices for the plots,
+        refined around the strike where the greeks peak near expiry
         """
-        return np.linspace(Smin, Smax, 150)
+        return adaptive_grid(Smin, Smax, 150, nodes=[K])
 
     def define_slider(
         self, sliderax, labl="Slider", vmin=0, vmax=1, vstp=0.1, vini=0.5
@@ -530,13 +532,12 @@ class PlotGUI:
         self.q = self.get_q()
         self.Smin = self.get_Smin(self.K)
         self.Smax = self.get_Smax(self.K)
-        self.Sset = self.get_Sset(self.Smin, self.Smax)
+        self.Sset = self.get_Sset(self.Smin, self.Smax, self.K)
 
-        # calc the option
-        self.option = [
-            BSOpt(self.CP, s, self.K, self.T, self.r, self.v, q=self.q)
-            for s in self.Sset
-        ]
+        # calc the option over the whole set of underlyings in one vectorized call
+        self.option = BSEngine().greeks(
+            self.CP, self.Sset, self.K, self.T, self.r, self.v, q=self.q
+        )
 
         # update description
         self.updatedescription()
@@ -598,12 +599,12 @@ class PlotGUI:
                 self.ax = self.ax.flatten()
 
             # Get prices and greeks for all set of underlyings
-            self.prices = [o.price() for o in self.option]
-            self.lambdas = [o.Lambda() for o in self.option]
-            self.deltas = [o.delta() for o in self.option]
-            self.gammas = [o.gamma() * 100 for o in self.option]
-            self.thetas = [o.theta() for o in self.option]
-            self.vegas = [o.vega() for o in self.option]
+            self.prices = self.option["Price"]
+            self.lambdas = self.option["Lambda"]
+            self.deltas = self.option["Delta"]
+            self.gammas = self.option["Gamma"] * 100
+            self.thetas = self.option["Theta"]
+            self.vegas = self.option["Vega"]
 
             # Plot
             (self.p0,) = self.ax[0].plot(self.Sset, self.prices, color="tab:blue")
@@ -766,26 +767,23 @@ class PlotGUI:
             current_v = self.slider_v.val
 
             # update option given the new values of the sliders
-            self.option = [
-                BSOpt(
-                    self.CP,
-                    s,
-                    self.K,
-                    current_T,
-                    current_r / 100,
-                    current_v / 100,
-                    q=self.q,
-                )
-                for s in self.Sset
-            ]
+            self.option = BSEngine().greeks(
+                self.CP,
+                self.Sset,
+                self.K,
+                current_T,
+                current_r / 100,
+                current_v / 100,
+                q=self.q,
+            )
 
             # Get prices and greeks for all set of underlyings for new values of the sliders
-            self.prices = [o.price() for o in self.option]
-            self.lambdas = [o.lambda_() for o in self.option]
-            self.deltas = [o.delta() for o in self.option]
-            self.gammas = [o.gamma() * 100 for o in self.option]
-            self.thetas = [o.theta() for o in self.option]
-            self.vegas = [o.vega() for o in self.option]
+            self.prices = self.option["Price"]
+            self.lambdas = self.option["Lambda"]
+            self.deltas = self.option["Delta"]
+            self.gammas = self.option["Gamma"] * 100
+            self.thetas = self.option["Theta"]
+            self.vegas = self.option["Vega"]
 
             # Update plot
             self.p0.set_ydata(self.prices)
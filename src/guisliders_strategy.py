@@ -5,15 +5,26 @@ import matplotlib.pyplot as plt
 from matplotlib.axis import Axis
 from matplotlib.widgets import Slider
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from models.blackscholes_strategy import BSOptStrat
+from models.blackscholes_strategy import BSOptStrat, PayoffLattice
+from models.strategytemplates import get_template, template_names
 
 class PlotGUI():
-    def __init__(self, root, colorpalette = 'light'):
+    def __init__(self, root, colorpalette = 'light', lattice = True, greeks = (), engine = None, surface = None):
         """
         root:          tkinter object
         colorpalette:  GUI color palette. Currently light and dark mode supported.
+        lattice:       if True, the strategy payoffs of every slider state are precomputed
+                       in background after each calculation (see models.blackscholes_strategy.PayoffLattice)
+        greeks:        names of the net strategy greeks plotted in extra panels below the payoffs,
+                       e.g. ("Delta", "Gamma"). No greek panel by default.
+        engine:        engine pricing the legs (default: BSM), e.g. models.americanengine.AmericanEngine("baw")
+                       for American options: the net early exercise premium is then shown with the probabilities
+        surface:       fitted models.volsurface.VolSurface: the custom legs whose volatility entry is left
+                       empty take their volatility from it
         """
         self.root = root
+        self.engine = engine
+        self.surface = surface
 
         # GUI window title
         self.root.title('Option strategy payoff calculator')
@@ -94,27 +105,8 @@ class PlotGUI():
         self.choose_strat_label_name = "Choose Strategy"
 
         # Set of pre-defined option strategies
-        self.strat_options = ("Custom strategy",
-                              "Long Call",
-                              "Short Call",
-                              "Long Put",
-                              "Short Put",
-                              "Bull Call Spread",
-                              "Bull Put Spread",
-                              "Bear Call Spread",
-                              "Bear Put Spread",
-                              "Top Strip",
-                              "Bottom Strip",
-                              "Top Strap",
-                              "Bottom Strap",
-                              "Top Straddle",
-                              "Bottom Straddle",
-                              "Top Strangle",
-                              "Bottom Strangle",
-                              "Top Butterfly",
-                              "Bottom Butterfly",
-                              "Top Iron Condor",
-                              "Bottom Iron Condor")  #  I hate these top/bottom names, rename to long/short.
+        # (pre-defined strategies are the templates of models.strategytemplates)
+        self.strat_options = ("Custom strategy",) + template_names()  #  I hate these top/bottom names, rename to long/short.
 
         # chosen strategy (custom or predefined)
         self.chosen_strategy = None
@@ -145,6 +137,13 @@ class PlotGUI():
         # maximum volatility allowed
         self.maxvola = 130
 
+        # precomputed lattice of slider states
+        self.lattice = lattice
+        self.Lattice = None
+
+        # net strategy greeks panels
+        self.greeks = tuple(greeks)
+
         # define the left frame of the gui
         self.left_frame()
 
@@ -398,6 +397,22 @@ class PlotGUI():
             tk.messagebox.showerror("Volatility value error", "Enter a valid volatility value (between 1% and {}%)".format(self.maxvola))
 
 
+    def get_optT(self):
+        '''
+        Get the time-to-maturity of an option in the "Custom strategy"
+        '''
+        try:
+            # Get the inserted maturity inserted in the current T-Entry in the "Custom strategy"
+            T = float(self.Entries[self.addoption_times]["T"].get())
+            if T < 0 or T > 5:
+                tk.messagebox.showerror("Maturity value error", "Enter a maturity between 0 and 5 (years)")
+            else:
+                return T
+        except:
+            # Returns error if a non-scalar maturity is entered
+            tk.messagebox.showerror("Maturity value error", "Enter a valid maturity value (between 0 and 5 years)")
+
+
     def get_NP(self):
         '''
         Get the Net Position of an option in the "Custom strategy"
@@ -608,6 +623,12 @@ class PlotGUI():
 
             self.gridcol = self.gridcol + 1
 
+            # Label time-to-maturity of the option (calendars and diagonals have different ones)
+            self.label_optT = self.create_tklabel(labeltext = "Maturity")
+            self.config_tklabel(self.label_optT, labelpady = self.first_addopt_padys, labelsticky = "nsw")
+
+            self.gridcol = self.gridcol + 1
+
             # Label Quantity NP
             self.label_NP = self.create_tklabel(labeltext = "Quantity")
             self.config_tklabel(self.label_NP, labelpady = self.first_addopt_padys, labelsticky = "nsw")
@@ -649,6 +670,12 @@ class PlotGUI():
 
             self.gridcol = self.gridcol + 1
 
+            # Entry time-to-maturity of the option (default: the strategy maturity)
+            self.entry_optT = self.create_tkentry()
+            self.config_tkentry(self.entry_optT, entrypady = self.other_addopt_padys, entrydefval = self.get_T())
+
+            self.gridcol = self.gridcol + 1
+
             # Entry Quantity NP
             self.entry_NP = self.create_tkentry()
             self.config_tkentry(self.entry_NP, entrypady = self.other_addopt_padys)
@@ -669,6 +696,7 @@ class PlotGUI():
 
             self.Entries[self.addoption_times] = {"K": self.entry_K,
                                                   "v": self.entry_v,
+                                                  "T": self.entry_optT,
                                                   "NP": self.entry_NP}
 
             # Save the current labels/prices for the Option prices
@@ -703,19 +731,31 @@ class PlotGUI():
             # Non scalar Strike Price entered
             valid_K = False
 
-        # Validate the volatility
-        v = self.get_v()
-        try:
-            if v < 1.0 or v > 150.0:
-                # Volatility less than 1% or greater than 100% entered
+        # Validate the volatility (an empty entry takes the volatility of the surface, if any)
+        if self.surface is not None and not self.Entries[self.addoption_times]["v"].get().strip():
+            valid_v = True
+            self.CusOptData[self.addoption_times]["v"] = None
+        else:
+            v = self.get_v()
+            try:
+                if v < 1.0 or v > 150.0:
+                    # Volatility less than 1% or greater than 100% entered
+                    valid_v = False
+                else:
+                    # A correct volatility inserted (positive scalar between 1% and 100%)
+                    valid_v = True
+                    self.CusOptData[self.addoption_times]["v"] = v / 100
+            except:
+                # Non scalar volatility entered
                 valid_v = False
-            else:
-                # A correct volatility inserted (positive scalar between 1% and 100%)
-                valid_v = True
-                self.CusOptData[self.addoption_times]["v"] = v / 100
-        except:
-            # Non scalar volatility entered
-            valid_v = False
+
+        # Validate the option maturity
+        T = self.get_optT()
+        if T is not None:
+            valid_T = True
+            self.CusOptData[self.addoption_times]["T"] = T
+        else:
+            valid_T = False
 
         # Validate the Net Position
         NP = self.get_NP()
@@ -728,7 +768,7 @@ class PlotGUI():
             valid_NP = False
 
         # Validate variable
-        validdata = valid_K and valid_v and valid_NP
+        validdata = valid_K and valid_v and valid_T and valid_NP
 
         return validdata
 
@@ -800,7 +840,7 @@ class PlotGUI():
         self.T = self.get_T()
 
         # Create strategy class with the underlying price, the time-to-maturity, and the dividend yield
-        self.Strategy = BSOptStrat(S = self.S, r = self.r, q = self.q)
+        self.Strategy = BSOptStrat(S = self.S, r = self.r, q = self.q, engine = self.engine, surface = self.surface)
 
         # Auxiliary increase/decrese for strike prices in the pre-defined strategies (according to current level of the underlying price)
         dS = 5/100
@@ -850,194 +890,27 @@ class PlotGUI():
                 CP = self.CusOptData[nopt]["CP"]
                 K  = self.CusOptData[nopt]["K"]
                 v  = self.CusOptData[nopt]["v"]
+                T  = self.CusOptData[nopt]["T"]
                 NP = self.CusOptData[nopt]["NP"]
 
-                # Inserting the option in the strategy
+                # Inserting the option in the strategy (each option has its own maturity)
                 if CP == "C":
-                    self.Strategy.call(NP=NP, K=K, T=self.T, v=v)
+                    self.Strategy.call(NP=NP, K=K, T=T, v=v)
                 else:
-                    self.Strategy.put(NP=NP, K=K, T=self.T, v=v)
-
-
-        # Naked
-
-        elif self.chosen_strategy == "Long Call":
-            # Long Call (ATM option)
-            self.Strategy.call(NP = 1, K = self.S, T = self.T, v = 30/100)
-
-        elif self.chosen_strategy == "Short Call":
-            # Short Call (ATM option)
-            self.Strategy.call(NP = -1, K = self.S, T = self.T, v = 30/100)
-
-        elif self.chosen_strategy == "Long Put":
-            # Long Put (ATM option)
-            self.Strategy.put(NP = +1, K = self.S, T = self.T, v = 30/100)
-
-        elif self.chosen_strategy == "Short Put":
-            # Short Put (ATM option)
-            self.Strategy.put(NP = -1, K = self.S, T = self.T, v = 30/100)
-
-
-        # Bull Spreads
-
-        elif self.chosen_strategy == "Bull Call Spread":
-            # Bull Call Spread
-            # - 1 long ITM call (K<S)
-            # - 1 short OTM call (K>S)
-            self.Strategy.call(NP = 1,  K = self.S*(1 - dS), T = self.T, v = 30/100)
-            self.Strategy.call(NP = -1, K = self.S*(1 + dS), T = self.T, v = 20/100)
-
-        elif self.chosen_strategy == "Bull Put Spread":
-            # Bull Put Spread
-            # - 1 long OTM put (K<S)
-            # - 1 short ITM put (K>S)
-            self.Strategy.put(NP = 1,  K = self.S*(1 - dS), T = self.T, v = 30/100)
-            self.Strategy.put(NP = -1, K = self.S*(1 + dS), T = self.T, v = 20/100)
-
-
-        # Bear Spreads
-
-        elif self.chosen_strategy == "Bear Call Spread":
-            # Bear Call Spread
-            # - 1 long OTM call (K>S)
-            # - 1 short ITM call (K<S)
-            self.Strategy.call(NP = 1,  K = self.S*(1 + dS), T = self.T, v = 20/100)
-            self.Strategy.call(NP = -1, K = self.S*(1 - dS), T = self.T, v = 30/100)
-
-        elif self.chosen_strategy == "Bear Put Spread":
-            # Bear Put Spread
-            # - 1 long ITM put (K>S)
-            # - 1 short OTM put (K<S)
-            self.Strategy.put(NP = 1,  K = self.S*(1 + dS), T = self.T, v = 20/100)
-            self.Strategy.put(NP = -1, K = self.S*(1 - dS), T = self.T, v = 30/100)
-
-
-        # Straps
-
-        elif self.chosen_strategy == "Top Strip":
-            # Top Strip (asymmetric straddle)
-            # - 1 short call
-            # - 2 short put
-            # at the same strike price
-            self.Strategy.call(NP = -1, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = -2, K = self.S, T = self.T, v = 25/100)
-
-        elif self.chosen_strategy == "Bottom Strip":
-            # Bottom Strip (asymmetric straddle)
-            # - 1 long call
-            # - 2 long put
-            # at the same strike price
-            self.Strategy.call(NP = +1, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = +2, K = self.S, T = self.T, v = 25/100)
-
-
-        # Strips
-
-        elif self.chosen_strategy == "Top Strap":
-            # Top Strap (asymmetric straddle)
-            # - 2 short call
-            # - 1 short put
-            # at the same strike price
-            self.Strategy.call(NP = -2, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = -1, K = self.S, T = self.T, v = 25/100)
-
-        elif self.chosen_strategy == "Bottom Strap":
-            # Bottom Strap (asymmetric straddle)
-            # - 2 long call
-            # - 1 long put
-            # at the same strike price
-            self.Strategy.call(NP = +2, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = +1, K = self.S, T = self.T, v = 25/100)
-
+                    self.Strategy.put(NP=NP, K=K, T=T, v=v)
 
-        # Straddles
 
-        elif self.chosen_strategy == "Top Straddle":
-            # Top Straddle
-            # - 1 short call
-            # - 1 short put
-            # at the same strike price
-            self.Strategy.call(NP = -1, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = -1, K = self.S, T = self.T, v = 25/100)
-
-        elif self.chosen_strategy == "Bottom Straddle":
-            # Bottom Straddle
-            # - 1 long call
-            # - 1 long put
-            # at the same strike price
-            self.Strategy.call(NP = +1, K = self.S, T = self.T, v = 25/100)
-            self.Strategy.put(NP  = +1, K = self.S, T = self.T, v = 25/100)
-
-
-        # Strangles
-
-        elif self.chosen_strategy == "Top Strangle":
-            # Top Strangle
-            # - 1 short call
-            # - 1 short put
-            # at different strike prices
-            self.Strategy.call(NP = -1, K = self.S*(1 + dS), T = self.T, v = 20/100)
-            self.Strategy.put(NP  = -1, K = self.S*(1 - dS), T = self.T, v = 30/100)
-
-        elif self.chosen_strategy == "Bottom Strangle":
-            # Bottom Strangle
-            # - 1 long call
-            # - 1 long put
-            # at different strike prices
-            self.Strategy.call(NP = +1, K = self.S*(1 + dS), T = self.T, v = 20/100)
-            self.Strategy.put(NP  = +1, K = self.S*(1 - dS), T = self.T, v = 30/100)
-
-
-        # Butterflies
-
-        elif self.chosen_strategy == "Top Butterfly":
-            # Top Butterfly
-            # - 1 long ITM call
-            # - 1 long OTM call
-            # - 2 short ATM call
-            self.Strategy.call(NP = +1, K = self.S*(1 - dS*2), T = self.T, v = 30/100)
-            self.Strategy.call(NP = +1, K = self.S*(1 + dS*2), T = self.T, v = 20/100)
-            self.Strategy.call(NP = -2, K = self.S, T = self.T, v = 25/100)
-
-        elif self.chosen_strategy == "Bottom Butterfly":
-            # Bottom Butterfly
-            # - 1 short ITM call
-            # - 1 short OTM call
-            # - 2 long ATM call
-            self.Strategy.call(NP = -1, K = self.S*(1 - dS*2), T = self.T, v = 30/100)
-            self.Strategy.call(NP = -1, K = self.S*(1 + dS*2), T = self.T, v = 20/100)
-            self.Strategy.call(NP = +2, K = self.S, T = self.T, v = 25/100)
-
-
-        # Iron Condors
-
-        elif self.chosen_strategy == "Top Iron Condor":
-            # Top Iron Condor
-            # - Bull Put Spread:
-            #   1 long put and 1 short put at different strikes,
-            #   both smaller than the strikes of the Bear Call Spreads
-            self.Strategy.put(NP = +1, K = self.S*(1 - dS*2), T = self.T, v = 30/100)
-            self.Strategy.put(NP = -1, K = self.S*(1 - dS),   T = self.T, v = 25/100)
-            # - Bear Call Spread:
-            #   1 long call and 1 short call at different strikes
-            self.Strategy.call(NP = +1, K = self.S*(1 + dS*2), T = self.T, v = 20/100)
-            self.Strategy.call(NP = -1, K = self.S*(1 + dS),   T = self.T, v = 15/100)
-
-        elif self.chosen_strategy == "Bottom Iron Condor":
-            # Bottom Iron Condor
-            # - Bear Put Spread:
-            #   1 short put and 1 long put at different strikes,
-            #   both smaller than the strikes of the Bear Call Spreads
-            self.Strategy.put(NP = -1, K = self.S*(1 - dS*2), T = self.T, v = 30/100)
-            self.Strategy.put(NP = +1, K = self.S*(1 - dS),   T = self.T, v = 25/100)
-            # - Bull Call Spread:
-            #   1 short call and 1 long call at different strikes
-            self.Strategy.call(NP = -1, K = self.S*(1 + dS*2), T = self.T, v = 20/100)
-            self.Strategy.call(NP = +1, K = self.S*(1 + dS),   T = self.T, v = 15/100)
+        else:
+            # Pre-defined strategy: the legs of its template (strike offsets in units of dS)
+            # are compiled into leg arrays and inserted at once
+            get_template(self.chosen_strategy).build(self.Strategy, T = self.T, width = dS)
 
 
         # Create the StratData dictionary with inserted options and the total strategy price
-        self.StratData = self.Strategy.describe_strategy()
+        self.StratData = self.Strategy.describe_strat()
+
+        # Adaptive grid of underlying prices: refined around strikes, breakevens and payoff kinks
+        self.Strategy.refine_grid()
 
         # Once the startegy option has been created
         # - if the strategy was the custom one, then the prices of single option should be put on the GUI
@@ -1170,13 +1043,16 @@ class PlotGUI():
         self.slider_T_ax  = plt.axes([0.35, 0.06, 0.50, 0.015])
         self.slider_dv_ax = plt.axes([0.35, 0.03, 0.50, 0.015])
 
-        # Maturity slider
+        # Horizon slider: time elapsed from now, up to the last expiry of the strategy.
+        # Legs expired before the horizon are valued at their intrinsic value
+        self.Tmax = max(self.StratData[opt]["T"] for opt in set(self.StratData.keys()) - set({"Cost"}))
+        self.slider_T_label = "Horizon (years)"
         self.slider_T = self.define_slider(self.slider_T_ax,
-                                            labl = "Time to Maturity (years)",
+                                            labl = self.slider_T_label,
                                             vmin = 0,
-                                            vmax = self.T,
+                                            vmax = self.Tmax,
                                             vstp = 0.00274,
-                                            vini = self.T)
+                                            vini = 0)
         self.slider_T.label.set_color(self.sliderlabfg)
         self.slider_T.valtext.set_color(self.sliderlabfg)
 
@@ -1204,6 +1080,41 @@ class PlotGUI():
         self.slider_T.on_changed(self.onslide)
         self.slider_dv.on_changed(self.onslide)
 
+        # Precompute the strategy payoffs of all the slider states
+        if self.lattice:
+            self.start_lattice()
+
+
+    def start_lattice(self):
+        '''
+        Start filling the (horizon x delta-vola x S) lattice of strategy payoffs in a background thread
+        '''
+        # Stop the lattice of the previous calculation, if any
+        if self.Lattice is not None:
+            self.Lattice.cancel()
+
+        self.Lattice = PayoffLattice(self.Strategy,
+                                     PayoffLattice.axis(self.slider_T.valmin, self.slider_T.valmax, self.slider_T.valstep),
+                                     PayoffLattice.axis(self.slider_dv.valmin, self.slider_dv.valmax, self.slider_dv.valstep) / 100)
+        self.Lattice.start()
+        self.lattice_progress(self.Lattice)
+
+
+    def lattice_progress(self, lattice):
+        '''
+        Show the filling progress of the lattice in the maturity slider label
+        '''
+        if lattice is not self.Lattice:
+            # A newer calculation replaced this lattice
+            return
+
+        if lattice.done:
+            self.slider_T.label.set_text(self.slider_T_label)
+        else:
+            self.slider_T.label.set_text("{} [precomputing {:.0f}%]".format(self.slider_T_label, lattice.progress * 100))
+            self.root.after(200, self.lattice_progress, lattice)
+        self.canvas.draw_idle()
+
 
     def plot_strat_payoff(self):
         '''
@@ -1215,7 +1126,7 @@ class PlotGUI():
                 self.ax[axn].clear()
 
         except:
-            self.ax = self.fig.subplots(2,1)
+            self.ax = self.fig.subplots(2 + len(self.greeks), 1, squeeze = False)
             self.ax = self.ax.flatten()
 
         # Top plot
@@ -1235,14 +1146,52 @@ class PlotGUI():
                                     label = "Current payoff",
                                     alpha = 0.7)
 
+        # Exact breakevens and extrema of the payoff at maturity (not limited to the grid points)
+        expiry = self.Strategy.expiry_payoff()
+        extrema = "max profit {}, max loss {}".format(*["unlimited" if np.isinf(val) else "{:.0f}".format(val)
+                                                        for val in (expiry.max_profit, expiry.max_loss)])
+
         # Strategy payoff at maturity (T=0)
         self.pffmat, = self.ax[1].plot(self.Strategy.payoffs_exp.index,
                                         self.Strategy.payoffs_exp.values,
                                         color = self.payoffcolplot,
                                         linestyle = "--",
-                                        label = "Payoff at maturity (T=0)",
+                                        label = "Payoff at maturity (T=0): {}".format(extrema),
                                         alpha = 1)
 
+        # Breakevens within the plotted range of underlying prices
+        breakevens = expiry.breakevens()
+        breakevens = breakevens[(breakevens >= self.Strategy.grid[0]) & (breakevens <= self.Strategy.grid[-1])]
+        if len(breakevens):
+            self.ax[1].plot(breakevens,
+                            np.zeros(len(breakevens)),
+                            color = self.payoffcolplot,
+                            linestyle = "",
+                            marker = "o",
+                            label = "Breakevens: {}".format(", ".join("{:.2f}".format(b) for b in breakevens)))
+
+        # Closed-form probability of profit, expected P&L and shortfall (they change with slider_dv, not slider_h)
+        self.probtext = self.ax[1].text(0.01, 0.97,
+                                        self.probability_text(),
+                                        transform = self.ax[1].transAxes,
+                                        verticalalignment = "top",
+                                        fontsize = 9,
+                                        color = self.labplotfg)
+
+        # Net strategy greeks panels (they change with the sliders)
+        self.greeklines = dict()
+        if self.greeks:
+            greeks = self.Strategy.get_greeks(names = self.greeks)
+            for n, name in enumerate(self.greeks):
+                self.greeklines[name], = self.ax[2 + n].plot(greeks.index,
+                                                             greeks[name].values,
+                                                             color = self.payoffcolplot,
+                                                             label = "Net {}".format(name))
+                self.ax[2 + n].grid()
+                self.ax[2 + n].legend(fontsize=9)
+                plt.setp(self.ax[2 + n].get_xticklabels(), fontsize=8, color=self.labplotfg)
+                plt.setp(self.ax[2 + n].get_yticklabels(), fontsize=8, color=self.labplotfg)
+
         # Get current xlim and ylim
         self.stratxlim = self.ax[1].get_xlim()
         self.stratylim = self.ax[1].get_ylim()
@@ -1287,69 +1236,39 @@ class PlotGUI():
         Recompute option data and update plot when slider values changes
         '''
         # Get current sliders' values
-        current_T  = self.slider_T.val
+        current_h  = self.slider_T.val
         current_dv = self.slider_dv.val
 
-        # Update Option given the new values of the sliders
-        self.StrategySlider = BSOptStrat(S = self.S , r = self.r, q = self.q)
-
-        # If-Else according to the inserted strategy
-
-        if self.chosen_strategy == "Custom strategy":
-            # Custom strategy
-            # Recover values of the CusOptData dictionary
-
-            # For loop over each option inserted
-            for nopt in self.CusOptData.keys():
-                if self.CusOptData[nopt]["CP"] == "C":
-                    # Current option is a Call
-                    self.StrategySlider.call(NP = self.CusOptData[nopt]["NP"],
-                                            K = self.CusOptData[nopt]["K"],
-                                            T = current_T,
-                                            v = self.CusOptData[nopt]["v"] + current_dv / 100,
-                                            optprice = self.StratData[f"Option_{nopt}"]["Pr"])
-                else:
-                    # Current option is a Put
-                    self.StrategySlider.put(NP = self.CusOptData[nopt]["NP"],
-                                            K = self.CusOptData[nopt]["K"],
-                                            T = current_T,
-                                            v = self.CusOptData[nopt]["v"] + current_dv / 100,
-                                            optprice = self.StratData[f"Option_{nopt}"]["Pr"])
-
-        else:
-            # Pre-defined strategy
-            # Recover values of the StratData dictionary
-
-            for opt in set(self.StratData.keys()) - set({"Cost"}):
-                if self.StratData[opt]["CP"] == "C":
-                    # Current option is a Call
-                    self.StrategySlider.call(NP = self.StratData[opt]["NP"],
-                                            K = self.StratData[opt]["K"],
-                                            T = current_T,
-                                            v = self.StratData[opt]["v"] + current_dv / 100,
-                                            optprice = self.StratData[opt]["Pr"])
-                else:
-                    # Current option is a Put
-                    self.StrategySlider.put(NP = self.StratData[opt]["NP"],
-                                            K = self.StratData[opt]["K"],
-                                            T = current_T,
-                                            v = self.StratData[opt]["v"] + current_dv / 100,
-                                            optprice = self.StratData[opt]["Pr"])
-
-
         # Update plot
-        if current_T == 0:
+        if current_h >= self.Tmax:
             self.pff.set_ydata(self.Strategy.payoffs_exp.values)
         else:
-            self.pff.set_ydata(self.StrategySlider.payoffs.values)
+            # Precomputed payoff of the current slider state, if the lattice is ready there
+            payoffs = self.Lattice.lookup(current_h, current_dv / 100) if self.Lattice is not None else None
 
-        self.pffmat.set_ydata(self.Strategy.payoffs_exp.values)
+            if payoffs is None:
+                # Incremental update of the strategy: only the current payoffs of the legs
+                # are repriced (through the leg cache) with their remaining maturities
+                payoffs = self.Strategy.reprice(dv = current_dv / 100, horizon = current_h).values
+
+            self.pff.set_ydata(payoffs)
+
+        # Update net greeks panels (one engine pass for all the legs)
+        if self.greeks:
+            greeks = self.Strategy.get_greeks(dv = current_dv / 100, horizon = current_h, names = self.greeks)
+            for n, name in enumerate(self.greeks):
+                self.greeklines[name].set_ydata(greeks[name].values)
+                self.ax[2 + n].relim()
+                self.ax[2 + n].autoscale_view()
+
+        # Update probabilities at maturity with the shifted volatility (the horizon only moves the early exercise premium)
+        self.probtext.set_text(self.probability_text(current_dv / 100, current_h))
 
         # Update title
-        self.ax[1].set_title("Total strategy payoff ({:.0f} days left)".format(current_T*365), fontsize=self.titplotfontsize)
+        self.ax[1].set_title("Total strategy payoff ({:.0f} days from now)".format(current_h*365), fontsize=self.titplotfontsize)
 
         # Set new axis
-        if current_T == 0:
+        if current_h >= self.Tmax:
             self.ax[1].set_xlim( self.stratxlim[0], self.stratxlim[1] )
             self.ax[1].set_ylim( self.stratylim[0], self.stratylim[1] )
 
@@ -1357,6 +1276,28 @@ class PlotGUI():
         self.updateplot()
 
 
+    def probability_text(self, dv = 0, horizon = 0):
+        '''
+        Probability of profit, expected P&L and expected shortfall at maturity
+        under lognormal dynamics (closed forms, cheap enough for every slider move),
+        and the net early exercise premium of the legs when they are American.
+        The probabilities always run from today's spot to the expiry: they follow
+        the volatility slider, not the horizon one. Strategies with several expiries
+        (calendars, diagonals) have no single payoff at maturity: no probabilities
+        '''
+        try:
+            stats = self.Strategy.probabilities(dv = dv)
+        except ValueError:
+            text = "P(profit): n/a with several expiries"
+        else:
+            shortfall = "n/a" if np.isnan(stats["Shortfall"]) else "{:.0f}".format(stats["Shortfall"])
+            text = "At expiry from today: P(profit) {:.1%}, E[P&L] {:.0f}, E[P&L | loss] {}".format(
+                stats["PoP"], stats["Expected"], shortfall)
+        if self.engine is not None:
+            text += "\nEarly exercise premium {:.2f}".format(self.Strategy.early_exercise_premium(dv = dv, horizon = horizon))
+        return text
+
+
     def updateplot(self):
         '''
         Update plot
@@ -1524,6 +1465,11 @@ with both strikes of the Bull Spread larger than those of the Bear Spread.
 You hope there will be a big underlying price move and you are not sure in which direction the move will be.
 This is a strategy similar to a Bottom Strangle even though profits are limited.'''
 
+        else:
+            # Registered template with its own description
+            desc = get_template(self.chosen_strategy).description
+            nrows = desc.count("\n") + 1
+
         # Save description and number of rows
         Desc["msg"]   = desc
         Desc["nrows"] = nrows
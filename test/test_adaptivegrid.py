@@ -0,0 +1,52 @@
+import numpy as np
+from models.adaptivegrid import adaptive_grid, node_density_grid
+from models.blackscholes_strategy import BSOptStrat
+from models.bsengine import BSEngine
+
+
+def test_node_density_grid():
+    grid = node_density_grid(60, 140, 199, nodes=[95, 105, 200])
+    assert grid[0] == 60 and grid[-1] == 140
+    assert len(grid) <= 199
+    assert np.all(np.diff(grid) > 0)
+    assert 95 in grid and 105 in grid
+    # finer around the nodes than far from them
+    spacing = np.diff(grid)
+    assert spacing[np.searchsorted(grid, 95)] < 0.5 * spacing[0]
+
+
+def test_adaptive_grid_beats_uniform_on_kinks():
+    # short-dated call: almost a kink at the strike
+    def price(S):
+        return BSEngine().greeks("C", S, 100, 2 / 365, 0.03, 0.2)["Price"]
+
+    dense = np.linspace(60, 140, 100001)
+    ref = price(dense)
+    grid = adaptive_grid(60, 140, 60, nodes=[100], f=price, tol=1e-4)
+    uniform = np.linspace(60, 140, len(grid))
+    err = np.abs(np.interp(dense, grid, price(grid)) - ref).max()
+    err_uniform = np.abs(np.interp(dense, uniform, price(uniform)) - ref).max()
+    assert len(grid) <= 60
+    assert err < 0.1 * err_uniform
+
+
+def test_adaptive_grid_stops_at_tolerance():
+    # a line is interpolated exactly: no refinement beyond the initial quarter
+    grid = adaptive_grid(0, 1, 1000, f=lambda x: 2 * x + 1, tol=1e-9)
+    assert len(grid) == 250
+
+
+def test_strategy_refine_grid():
+    strat = BSOptStrat(S=100, r=0.02)
+    strat.call(NP=1, K=95, T=0.05, v=0.2)
+    strat.call(NP=-1, K=105, T=0.05, v=0.2)
+    strat.refine_grid(points=120)
+    assert len(strat.grid) <= 120
+    assert 95 in strat.grid and 105 in strat.grid
+    assert strat.grid[0] == 60 and strat.grid[-1] == 140
+
+    expiry = strat.expiry_payoff()
+    np.testing.assert_allclose(strat.get_payoffs_exp(), expiry(strat.grid), atol=1e-9)
+    current = strat.get_payoffs().to_numpy()
+    np.testing.assert_allclose(strat.reprice().to_numpy(), current)
+    assert strat.get_greeks().shape == (len(strat.grid), 5)
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest as pyt
+from models.americanengine import AmericanEngine
+from models.blackscholes import BSOpt
+from models.blackscholes_strategy import BSOptStrat, LegCache
+from models.bsengine import BSEngine
+from models.treeengine import TreeEngine
+
+
+# Haug (2007), tables of the Barone-Adesi-Whaley and Bjerksund-Stensland 2002
+# approximations: K = 100, T = 0.1, r = 10%, b = 0 (q = r), v = 15%, S = 90, 100
+HAUG = {
+    "baw": ([0.0206, 1.8771], [10.0000, 1.8770]),
+    "bs2002": ([0.0205, 1.8757], [10.0000, 1.8757]),
+}
+
+
+@pyt.mark.parametrize("method", AmericanEngine.methods)
+def test_reference_values(method):
+    S = np.array([90.0, 100.0])
+    engine = AmericanEngine(method)
+    for CP, ref in zip("CP", HAUG[method]):
+        price = engine.greeks(CP, S, 100, 0.1, 0.1, 0.15, 0.1)["Price"]
+        np.testing.assert_allclose(price, ref, atol=5e-4)
+
+
+@pyt.mark.parametrize("method", AmericanEngine.methods)
+def test_close_to_lattice(method):
+    rng = np.random.default_rng(3)
+    n = 100
+    CP = rng.random(n) < 0.5
+    S = rng.uniform(80, 120, n)
+    T = rng.uniform(0.05, 1, n)
+    r, v, q = rng.uniform(0.01, 0.08, n), rng.uniform(0.15, 0.45, n), rng.uniform(0.01, 0.06, n)
+    tree = TreeEngine(steps=1000).greeks(CP, S, 100, T, r, v, q)
+    res = AmericanEngine(method).greeks(CP, S, 100, T, r, v, q)
+    assert np.max(np.abs(res["Price"] - tree["Price"])) < 0.1
+    assert np.max(np.abs(res["Delta"] - tree["Delta"])) < 0.02
+    assert np.median(np.abs(res["Vega"] - tree["Vega"])) < 0.1
+
+
+def test_zero_rate():
+    # calls with a dividend yield are exercised early even at r = 0, the limit of BAW's exponent
+    args = ("C", 100, 100, 1, 0.0, 0.3, 0.05)
+    tree = TreeEngine("crr", 2000, richardson=True).greeks(*args)["Price"]
+    european = BSEngine().greeks(*args)["Price"]
+    for method, atol in (("baw", 0.01), ("bs2002", 0.1)):
+        engine = AmericanEngine(method)
+        with np.errstate(all="raise"):
+            price = engine.greeks(*args)["Price"]
+        assert price == pyt.approx(tree, abs=atol)
+        assert price > european + 0.4
+        assert price == pyt.approx(engine.greeks("C", 100, 100, 1, 1e-9, 0.3, 0.05)["Price"], abs=1e-6)
+
+
+def test_no_early_exercise():
+    S = np.linspace(60, 140, 9)
+    european = BSEngine().greeks("C", S, 100, 1, 0.05, 0.25)
+    for method in AmericanEngine.methods:
+        engine = AmericanEngine(method)
+        # calls without dividend yield are European
+        american = engine.greeks("C", S, 100, 1, 0.05, 0.25)
+        for key in european:
+            np.testing.assert_allclose(american[key], european[key])
+        # otherwise the American price is above the European one and the intrinsic value
+        put = engine.greeks("P", S, 100, 1, 0.05, 0.25)["Price"]
+        assert np.all(put >= BSEngine().greeks("P", S, 100, 1, 0.05, 0.25)["Price"] - 1e-12)
+        assert np.all(put >= 100 - S - 1e-12)
+        premium = engine.early_exercise_premium("P", S, 100, 1, 0.05, 0.25)
+        assert np.all(premium >= -1e-12) and premium.max() > 0
+
+
+def test_critical_price_iteration():
+    engine = AmericanEngine("baw")
+    phi = np.array([1.0, -1.0])
+    K, T, r, b, v = [np.full(2, x) for x in (100.0, 0.5, 0.08, 0.04, 0.3)]
+    Sx, exponent = engine.critical_price(phi, K, T, r, b, v)
+    assert Sx[0] > 100 > Sx[1]
+    # the price at the critical price is smooth: exercise value and approximation meet
+    inside = engine.american_price(phi, Sx * (1 - 1e-6 * phi), K, T, r, v, r - b)
+    np.testing.assert_allclose(inside, phi * (Sx - K), atol=1e-3)
+
+
+@pyt.mark.parametrize("method", AmericanEngine.methods)
+def test_all_greeks(method):
+    args = ("P", np.array([36.0, 40.0, 44.0]), 40, 1, 0.06, 0.2)
+    engine = AmericanEngine(method)
+    res = engine.all_greeks(*args)
+    american, bsm = engine.greeks(*args), BSEngine().all_greeks(*args)
+    # American first orders, BSM higher orders consistent with the BSM Vega and Gamma
+    for key in american:
+        np.testing.assert_allclose(res[key], american[key])
+    for key in ("Vanna", "Volga", "Charm", "Speed", "Zomma", "Color"):
+        np.testing.assert_allclose(res[key], bsm[key])
+    assert not np.allclose(res["Vega"], bsm["Vega"])
+    assert np.all(res["Rho"] > bsm["Rho"])
+
+
+def test_bivariate_normal():
+    engine = AmericanEngine("bs2002")
+    a, b = np.array([-1.0, 0.3, 2.0]), np.array([0.5, -0.7, 1.0])
+    # independence and symmetry in the arguments
+    np.testing.assert_allclose(engine.bivariate_normal(a, b, 0), engine.N(a) * engine.N(b))
+    np.testing.assert_allclose(engine.bivariate_normal(a, b, 0.7), engine.bivariate_normal(b, a, 0.7))
+    # M(a, b; rho) + M(a, -b; -rho) = N(a)
+    np.testing.assert_allclose(
+        engine.bivariate_normal(a, b, 0.8) + engine.bivariate_normal(a, -b, -0.8), engine.N(a), atol=1e-12
+    )
+
+
+def test_selectable_engines():
+    engine = AmericanEngine("bs2002")
+    opt = BSOpt("P", 36, 40, 1, 0.06, 0.2, engine=engine)
+    # lattice value 4.4867, the flat boundaries of BS2002 exercise slightly too late
+    assert opt.price() == pyt.approx(4.4867, abs=3e-2)
+    assert opt.Rho() < 0
+    assert opt.price() > BSOpt("P", 36, 40, 1, 0.06, 0.2).price()
+
+    cache = LegCache()
+    american = BSOptStrat(S=100, r=0.06, engine=engine, cache=cache)
+    european = BSOptStrat(S=100, r=0.06, cache=cache)
+    for strat in (american, european):
+        strat.put(NP=+1, K=110, T=0.5, v=0.3)
+    # the model is part of the cache keys
+    assert cache.hits == 0
+    assert american.describe_strat()["Cost"] > european.describe_strat()["Cost"]
+    assert american.early_exercise_premium() > 0
+    assert european.early_exercise_premium() == 0
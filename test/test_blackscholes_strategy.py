@@ -0,0 +1,212 @@
+import numpy as np
+import pytest as pyt
+from models.blackscholes import BSOpt as BSOptScalar
+from models.blackscholes_strategy import BSOpt, BSOptStrat, LegCache, PayoffLattice, strategy_probabilities
+
+
+def test_setprices_match_scalar_facade():
+    option = BSOpt("P", 100, 95, 0.5, 0.03, 0.25, q=0.01)
+    prices = option.setprices()
+    assert len(prices) == 199
+    for S in prices.index[[0, 60, 99, 198]]:
+        ref = BSOptScalar("P", S, 95, 0.5, 0.03, 0.25, q=0.01).price()
+        assert prices[S] == pyt.approx(ref)
+
+
+def test_strategy_payoffs():
+    strat = BSOptStrat(S=100, r=0.02)
+    strat.call(NP=1, K=100, T=0.25, v=0.2, M=100)
+    strat.put(NP=-1, K=90, T=0.25, v=0.2, M=100, optprice=1.5)
+    S = strat.get_payoffs_exp().index.to_numpy()
+    call = BSOptScalar("C", 100, 100, 0.25, 0.02, 0.2).price()
+    expected = (np.maximum(S - 100, 0) - call) * 100 - (np.maximum(90 - S, 0) - 1.5) * 100
+    np.testing.assert_allclose(strat.get_payoffs_exp().to_numpy(), expected, atol=1e-9)
+    assert strat.get_payoffs_exp_df().shape == (199, 2)
+    assert strat.describe_strat()["Cost"] == pyt.approx(round(call, 2) * 100 - 150)
+
+
+def test_strategy_dtype():
+    strat = BSOptStrat(S=100, dtype=np.float32)
+    strat.call(NP=2, K=105, T=0.5, v=0.3)
+    assert strat.engine.dtype == np.float32
+    for payoffs in (strat.get_payoffs(), strat.get_payoffs_exp()):
+        assert payoffs.dtype == np.float32
+        assert payoffs.index.dtype == np.float32
+
+    ref = BSOptStrat(S=100)
+    ref.call(NP=2, K=105, T=0.5, v=0.3)
+    np.testing.assert_allclose(
+        strat.get_payoffs().to_numpy(), ref.get_payoffs().to_numpy(), rtol=1e-5, atol=1e-3
+    )
+
+
+def test_bulk_legs_match_single_legs():
+    K = np.linspace(80, 120, 20)
+    NP = np.where(np.arange(20) % 2, 1, -1)
+    bulk = BSOptStrat(S=100, r=0.03, q=0.01, capacity=2)
+    bulk.add_legs(np.where(K > 100, "C", "P"), NP, K, 0.5, 0.25, M=10)
+    single = BSOptStrat(S=100, r=0.03, q=0.01)
+    for n in range(20):
+        leg = single.call if K[n] > 100 else single.put
+        leg(NP=NP[n], K=K[n], T=0.5, v=0.25, M=10)
+
+    assert bulk.nlegs == single.nlegs == 20
+    np.testing.assert_allclose(bulk.get_payoffs(), single.get_payoffs(), atol=1e-9)
+    np.testing.assert_allclose(bulk.get_payoffs_exp(), single.get_payoffs_exp(), atol=1e-9)
+    np.testing.assert_allclose(bulk.get_payoffs_exp_df(), single.get_payoffs_exp_df())
+    assert list(bulk.get_payoffs_exp_df().columns) == list(range(1, 21))
+
+
+def test_reprice_matches_new_strategy():
+    strat = BSOptStrat(S=100, r=0.02, q=0.01)
+    strat.call(NP=1, K=95, T=0.5, v=0.3)
+    strat.put(NP=-2, K=105, T=0.5, v=0.25)
+    current = strat.get_payoffs().to_numpy()
+    np.testing.assert_allclose(strat.reprice().to_numpy(), current)
+
+    legs = strat.describe_strat()
+    ref = BSOptStrat(S=100, r=0.02, q=0.01)
+    ref.call(NP=1, K=95, T=0.2, v=0.35, optprice=strat._premium[0])
+    ref.put(NP=-2, K=105, T=0.2, v=0.30, optprice=strat._premium[1])
+    expiry = strat.get_payoffs_exp().to_numpy()
+    np.testing.assert_allclose(strat.reprice(T=0.2, dv=0.05), ref.get_payoffs(), atol=1e-9)
+    np.testing.assert_allclose(strat.get_payoffs_exp(), expiry)
+    assert strat.describe_strat() == legs
+
+
+def test_leg_cache_reuse_and_eviction():
+    cache = LegCache(maxsize=6)
+    strat = BSOptStrat(S=100, cache=cache)
+    strat.call(NP=1, K=100, T=0.5, v=0.3)
+    strat.put(NP=1, K=100, T=0.5, v=0.3)
+    assert len(cache) == 4 and cache.hits == 0
+
+    # slider back and forth: the second visit is served from the cache
+    strat.reprice(T=0.25)
+    strat.reprice(T=0.5)
+    hits = cache.hits
+    strat.reprice(T=0.25)
+    assert cache.hits == hits + 2
+
+    # a new strategy on the same grid reuses the rows of the first one
+    # (current and expiry prices)
+    other = BSOptStrat(S=100, cache=cache)
+    other.call(NP=-1, K=100, T=0.25, v=0.3)
+    assert cache.hits == hits + 4
+
+    strat.reprice(T=0.1)
+    strat.reprice(T=0.05)
+    assert len(cache) == 6
+
+
+def test_payoff_lattice_matches_reprice():
+    # calendar: short front month, long back month
+    strat = BSOptStrat(S=100, r=0.02)
+    strat.call(NP=-1, K=100, T=0.25, v=0.3)
+    strat.call(NP=1, K=100, T=0.5, v=0.25)
+    horizons = PayoffLattice.axis(0, 0.5, 0.00274)
+    dvset = PayoffLattice.axis(-24, 100, 1) / 100
+    assert horizons[0] == 0 and horizons[-1] == 0.5 and len(horizons) == 184
+    assert len(dvset) == 125
+
+    lattice = PayoffLattice(strat, horizons, dvset, blocksize=100_000)
+    assert lattice.lookup(0.25, 0) is None
+    lattice.start().join()
+    assert lattice.done and lattice.progress == 1
+
+    np.testing.assert_allclose(lattice.lookup(0, 0), strat.get_payoffs(), atol=1e-9)
+    np.testing.assert_allclose(lattice.lookup(0.5, 0.1), strat.get_payoffs_exp(), atol=1e-9)
+    h, dv = horizons[77], dvset[40]
+    np.testing.assert_allclose(lattice.lookup(h, dv), strat.reprice(dv=dv, horizon=h), atol=1e-9)
+    # states off the lattice are not approximated
+    assert lattice.lookup(h + 0.001, dv) is None
+
+
+def test_horizon_valuation():
+    # diagonal: short front-month call, long back-month call at a lower strike
+    strat = BSOptStrat(S=100, r=0.02, q=0.01)
+    strat.call(NP=-1, K=105, T=0.1, v=0.3, M=10)
+    strat.call(NP=1, K=100, T=0.4, v=0.25, M=10)
+    horizons = np.array([0, 0.05, 0.1, 0.3, 0.4, 0.6])
+    grid = strat.horizon_payoffs(horizons, dv=0.01)
+    assert grid.shape == (6, len(strat.grid))
+
+    premium = strat._premium[:2]
+    for n, h in enumerate(horizons):
+        front = BSOpt("C", 100, 105, max(0.1 - h, 0), 0.02, 0.31, q=0.01).price(strat.grid)
+        back = BSOpt("C", 100, 100, max(0.4 - h, 0), 0.02, 0.26, q=0.01).price(strat.grid)
+        ref = 10 * (back - premium[1]) - 10 * (front - premium[0])
+        np.testing.assert_allclose(grid[n], ref, atol=1e-9)
+        np.testing.assert_allclose(strat.reprice(dv=0.01, horizon=h), ref, atol=1e-9)
+
+    # once every leg has expired the strategy is worth its payoff at maturity
+    np.testing.assert_allclose(grid[-1], strat.get_payoffs_exp(), atol=1e-9)
+    np.testing.assert_allclose(strat.remaining(horizon=0.2), [0, 0.2])
+
+
+def test_strategy_greeks():
+    strat = BSOptStrat(S=100, r=0.02, q=0.01)
+    strat.call(NP=1, K=95, T=0.5, v=0.3, M=10)
+    strat.put(NP=-2, K=105, T=0.25, v=0.25, M=10)
+    greeks = strat.get_greeks(dv=0.02)
+    assert list(greeks.columns) == ["Delta", "Gamma", "Vega", "Theta", "Rho"]
+
+    for S in greeks.index[[0, 99, 150]]:
+        call = BSOptScalar("C", S, 95, 0.5, 0.02, 0.32, q=0.01)
+        put = BSOptScalar("P", S, 105, 0.25, 0.02, 0.27, q=0.01)
+        for name in greeks.columns:
+            ref = 10 * getattr(call, name)() - 20 * getattr(put, name)()
+            assert greeks.loc[S, name] == pyt.approx(ref, rel=1e-9, abs=1e-9)
+
+    # flat strategy: no legs, no risk
+    assert (BSOptStrat().get_greeks(T=0.1) == 0).all().all()
+
+
+def test_strategy_probabilities():
+    strat = BSOptStrat(S=100, r=0.03)
+    strat.put(NP=+1, K=85, T=0.5, v=0.3)
+    strat.put(NP=-1, K=95, T=0.5, v=0.3)
+    strat.call(NP=-1, K=105, T=0.5, v=0.3)
+    strat.call(NP=+1, K=115, T=0.5, v=0.3)
+    res = strat.probabilities(dv=0.02)
+
+    # quadrature over the terminal lognormal density
+    sigma, T = 0.32, 0.5
+    z = np.linspace(-10, 10, 400_001)
+    ST = 100 * np.exp((0.03 - 0.5 * sigma**2) * T + sigma * np.sqrt(T) * z)
+    density = np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi)
+    payoff = strat.expiry_payoff()(ST)
+    loss = payoff < 0
+    assert res["PoP"] == pyt.approx(np.trapezoid((payoff > 0) * density, z), abs=1e-4)
+    assert res["Expected"] == pyt.approx(np.trapezoid(payoff * density, z), abs=1e-6)
+    shortfall = np.trapezoid(payoff * loss * density, z) / np.trapezoid(loss * density, z)
+    assert res["Shortfall"] == pyt.approx(shortfall, rel=1e-3)
+
+    # vectorized over volatility scenarios and over strategies
+    dv = np.array([-0.1, 0, 0.1])
+    scenarios = strat.probabilities(dv=dv)
+    for n in range(len(dv)):
+        assert scenarios["PoP"][n] == pyt.approx(strat.probabilities(dv=dv[n])["PoP"])
+    long_call = BSOptStrat(S=100, r=0.03)
+    long_call.call(NP=+1, K=100, T=0.25, v=0.2)
+    both = strategy_probabilities([strat, long_call])
+    assert both["PoP"][0] == pyt.approx(strat.probabilities()["PoP"])
+    assert both["Expected"][1] == pyt.approx(long_call.probabilities()["Expected"])
+    # a long call cannot lose more than its (rounded) premium
+    assert -100 * (long_call.instruments.column("Pr")[0] + 0.01) <= both["Shortfall"][1] < 0
+
+    # the volatility is the at-the-money one (or given), not an average of the legs
+    skewed = BSOptStrat(S=100, r=0.03)
+    skewed.put(NP=+1, K=80, T=0.5, v=0.6)
+    skewed.call(NP=+1, K=101, T=0.5, v=0.25)
+    assert skewed.terminal_distribution() == (0.5, 0.25)
+    assert skewed.probabilities(sigma=0.3)["PoP"] == pyt.approx(
+        skewed.probabilities(dv=0.05)["PoP"]
+    )
+    assert strategy_probabilities([skewed, long_call], sigma=[0.3, 0.2])["PoP"][0] == pyt.approx(
+        skewed.probabilities(sigma=0.3)["PoP"]
+    )
+    # a calendar spread has no single payoff at maturity
+    skewed.call(NP=-1, K=101, T=0.25, v=0.25)
+    with pyt.raises(ValueError):
+        skewed.probabilities()
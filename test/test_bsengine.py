@@ -0,0 +1,167 @@
+import numpy as np
+import pytest as pyt
+from models.blackscholes import BSOpt
+from models.bsengine import BSEngine
+
+
+@pyt.fixture(scope="function")
+def engine():
+    return BSEngine()
+
+
+def test_engine_matches_scalar_facade(engine):
+    Sset = np.linspace(40, 160, 150)
+    res = engine.greeks("C", Sset, 100, 0.5, 0.03, 0.25, q=0.01)
+    for n in (0, 37, 75, 149):
+        opt = BSOpt("C", Sset[n], 100, 0.5, 0.03, 0.25, q=0.01)
+        assert res["Price"][n] == pyt.approx(opt.price())
+        assert res["Delta"][n] == pyt.approx(opt.Delta())
+        assert res["Gamma"][n] == pyt.approx(opt.Gamma())
+        assert res["Theta"][n] == pyt.approx(opt.Theta())
+        assert res["Vega"][n] == pyt.approx(opt.Vega())
+
+
+def test_put_call_parity(engine):
+    S = np.linspace(50, 150, 11)
+    T, r, q = 0.75, 0.04, 0.02
+    call = engine.greeks("C", S, 100, T, r, 0.3, q)
+    put = engine.greeks("P", S, 100, T, r, 0.3, q)
+    parity = S * np.exp(-q * T) - 100 * np.exp(-r * T)
+    np.testing.assert_allclose(call["Price"] - put["Price"], parity, atol=1e-10)
+    np.testing.assert_allclose(call["Delta"] - put["Delta"], np.exp(-q * T))
+    np.testing.assert_allclose(call["Gamma"], put["Gamma"])
+    np.testing.assert_allclose(call["Vega"], put["Vega"])
+
+
+def test_expired_options_intrinsic(engine):
+    S = np.array([90.0, 100.0, 110.0])
+    res = engine.greeks(np.array([True, False, True]), S, 100, 0, 0.03, 0.2)
+    np.testing.assert_allclose(res["Price"], [0, 0, 10])
+    np.testing.assert_allclose(res["Delta"], [0, 0, 1])
+    np.testing.assert_allclose(res["Gamma"], 0)
+    np.testing.assert_allclose(res["Theta"], 0)
+
+
+def test_invalid_option_type(engine):
+    with pyt.raises(ValueError):
+        engine.greeks(np.array(["C", "X"]), 100, 100, 1, 0.03, 0.2)
+
+
+def test_bsopt_cache_invalidation():
+    opt = BSOpt("P", 100, 100, 1, 0.03, 0.2)
+    im = opt.intermediates()
+    assert opt.intermediates() is im
+    p0 = opt.price()
+    opt.v = 0.4
+    assert opt.intermediates() is not im
+    assert opt.price() == pyt.approx(BSOpt("P", 100, 100, 1, 0.03, 0.4).price())
+    assert opt.price() > p0
+
+    # a new engine rebuilds the intermediates in its own dtype
+    im = opt.intermediates()
+    opt.engine = BSEngine(dtype=np.float32)
+    assert opt.intermediates() is not im
+    assert opt.intermediates()["d1"].dtype == np.float32
+
+
+@pyt.mark.parametrize("CP", ["C", "P"])
+def test_higher_order_greeks_finite_differences(engine, CP):
+    S, K, T, r, v, q = np.linspace(70, 130, 7), 100.0, 0.6, 0.04, 0.3, 0.015
+    g = engine.all_greeks(CP, S, K, T, r, v, q)
+
+    def bump(key, **kw):
+        args = dict(S=S, K=K, T=T, r=r, v=v, q=q)
+        h = kw.pop("h")
+        name = kw.pop("arg")
+        up = dict(args, **{name: args[name] + h})
+        dn = dict(args, **{name: args[name] - h})
+        return (engine.all_greeks(CP, **up)[key] - engine.all_greeks(CP, **dn)[key]) / (2 * h)
+
+    # calendar time derivatives are minus the derivatives w.r.t. T
+    np.testing.assert_allclose(g["Rho"], bump("Price", arg="r", h=1e-5), rtol=1e-6)
+    np.testing.assert_allclose(g["Vanna"], bump("Delta", arg="v", h=1e-5), rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(g["Volga"], bump("Vega", arg="v", h=1e-5), rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(g["Charm"], -bump("Delta", arg="T", h=1e-5), rtol=1e-5, atol=1e-8)
+    np.testing.assert_allclose(g["Speed"], bump("Gamma", arg="S", h=1e-3), rtol=1e-5, atol=1e-9)
+    np.testing.assert_allclose(g["Zomma"], bump("Gamma", arg="v", h=1e-5), rtol=1e-5, atol=1e-9)
+    np.testing.assert_allclose(g["Color"], -bump("Gamma", arg="T", h=1e-5), rtol=1e-5, atol=1e-9)
+    np.testing.assert_allclose(g["Theta"], -bump("Price", arg="T", h=1e-5), rtol=1e-6)
+
+
+def test_all_greeks_structured(engine):
+    out = engine.all_greeks(["C", "P"], 100, [90, 110], 1, 0.03, 0.2, structured=True)
+    assert out.shape == (2,)
+    assert "Color" in out.dtype.names
+    assert out["Price"][0] == pyt.approx(BSOpt("C", 100, 90, 1, 0.03, 0.2).price())
+    assert out["Rho"][1] == pyt.approx(BSOpt("P", 100, 110, 1, 0.03, 0.2).Rho())
+
+
+def test_numba_kernel_matches_numpy():
+    pyt.importorskip("numba")
+    rng = np.random.default_rng(3)
+    n = 1000
+    args = (
+        rng.random(n) < 0.5,
+        rng.uniform(50, 150, n),
+        100.0,
+        np.where(rng.random(n) < 0.1, 0, rng.uniform(0, 2, n)),
+        0.03,
+        np.where(rng.random(n) < 0.1, 0, rng.uniform(0.05, 0.8, n)),
+        0.01,
+    )
+    ref = BSEngine(kernel="numpy").greeks(*args)
+    res = BSEngine(kernel="numba").greeks(*args)
+    for key in ref:
+        np.testing.assert_allclose(res[key], ref[key], rtol=1e-12, atol=1e-12)
+
+
+def test_unknown_kernel():
+    with pyt.raises(ValueError):
+        BSEngine(kernel="cuda")
+
+
+def test_kernel_falls_back_without_numba(monkeypatch):
+    from models import bskernel
+
+    monkeypatch.setattr(bskernel, "numba", None)
+    engine = BSEngine(kernel="numba")
+    assert not engine.use_kernel
+    assert engine.greeks("C", 100, 100, 1, 0.03, 0.2)["Price"] == pyt.approx(
+        BSOpt("C", 100, 100, 1, 0.03, 0.2).price()
+    )
+
+
+@pyt.mark.parametrize("kernel", ["numpy", "numba"])
+def test_float32_mode(kernel):
+    rng = np.random.default_rng(11)
+    n = 50000
+    args = (
+        rng.random(n) < 0.5,
+        rng.uniform(50, 150, n),
+        100.0,
+        rng.uniform(0.01, 2, n),
+        rng.uniform(0, 0.05, n),
+        rng.uniform(0.05, 0.8, n),
+        rng.uniform(0, 0.03, n),
+    )
+    # documented bounds, relative to the largest value of each greek
+    bounds = {
+        "Price": 1e-6, "Theta": 1e-6, "Vega": 1e-6, "Rho": 1e-6,
+        "Volga": 2e-6,
+        "Delta": 1e-5, "Gamma": 1e-5, "Zomma": 1e-5, "Color": 1e-5,
+        "Vanna": 1e-4, "Charm": 1e-4, "Speed": 1e-4,
+    }
+    for method in ("greeks", "all_greeks"):
+        ref = getattr(BSEngine(kernel=kernel), method)(*args)
+        res = getattr(BSEngine(kernel=kernel, dtype=np.float32), method)(*args)
+        assert all(val.dtype == np.float32 for val in res.values())
+        for key in bounds.keys() & ref.keys():
+            err = np.abs(res[key].astype(float) - ref[key]).max()
+            assert err <= bounds[key] * np.abs(ref[key]).max(), key
+
+
+def test_float32_normal_backends():
+    x = np.linspace(-5, 5, 11, dtype=np.float32)
+    for name in ("math", "scipy", "numpy", "auto"):
+        assert BSEngine(normal=name).N(x).dtype == np.float32
+        assert BSEngine(normal=name).N(x, cum=0).dtype == np.float32
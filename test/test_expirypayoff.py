@@ -0,0 +1,67 @@
+import numpy as np
+import pytest as pyt
+from models.blackscholes_strategy import BSOptStrat
+from models.expirypayoff import ExpiryPayoff
+
+
+def brute_force(CP, K, weights, premium, S):
+    S = np.asarray(S, dtype=float)[..., None]
+    intrinsic = np.where(np.asarray(CP) == "C", np.maximum(S - K, 0), np.maximum(K - S, 0))
+    return ((intrinsic - premium) * weights).sum(axis=-1)
+
+
+@pyt.mark.parametrize(
+    "CP, K, NP",
+    [
+        (["C"], [100], [1]),
+        (["P"], [100], [-1]),
+        (["C", "C"], [95, 105], [1, -1]),
+        (["P", "C"], [95, 105], [-1, -1]),
+        (["C", "C", "C"], [90, 100, 110], [1, -2, 1]),
+        (["P", "P", "C", "C"], [80, 90, 110, 120], [1, -1, -1, 1]),
+        (["C", "P", "P"], [100, 100, 100], [-1, -2, 1]),
+    ],
+)
+def test_matches_brute_force(CP, K, NP):
+    K, weights = np.array(K, float), 100 * np.array(NP, float)
+    premium = np.linspace(2, 6, len(K))
+    payoff = ExpiryPayoff(CP, K, weights, premium)
+
+    S = np.linspace(0, 300, 30001)
+    ref = brute_force(CP, K, weights, premium, S)
+    np.testing.assert_allclose(payoff(S), ref, atol=1e-8)
+
+    # breakevens are exact zeros, and every sign change of the dense grid is one
+    be = payoff.breakevens()
+    np.testing.assert_allclose(brute_force(CP, K, weights, premium, be), 0, atol=1e-8)
+    sign = np.sign(np.where(np.abs(ref) < 1e-8, 0, ref))
+    crossings = np.flatnonzero(sign[:-1] * sign[1:] < 0)
+    for n in crossings:
+        assert np.any((be >= S[n]) & (be <= S[n + 1]))
+
+    # extrema: unbounded iff the payoff keeps growing (or falling) for S -> inf
+    far = brute_force(CP, K, weights, premium, [1e6, 2e6])
+    if far[1] > far[0] + 1e-3:
+        assert payoff.max_profit == np.inf
+    else:
+        assert payoff.max_profit == pyt.approx(ref.max(), abs=1e-8)
+    if far[1] < far[0] - 1e-3:
+        assert payoff.max_loss == -np.inf
+    else:
+        assert payoff.max_loss == pyt.approx(ref.min(), abs=1e-8)
+
+
+def test_from_strategy():
+    strat = BSOptStrat(S=100, r=0.02)
+    strat.call(NP=1, K=95, T=0.25, v=0.3)
+    strat.call(NP=-1, K=105, T=0.25, v=0.3)
+    payoff = strat.expiry_payoff()
+    S = strat.get_payoffs_exp().index.to_numpy()
+    np.testing.assert_allclose(payoff(S), strat.get_payoffs_exp().to_numpy(), atol=1e-9)
+
+    # bull call spread: losses and profits are capped
+    debit = strat._premium[0] - strat._premium[1]
+    assert payoff.max_loss == pyt.approx(-100 * debit)
+    assert payoff.max_profit == pyt.approx(100 * (10 - debit))
+    np.testing.assert_allclose(payoff.breakevens(), [95 + debit])
+    assert payoff(1e9) == pyt.approx(payoff.max_profit)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest as pyt
+from models.blackscholes import BSOpt
+from models.bsengine import BSEngine
+from models.impliedvol import IVSolver
+
+
+@pyt.fixture(scope="function")
+def chain():
+    rng = np.random.default_rng(7)
+    n = 20000
+    return {
+        "CP": rng.choice(["C", "P"], n),
+        "S": 100.0,
+        "K": rng.uniform(40, 200, n),
+        "T": rng.choice([2 / 365, 30 / 365, 0.5, 2.0], n),
+        "r": 0.03,
+        "v": rng.uniform(0.05, 1.2, n),
+        "q": 0.01,
+    }
+
+
+def test_round_trip(chain):
+    c = chain
+    price = BSEngine().greeks(c["CP"], c["S"], c["K"], c["T"], c["r"], c["v"], c["q"])
+    price = price["Price"]
+    res = IVSolver().solve(c["CP"], price, c["S"], c["K"], c["T"], c["r"], c["q"])
+
+    # quotes with a time value worth inverting must all converge
+    fwd = c["S"] * np.exp(-c["q"] * c["T"]) - c["K"] * np.exp(-c["r"] * c["T"])
+    intrinsic = np.where(c["CP"] == "C", fwd, -fwd)
+    meaningful = price - np.maximum(intrinsic, 0) > 1e-4
+    assert res["converged"][meaningful].all()
+    np.testing.assert_allclose(res["v"][meaningful], c["v"][meaningful], atol=1e-6)
+
+    # converged quotes always reprice the input premium
+    ok = res["converged"]
+    repriced = BSEngine().greeks(
+        c["CP"][ok], c["S"], c["K"][ok], c["T"][ok], c["r"], res["v"][ok], c["q"]
+    )
+    np.testing.assert_allclose(repriced["Price"], price[ok], atol=1e-9)
+
+
+def test_flags_instead_of_raising():
+    # below intrinsic, above the upper bound, expired, fine
+    res = IVSolver().solve("C", [5.0, 120.0, 3.0, 15.0], 110, 100, [1, 1, 0, 1], 0.03)
+    assert list(res["converged"]) == [False, False, False, True]
+    assert np.isnan(res["v"][:3]).all()
+
+
+def test_quote_above_vmax_price():
+    # under the S bound but above the price at vmax: the bracket collapses onto vmax
+    solver = IVSolver()
+    assert BSOpt("C", 100, 100, 1, 0.03, solver.vmax).price() < 99.0
+    res = solver.solve("C", [99.0, 10.0], 100, 100, 1, 0.03)
+    assert list(res["converged"]) == [False, True]
+    assert np.isnan(res["v"][0])
+
+
+def test_bsopt_implied_vol():
+    opt = BSOpt("P", 95, 100, 0.25, 0.02, 0.3)
+    premium = opt.price()
+    opt.v = 0.1
+    assert opt.implied_vol(premium) == pyt.approx(0.3, abs=1e-8)
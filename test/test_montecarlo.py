@@ -0,0 +1,106 @@
+import numpy as np
+import pytest as pyt
+from models.blackscholes_strategy import BSOptStrat
+from models.bsengine import BSEngine
+from models.montecarlo import Asian, Barrier, Lookback, MCEngine, Payoff, Vanilla, _bridge_plan
+from models.normdist import get_backend
+
+
+def geometric_asian_call(S, K, T, r, v, n):
+    # discretely monitored geometric average: lognormal in closed form
+    mu = np.log(S) + (r - 0.5 * v**2) * T * (n + 1) / (2 * n)
+    var = v**2 * T * (n + 1) * (2 * n + 1) / (6 * n**2)
+    d1 = (mu - np.log(K) + var) / np.sqrt(var)
+    N = get_backend().cdf
+    return np.exp(-r * T) * (np.exp(mu + 0.5 * var) * N(d1) - K * N(d1 - np.sqrt(var)))
+
+
+@pyt.mark.parametrize(
+    "options",
+    [
+        dict(),
+        dict(antithetic=False, control_variate=False),
+        dict(sampling="sobol"),
+        dict(sampling="sobol", control_variate=False),
+        dict(brownian_bridge=True),
+    ],
+)
+def test_geometric_asian_within_standard_errors(options):
+    engine = MCEngine(paths=2**15, steps=12, seed=7, **options)
+    res = engine.price(Asian("C", 100, average="geometric"), 100, 1, 0.03, 0.25)
+    ref = geometric_asian_call(100, 100, 1, 0.03, 0.25, 12)
+    assert 0 < res["StdErr"] < 0.1
+    assert abs(res["Price"] - ref) < 4 * res["StdErr"] + 1e-3
+
+
+def test_variance_reduction():
+    payoff = Asian("C", 100)
+    plain = MCEngine(paths=2**14, steps=24, antithetic=False, control_variate=False).price(payoff, 100, 1, 0.03, 0.25)
+    reduced = MCEngine(paths=2**14, steps=24).price(payoff, 100, 1, 0.03, 0.25)
+    sobol = MCEngine(paths=2**14, steps=24, sampling="sobol").price(payoff, 100, 1, 0.03, 0.25)
+    assert reduced["StdErr"] < plain["StdErr"] / 1.5
+    assert sobol["StdErr"] < reduced["StdErr"]
+
+
+def test_reproducible_and_grid_consistent():
+    engine = MCEngine(paths=10_000, steps=16, seed=3, chunksize=1000)
+    payoff = Barrier("P", 100, 80, "down-and-out")
+    spots = np.array([90.0, 100.0, 110.0])
+    res = engine.price(payoff, spots, 0.5, 0.02, 0.3)
+    assert res["Price"].shape == (3,)
+    np.testing.assert_array_equal(res["Price"], engine.price(payoff, spots, 0.5, 0.02, 0.3)["Price"])
+    # every spot of a grid is priced on the same paths as alone
+    assert res["Price"][1] == pyt.approx(engine.price(payoff, 100, 0.5, 0.02, 0.3)["Price"])
+    assert MCEngine(paths=10_000, steps=16, seed=4).price(payoff, 100, 0.5, 0.02, 0.3)["Price"] != res["Price"][1]
+
+
+def test_payoff_identities():
+    engine = MCEngine(paths=2**14, steps=50, seed=1)
+    args = (100, 1, 0.03, 0.25)
+    vanilla = BSEngine().greeks("C", 100, 110, 1, 0.03, 0.25)["Price"]
+    # knock-in + knock-out = vanilla, path by path
+    out = engine.price(Barrier("C", 110, 130, "up-and-out"), *args)["Price"]
+    knock_in = engine.price(Barrier("C", 110, 130, "up-and-in"), *args)["Price"]
+    assert out + knock_in == pyt.approx(vanilla, abs=0.05)
+    # lookbacks are worth more than the vanilla options
+    assert engine.price(Lookback("C", 110), *args)["Price"] > vanilla
+    assert engine.price(Lookback("C"), *args)["Price"] > BSEngine().greeks("C", 100, 100, 1, 0.03, 0.25)["Price"]
+
+
+def test_payoff_interface():
+    class NoPayoff(Payoff):
+        stats = ("max",)
+
+    with pyt.raises(TypeError):
+        NoPayoff("C", 100)
+    with pyt.raises(TypeError):
+        Payoff("C", 100)
+    for payoff in (Vanilla("C", 100), Asian("P", 100), Barrier("C", 100, 120, "up-and-out"), Lookback("P")):
+        assert isinstance(payoff, Payoff)
+
+
+def test_brownian_bridge():
+    # every date is constructed exactly once, and the increments are iid N(0, 1)
+    plan = _bridge_plan(37)
+    assert sorted(p[0] for p in plan) == list(range(1, 38))
+    engine = MCEngine(steps=37, brownian_bridge=True)
+    z = np.random.default_rng(0).standard_normal((37, 200_000))
+    increments = np.diff(engine.brownian(z), axis=0, prepend=0)
+    np.testing.assert_allclose(increments.std(axis=1), 1, atol=1e-2)
+    assert abs(np.corrcoef(increments[3], increments[20])[0, 1]) < 1e-2
+
+
+def test_strategy_exotic_payoff():
+    strat = BSOptStrat(S=100, r=0.03)
+    strat.call(NP=+1, K=100, T=0.5, v=0.3)
+    # the vanilla payoff is exact with its own control variate
+    res = strat.exotic_payoff(Vanilla("C", 100), T=0.5, v=0.3, engine=MCEngine(paths=4096, steps=8))
+    np.testing.assert_allclose(res["Payoff"].values, strat.payoffs.values, atol=1e-8)
+    asian = strat.exotic_payoff(Asian("C", 100), T=0.5, v=0.3, NP=-1)
+    assert asian["Payoff"].loc[100] == pyt.approx(0, abs=1e-9)
+    assert np.all(np.diff(asian["Payoff"].values) <= 1e-9)
+
+    with pyt.raises(ValueError):
+        MCEngine(sampling="halton")
+    with pyt.raises(ValueError):
+        Barrier("C", 100, 120, "sideways")
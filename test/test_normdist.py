@@ -0,0 +1,68 @@
+import numpy as np
+import pytest as pyt
+from scipy import special
+from models import normdist
+from models.bsengine import BSEngine
+
+
+BACKENDS = ["math", "scipy", "numpy", "auto"]
+
+
+@pyt.fixture(scope="function")
+def grid():
+    # dense core plus both tails
+    return np.concatenate(
+        [np.linspace(-37, -8, 59), np.linspace(-8, 8, 321), np.linspace(8, 37, 59)]
+    )
+
+
+@pyt.mark.parametrize("name", BACKENDS)
+def test_cdf_matches_scipy(name, grid):
+    backend = normdist.get_backend(name)
+    # relative accuracy on the left tail, absolute on the right one
+    np.testing.assert_allclose(backend.cdf(grid), special.ndtr(grid), rtol=1e-12)
+    np.testing.assert_allclose(backend.cdf(grid), special.ndtr(grid), rtol=0, atol=5e-16)
+
+
+@pyt.mark.parametrize("name", BACKENDS)
+def test_pdf_matches_scipy(name, grid):
+    backend = normdist.get_backend(name)
+    expected = np.exp(-0.5 * grid**2) / np.sqrt(2 * np.pi)
+    np.testing.assert_allclose(backend.pdf(grid), expected, rtol=1e-14)
+
+
+@pyt.mark.parametrize("name", BACKENDS)
+def test_logcdf_far_tail(name):
+    # log N(x) for x > 0 is ~ -N(-x): this checks the right tail in relative terms
+    x = np.array([-1000.0, -200.0, -45.0, -38.0, -20.0, -3.0, 0.0, 3.0, 8.0, 20.0, 30.0])
+    backend = normdist.get_backend(name)
+    np.testing.assert_allclose(backend.logcdf(x), special.log_ndtr(x), rtol=1e-12)
+
+
+@pyt.mark.parametrize("name", BACKENDS)
+def test_scalar_in_scalar_out(name):
+    backend = normdist.get_backend(name)
+    assert np.ndim(backend.cdf(0.3)) == 0
+    assert backend.cdf(0.0) == pyt.approx(0.5)
+
+
+def test_global_and_per_engine_selection():
+    previous = normdist.set_backend("numpy")
+    try:
+        assert normdist.get_backend() is normdist.NumpyNormal
+        assert BSEngine(normal="math").N(1.0) == pyt.approx(special.ndtr(1.0))
+    finally:
+        normdist.set_backend(previous)
+    with pyt.raises(ValueError):
+        normdist.set_backend("fortran")
+    with pyt.raises(ValueError):
+        BSEngine(normal="fortran")
+
+
+@pyt.mark.parametrize("name", BACKENDS)
+def test_engine_prices_agree_across_backends(name):
+    S = np.linspace(40, 160, 25)
+    ref = BSEngine(normal="scipy").greeks("P", S, 100, 0.3, 0.02, 0.35, 0.01)
+    res = BSEngine(normal=name).greeks("P", S, 100, 0.3, 0.02, 0.35, 0.01)
+    for key in ref:
+        np.testing.assert_allclose(res[key], ref[key], rtol=1e-11, atol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest as pyt
+from models.optionbook import OptionBook
+
+
+@pyt.fixture(scope="function")
+def book():
+    book = OptionBook(capacity=2)
+    book.append("C", 1, 100, 0.25, 0.3, 100, 5.0)
+    book.extend(["P", "P", "C"], [-1, 2, -2], [90, 95, 110], 0.25, [0.3, 0.25, 0.2], 100, [1.5, 2.5, 1.0])
+    return book
+
+
+def test_rows_and_growth(book):
+    assert len(book) == 4
+    leg = book[1]
+    assert (leg.CP, leg.NP, leg.K, leg.Pr) == ("P", -1, 90, 1.5)
+    assert book[-1].as_dict() == {"CP": "C", "NP": -2, "K": 110, "T": 0.25, "v": 0.2, "M": 100, "Pr": 1.0}
+    with pyt.raises(AttributeError):
+        leg.extra = 1
+
+
+def test_cost_and_nlv(book):
+    np.testing.assert_allclose(book.nlv(), [500, -150, 500, -200])
+    assert book.cost() == pyt.approx(650)
+    assert book.cost(by="CP") == pyt.approx({False: 350, True: 300})
+
+
+def test_select_and_groupby(book):
+    puts = book.select(~book.iscall)
+    assert len(puts) == 2
+    np.testing.assert_allclose(puts.column("K"), [90, 95])
+    groups = book.groupby("CP")
+    assert len(groups[True]) == 2
+    assert groups[True].cost() == pyt.approx(300)
+
+
+def test_invalid_option_type(book):
+    with pyt.raises(ValueError):
+        book.append("X", 1, 100, 0.25, 0.3, 100, 5.0)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest as pyt
+from models.bsengine import BSEngine
+from models.parallel import ParallelPricer
+
+
+@pyt.fixture(scope="module")
+def book():
+    rng = np.random.default_rng(9)
+    n = 10001
+    return (
+        rng.choice(["C", "P"], n),
+        rng.uniform(50, 150, n),
+        rng.uniform(50, 150, n),
+        rng.uniform(0, 2, n),
+        0.03,
+        rng.uniform(0.05, 0.8, n),
+        0.01,
+    )
+
+
+@pyt.mark.parametrize("higher_order", [False, True])
+def test_sharded_results_in_order(book, higher_order):
+    engine = BSEngine()
+    ref = engine.all_greeks(*book) if higher_order else engine.greeks(*book)
+    with ParallelPricer(workers=2, shardsize=1500, higher_order=higher_order) as pricer:
+        res = pricer.greeks(*book)
+        # the pool is reused by later calls
+        again = pricer.greeks(*book)
+    assert list(res) == list(ref)
+    for key in ref:
+        np.testing.assert_array_equal(res[key], ref[key])
+        np.testing.assert_array_equal(again[key], ref[key])
+
+
+def test_small_books_priced_in_process(book):
+    pricer = ParallelPricer(workers=4, shardsize=10**6)
+    res = pricer.greeks(*book)
+    assert pricer.pool is None
+    np.testing.assert_array_equal(res["Price"], BSEngine().greeks(*book)["Price"])
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest as pyt
+from models import pdeengine
+from models.adaptivegrid import adaptive_grid
+from models.blackscholes_strategy import BSOptStrat
+from models.bsengine import BSEngine
+from models.pdeengine import PDEEngine
+
+
+@pyt.fixture(scope="module")
+def grid():
+    return adaptive_grid(60, 140, 150, nodes=[100])
+
+
+def test_european_matches_bsm(grid):
+    res = PDEEngine(american=False).solve(["C", "P"], 100, 1, 0.05, 0.3, 0.01, grid=grid)
+    ref = BSEngine().greeks(
+        np.array(["C", "P"])[:, None], grid, np.full((2, 1), 100.0), 1, 0.05, 0.3, 0.01
+    )
+    assert res["Price"].shape == (2, len(grid))
+    np.testing.assert_allclose(res["Price"], ref["Price"], atol=5e-3)
+    np.testing.assert_allclose(res["Delta"], ref["Delta"], atol=5e-4)
+    np.testing.assert_allclose(res["Gamma"], ref["Gamma"], atol=5e-5)
+    np.testing.assert_allclose(res["Theta"], ref["Theta"], atol=2e-2)
+
+
+@pyt.mark.parametrize("exercise", PDEEngine.exercises)
+def test_american_put_reference(exercise):
+    grid = np.linspace(30, 50, 81)
+    res = PDEEngine(steps=400, exercise=exercise).solve("P", 40, 1, 0.06, 0.2, grid=grid)
+    assert res["Price"][grid == 36][0] == pyt.approx(4.4867, abs=2e-3)
+    assert np.all(res["Price"] >= np.maximum(40 - grid, 0) - 1e-12)
+
+
+def test_exercise_methods_agree(grid):
+    penalty = PDEEngine(exercise="penalty").solve(["P", "C"], [90, 110], 0.5, 0.04, 0.3, 0.03, grid=grid)
+    psor = PDEEngine(exercise="psor").solve(["P", "C"], [90, 110], 0.5, 0.04, 0.3, 0.03, grid=grid)
+    np.testing.assert_allclose(penalty["Price"], psor["Price"], atol=1e-5)
+
+
+def test_thomas_matches_banded_solver():
+    rng = np.random.default_rng(0)
+    n = 50
+    ab = rng.uniform(-1, 1, (3, n))
+    ab[1] = 4 + rng.random(n)
+    ab[0, 0] = ab[2, -1] = 0
+    rhs = rng.random(n)
+    A = np.diag(ab[1]) + np.diag(ab[0, 1:], 1) + np.diag(ab[2, :-1], -1)
+    np.testing.assert_allclose(pdeengine._thomas(ab, rhs), np.linalg.solve(A, rhs))
+
+
+def test_strategy_pde_payoffs():
+    strat = BSOptStrat(S=100, r=0.03)
+    strat.put(NP=+1, K=95, T=0.5, v=0.3)
+    strat.call(NP=-1, K=110, T=0.25, v=0.25)
+    european = strat.pde_payoffs(PDEEngine(american=False))
+    np.testing.assert_allclose(european.values, strat.payoffs.values, atol=0.1)
+    # early exercise premium of the long put
+    assert np.all(strat.pde_payoffs().values >= european.values - 1e-6)
+
+    with pyt.raises(ValueError):
+        PDEEngine().solve("C", 100, 1, 0.05, 0.3, grid=[0, 50, 100])
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest as pyt
+from models.blackscholes_strategy import BSOptStrat
+from models.expirypayoff import ExpiryPayoff, breakpoints, lognormal_stats
+from models.screener import FAMILIES, StrategyScreener
+
+
+def make_chain():
+    K = np.arange(80, 121, 5.0)
+    rows = [
+        {"CP": cp, "K": k, "T": t, "v": 0.25 + 0.5 * ((k - 100) / 100) ** 2}
+        for t in (0.25, 0.5)
+        for cp in "CP"
+        for k in K
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_breakpoints_match_expiry_payoff():
+    CP = np.array([False, False, True, True])
+    K = np.array([110.0, 90.0, 120.0, 100.0])
+    weights = np.array([1.0, -1.0, 1.0, -1.0]) * 100
+    premium = np.array([11.0, 2.0, 1.5, 4.0])
+    x, y, slopes = breakpoints(CP, K, weights, premium)
+    ref = ExpiryPayoff(CP, K, weights, premium)
+    np.testing.assert_allclose(x, ref.x)
+    np.testing.assert_allclose(y, ref.y)
+    np.testing.assert_allclose(slopes, ref.slopes)
+
+
+def test_lognormal_stats_brute_force():
+    CP = np.array([False, False, True, True])
+    K = np.array([80.0, 90.0, 110.0, 120.0])
+    weights = np.array([1.0, -1.0, -1.0, 1.0]) * 100
+    premium = np.array([0.5, 1.5, 2.0, 0.6])
+    S, T, sigma, mu = 100.0, 0.5, 0.3, 0.05
+    stats = lognormal_stats(*breakpoints(CP, K, weights, premium), S, T, sigma, mu)
+
+    # quadrature over the terminal lognormal density
+    z = np.linspace(-10, 10, 400_001)
+    ST = S * np.exp((mu - 0.5 * sigma**2) * T + sigma * np.sqrt(T) * z)
+    density = np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi)
+    payoff = ExpiryPayoff(CP, K, weights, premium)(ST)
+    assert stats["Expected"] == pyt.approx(np.trapezoid(payoff * density, z), abs=1e-6)
+    assert stats["PoP"] == pyt.approx(np.trapezoid((payoff > 0) * density, z), abs=1e-4)
+
+
+@pyt.mark.parametrize("family", list(FAMILIES))
+def test_scores_match_strategy(family):
+    screener = StrategyScreener(make_chain(), S=100, r=0.03)
+    idx = next(screener.candidates(family))[:5]
+    _, NP = FAMILIES[family]
+    res = screener.score(idx, NP)
+
+    for n, row in enumerate(idx):
+        strat = BSOptStrat(S=100, r=0.03)
+        for leg, pos in zip(row, NP):
+            add = strat.call if screener.iscall[leg] else strat.put
+            add(NP=pos, K=screener.K[leg], T=screener.T[leg], v=screener.v[leg])
+        # describe_strat rounds premia to the cent
+        tol = 0.005 * 100 * np.abs(NP).sum()
+        assert res["Cost"][n] == pyt.approx(strat.describe_strat()["Cost"], abs=tol)
+
+        payoff = strat.expiry_payoff()
+        assert res["MaxProfit"][n] == pyt.approx(payoff.max_profit, abs=1e-6)
+        assert res["MaxLoss"][n] == pyt.approx(payoff.max_loss, abs=1e-6)
+        be = payoff.breakevens()
+        if be.size:
+            assert res["BreakevenLow"][n] == pyt.approx(be.min())
+            assert res["BreakevenHigh"][n] == pyt.approx(be.max())
+        else:
+            assert np.isnan(res["BreakevenLow"][n])
+
+
+def test_enumeration_counts():
+    screener = StrategyScreener(make_chain(), S=100, r=0.03)
+    count = {f: sum(len(c) for c in screener.candidates(f)) for f in FAMILIES}
+    # 9 strikes and 2 expiries
+    assert count["bull call"] == 2 * 36
+    assert count["long strangle"] == 2 * 36
+    # symmetric wings around each inner strike
+    assert count["long butterfly"] == 2 * sum(min(i, 8 - i) for i in range(9))
+    # put pair (p1 < p2) below call pair (c1 < c2): choose 4 of 9 strikes
+    assert count["short iron condor"] == 2 * 126
+
+
+def test_chunking_invariance():
+    chain = make_chain()
+    full = StrategyScreener(chain, S=100, r=0.03).screen(top=15, by="PoP")
+    small = StrategyScreener(chain, S=100, r=0.03, chunksize=7).screen(top=15, by="PoP")
+    np.testing.assert_allclose(full["PoP"], small["PoP"])
+    assert len(full) == 15
+    assert np.all(np.diff(full["PoP"]) <= 0)
+
+
+def test_chain_from_prices():
+    chain = make_chain()
+    screener = StrategyScreener(chain, S=100, r=0.03)
+    quotes = screener.table()[["CP", "K", "T", "Price"]].rename(columns={"Price": "price"})
+    from_prices = StrategyScreener(quotes, S=100, r=0.03)
+    np.testing.assert_allclose(from_prices.v, screener.v, atol=1e-8)
+
+    with pyt.raises(ValueError):
+        StrategyScreener(chain.drop(columns="v"), S=100, r=0.03)
+    with pyt.raises(ValueError):
+        next(screener.candidates("jade lizard"))
@@ -0,0 +1,73 @@
+import json
+import numpy as np
+import pytest as pyt
+from models import strategytemplates
+from models.blackscholes_strategy import BSOptStrat
+from models.strategytemplates import (
+    StrategyTemplate,
+    get_template,
+    load_templates,
+    register_template,
+    template_names,
+)
+
+
+@pyt.fixture(scope="function")
+def registry(monkeypatch):
+    # keep the registrations of a test out of the global registry
+    monkeypatch.setattr(strategytemplates, "TEMPLATES", dict(strategytemplates.TEMPLATES))
+    return strategytemplates.TEMPLATES
+
+
+def test_builtin_templates():
+    names = template_names()
+    assert names[:4] == ("Long Call", "Short Call", "Long Put", "Short Put")
+    assert "Top Iron Condor" in names and "Call Calendar" in names
+
+    strat = get_template("Top Butterfly").build(BSOptStrat(S=200), T=0.5, width=0.05)
+    legs = strat.describe_strat()
+    assert [legs["Option_{}".format(n)]["K"] for n in (1, 2, 3)] == pyt.approx([180, 220, 200])
+    assert [legs["Option_{}".format(n)]["NP"] for n in (1, 2, 3)] == [1, 1, -2]
+    assert all(legs["Option_{}".format(n)]["T"] == 0.5 for n in (1, 2, 3))
+
+    calendar = get_template("Call Calendar").build(BSOptStrat(S=100), T=0.25)
+    assert calendar.instruments.column("T").tolist() == [0.25, 0.5]
+    assert calendar.describe_strat()["Cost"] > 0
+
+
+def test_batch_instances_match_strategies():
+    template = get_template("Top Iron Condor")
+    S = np.array([[80.0], [100.0], [120.0]])
+    width = np.array([0.03, 0.05, 0.1, 0.2])
+    legs = template.compile(S, 0.3, width)
+    assert legs["K"].shape == (3, 4, 4)
+
+    res = template.evaluate(S, 0.3, r=0.02, width=width)
+    assert res["Cost"].shape == (3, 4)
+    for i, j in [(0, 0), (1, 2), (2, 3)]:
+        strat = template.build(BSOptStrat(S=S[i, 0], r=0.02), T=0.3, width=width[j])
+        # describe_strat rounds the premia to cents
+        assert res["Cost"][i, j] == pyt.approx(strat.describe_strat()["Cost"], abs=4 * 0.5)
+        assert res["Delta"][i, j] == pyt.approx(strat.get_greeks().loc[S[i, 0], "Delta"])
+
+
+def test_register_and_load(registry, tmp_path):
+    register_template("Risk Reversal", [("C", 1, 1, 0.2), ("P", -1, -1, 0.3)], "Long call, short put")
+    assert template_names()[-1] == "Risk Reversal"
+    with pyt.raises(ValueError):
+        register_template("Risk Reversal", [("C", 1, 0, 0.2)])
+    with pyt.raises(ValueError):
+        get_template("Unknown")
+    with pyt.raises(ValueError):
+        StrategyTemplate("Bad", [("X", 1, 0, 0.2)])
+
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps([
+        {"name": "Double Diagonal", "legs": [
+            ["P", -1, -1, 0.25], ["P", 1, -2, 0.25, 0.25],
+            ["C", -1, 1, 0.25], ["C", 1, 2, 0.25, 0.25]],
+         "description": "Two diagonals"},
+    ]))
+    (template,) = load_templates(path)
+    assert get_template("Double Diagonal") is template
+    assert template.dT.tolist() == [0, 0.25, 0, 0.25]
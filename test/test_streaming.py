@@ -0,0 +1,60 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest as pyt
+from models.bsengine import BSEngine
+from models.streaming import stream_greeks
+
+
+@pyt.fixture(scope="function")
+def universe():
+    rng = np.random.default_rng(5)
+    n = 1000
+    return pd.DataFrame(
+        {
+            "CP": rng.choice(["C", "P"], n),
+            "S": rng.uniform(50, 150, n),
+            "K": rng.uniform(50, 150, n),
+            "T": rng.uniform(0, 2, n),
+            "r": 0.03,
+            "v": rng.uniform(0.05, 0.8, n),
+            "q": 0.01,
+        }
+    )
+
+
+def test_stream_from_file_reader(universe):
+    eager = BSEngine().greeks(*[universe[c].to_numpy() for c in ("CP", "S", "K", "T", "r", "v", "q")])
+    reader = pd.read_csv(io.StringIO(universe.to_csv(index=False)), chunksize=300)
+    out = list(stream_greeks(reader, chunksize=128))
+    # 300-row chunks are split in 128 + 128 + 44
+    assert [len(o) for o in out[:3]] == [128, 128, 44]
+    res = pd.concat(out)
+    assert list(res.index) == list(range(len(universe)))
+    for key, val in eager.items():
+        np.testing.assert_allclose(res[key].to_numpy(), val, rtol=1e-10, atol=1e-12)
+
+
+def test_stream_from_generator(universe):
+    def producer():
+        for start in range(0, len(universe), 250):
+            part = universe.iloc[start : start + 250]
+            # dict chunks, scalar r and no q column
+            yield {"CP": part["CP"].to_numpy(), "S": part["S"].to_numpy(), "K": part["K"].to_numpy(),
+                   "T": part["T"].to_numpy(), "r": 0.03, "v": part["v"].to_numpy()}
+
+    out = list(stream_greeks(producer(), higher_order=True))
+    assert len(out) == 4
+    assert "Vanna" in out[0]
+    first = universe.iloc[:250]
+    ref = BSEngine().all_greeks(first["CP"], first["S"], first["K"], first["T"], 0.03, first["v"])
+    np.testing.assert_allclose(out[0]["Vanna"], ref["Vanna"])
+
+
+def test_stream_scalar_spot(universe):
+    chunk = {"CP": universe["CP"].to_numpy(), "S": 100.0, "K": universe["K"].to_numpy(),
+             "T": universe["T"].to_numpy(), "r": 0.03, "v": universe["v"].to_numpy()}
+    out = list(stream_greeks([chunk], chunksize=400))
+    assert [len(o["Price"]) for o in out] == [400, 400, 200]
+    ref = BSEngine().greeks(chunk["CP"], 100.0, chunk["K"], chunk["T"], 0.03, chunk["v"])
+    np.testing.assert_allclose(np.concatenate([o["Price"] for o in out]), ref["Price"])
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest as pyt
+from models.bsengine import BSEngine
+from models.treeengine import TreeEngine, TreeOpt
+
+
+@pyt.mark.parametrize("method", TreeEngine.methods)
+def test_european_tree_matches_bsm(method):
+    S = np.array([80.0, 100.0, 120.0])
+    tree = TreeEngine(method, 400, american=False).greeks("P", S, 100, 0.75, 0.04, 0.3, 0.01)
+    ref = BSEngine().greeks("P", S, 100, 0.75, 0.04, 0.3, 0.01)
+    np.testing.assert_allclose(tree["Price"], ref["Price"], atol=5e-3)
+    np.testing.assert_allclose(tree["Delta"], ref["Delta"], atol=1e-3)
+    np.testing.assert_allclose(tree["Gamma"], ref["Gamma"], atol=1e-4)
+    np.testing.assert_allclose(tree["Theta"], ref["Theta"], rtol=2e-2)
+    np.testing.assert_allclose(tree["Vega"], ref["Vega"], rtol=1e-2)
+
+
+@pyt.mark.parametrize("method", TreeEngine.methods)
+@pyt.mark.parametrize("richardson", [False, True])
+def test_american_put_reference(method, richardson):
+    # finite-difference reference value of the American put S=36, K=40, T=1, r=6%, v=20%
+    price = TreeEngine(method, 400, richardson=richardson).price("P", 36, 40, 1, 0.06, 0.2)
+    assert price == pyt.approx(4.4867, abs=2e-3)
+
+
+def test_early_exercise_bounds():
+    S = np.linspace(60, 140, 9)
+    american = TreeEngine(steps=100).price("P", S, 100, 1, 0.08, 0.25)
+    european = BSEngine().greeks("P", S, 100, 1, 0.08, 0.25)["Price"]
+    assert np.all(american >= european - 1e-9)
+    assert np.all(american >= 100 - S - 1e-9)
+    # no early exercise of calls without dividends
+    call = TreeEngine(steps=400).price("C", S, 100, 1, 0.08, 0.25)
+    ref = BSEngine().greeks("C", S, 100, 1, 0.08, 0.25)["Price"]
+    np.testing.assert_allclose(call, ref, atol=5e-3)
+
+
+def test_vectorized_contracts():
+    rng = np.random.default_rng(1)
+    CP = np.where(rng.random((4, 5)) < 0.5, "C", "P")
+    K = rng.uniform(80, 120, (4, 5))
+    T = rng.uniform(0.1, 2, (4, 5))
+    T[0, 0] = 0
+    engine = TreeEngine(steps=60)
+    res = engine.greeks(CP, 100, K, T, 0.03, 0.3, 0.02)
+    assert res["Price"].shape == (4, 5)
+    # chunking and batching do not change the values
+    small = TreeEngine(steps=60, chunksize=3).greeks(CP, 100, K, T, 0.03, 0.3, 0.02)
+    for key in res:
+        np.testing.assert_allclose(res[key], small[key])
+    assert res["Price"][1, 2] == pyt.approx(engine.price(CP[1, 2], 100, K[1, 2], T[1, 2], 0.03, 0.3, 0.02))
+    # expired contracts are worth their intrinsic value
+    assert res["Price"][0, 0] == pyt.approx(max((1 if CP[0, 0] == "C" else -1) * (100 - K[0, 0]), 0))
+
+
+def test_tree_option_interface():
+    opt = TreeOpt("P", 36, 40, 1, 0.06, 0.2, tree=TreeEngine(steps=300))
+    assert opt.price() == pyt.approx(4.4867, abs=2e-3)
+    assert -1 < opt.Delta() < 0
+    assert opt.Gamma() > 0
+    assert opt.Vega() > 0
+    assert opt.Rho() < 0
+    assert set(opt.greeks()) == {"Lambda", "Delta", "Gamma", "Theta", "Vega"}
+
+    # the tree is rolled back once, then again only after an input changes
+    evaluated = opt._evaluate()
+    assert opt._evaluate() is evaluated
+    for name, value in [("S", 40), ("CP", "C"), ("tree", TreeEngine(steps=100))]:
+        setattr(opt, name, value)
+        assert opt._evaluate() is not evaluated
+        evaluated = opt._evaluate()
+    assert opt.price() == pyt.approx(TreeEngine(steps=100).price("C", 40, 40, 1, 0.06, 0.2))
+
+    with pyt.raises(ValueError):
+        TreeEngine("finite differences")
+    with pyt.raises(ValueError):
+        TreeEngine(steps=6, richardson=True)
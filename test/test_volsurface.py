@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest as pyt
+from models.blackscholes import BSOpt
+from models.blackscholes_strategy import BSOptStrat
+from models.bsengine import BSEngine
+from models.volsurface import VolSurface, ssvi_slices, svi_variance
+
+S, r, q = 100, 0.03, 0.01
+EXPIRIES = np.array([0.1, 0.25, 0.5, 1.0, 2.0])
+THETA = np.array([0.004, 0.011, 0.022, 0.045, 0.09])
+
+
+def make_chain(params=None, expiries=EXPIRIES, scale=1.0):
+    params = ssvi_slices(THETA, -0.6, 1.2, 0.4) if params is None else params
+    K = np.linspace(60, 150, 31)
+    rows = []
+    for t, p in zip(expiries, params):
+        k = np.log(K / (S * np.exp((r - q) * t)))
+        v = scale * np.sqrt(svi_variance(k, *p) / t)
+        rows += [{"CP": "C" if x >= S else "P", "K": x, "T": t, "v": y} for x, y in zip(K, v)]
+    return pd.DataFrame(rows)
+
+
+@pyt.mark.parametrize("model", VolSurface.models)
+def test_recovers_ssvi_surface(model):
+    chain = make_chain()
+    surface = VolSurface(chain, S, r, q, model=model)
+    np.testing.assert_allclose(surface.vol(chain["K"], chain["T"]), chain["v"], atol=1e-6)
+    assert surface.calendar_arbitrage() == 0
+    assert list(surface.slices().columns) == ["a", "b", "rho", "m", "sigma"]
+
+
+def test_fit_from_prices():
+    chain = make_chain()
+    prices = chain.assign(
+        price=BSEngine().greeks(chain["CP"], S, chain["K"], chain["T"], r, chain["v"], q)["Price"]
+    ).drop(columns="v")
+    surface = VolSurface(prices, S, r, q)
+    np.testing.assert_allclose(surface.vol(chain["K"], chain["T"]), chain["v"], atol=1e-3)
+
+    with pyt.raises(ValueError):
+        VolSurface(chain.drop(columns="v"), S, r, q)
+    with pyt.raises(ValueError):
+        VolSurface(chain, S, r, q, model="sabr")
+    with pyt.raises(ValueError):
+        VolSurface(chain.groupby("T").head(4), S, r, q)
+    for model in VolSurface.models:
+        with pyt.raises(ValueError, match="no valid quote"):
+            VolSurface(chain.iloc[:0], S, r, q, model=model)
+
+
+def test_warm_refit():
+    surface = VolSurface(make_chain(), S, r, q)
+    previous = surface._x.copy()
+    bumped = make_chain(scale=1.02)
+    surface.fit(bumped)
+    cold = VolSurface(bumped, S, r, q)
+    assert not np.allclose(surface._x, previous)
+    np.testing.assert_allclose(surface.vol(bumped["K"], bumped["T"]), bumped["v"], atol=1e-5)
+    np.testing.assert_allclose(
+        surface.vol(bumped["K"], bumped["T"]), cold.vol(bumped["K"], bumped["T"]), atol=1e-5
+    )
+
+
+def test_interpolation():
+    surface = VolSurface(make_chain(), S, r, q)
+    k = np.linspace(-0.3, 0.3, 7)
+    # on the expiries: the slices, between them linear in total variance
+    W = svi_variance(k[:, None], *surface.params.T)
+    np.testing.assert_allclose(surface.total_variance(k[:, None], EXPIRIES), W, atol=1e-12)
+    mid = surface.total_variance(k, 0.75)
+    np.testing.assert_allclose(mid, 0.5 * (W[:, 2] + W[:, 3]), atol=1e-12)
+    # constant volatility outside the expiries
+    np.testing.assert_allclose(surface.total_variance(k, 4.0), 2 * W[:, -1])
+    np.testing.assert_allclose(surface.total_variance(k, 0.05), 0.5 * W[:, 0])
+    # vectorized (K, T) queries
+    K, T = np.meshgrid([80, 100, 120], [0.05, 0.3, 3.0])
+    assert surface.vol(K, T).shape == (3, 3)
+
+
+def test_calendar_arbitrage():
+    # a steep short smile above a flat longer expiry: the raw slices cross
+    steep = [(0.01, 0.1, 0.0, 0.0, 0.1)] * 3
+    flat = [(0.012, 0.01, 0.0, 0.0, 0.1)] * 2
+    chain = make_chain(np.array(steep + flat), expiries=[0.1, 0.2, 0.3, 0.4, 0.5])
+    free = VolSurface(chain, S, r, q, calendar=0)
+    penalized = VolSurface(chain, S, r, q)
+    assert penalized.calendar_arbitrage() < free.calendar_arbitrage()
+    # queries never decrease in T at constant moneyness
+    k = np.linspace(-0.4, 0.4, 41)[:, None]
+    T = np.linspace(0.01, 0.6, 60)
+    for surface in (free, penalized):
+        assert np.all(np.diff(surface.total_variance(k, T), axis=1) >= -1e-12)
+
+
+def test_strategy_and_option_lookups():
+    surface = VolSurface(make_chain(), S, r, q)
+    strat = BSOptStrat(S=S, r=r, q=q, surface=surface)
+    strat.add_legs(["P", "C"], [+1, -1], [95, 110], [0.25, 0.5], None)
+    v = strat.instruments.column("v")
+    np.testing.assert_allclose(v, surface.vol([95, 110], [0.25, 0.5]))
+    with pyt.raises(ValueError):
+        BSOptStrat(S=S, r=r, q=q).call(v=None)
+
+    opt = BSOpt.from_surface("C", S, 110, 0.5, surface)
+    assert opt.v == pyt.approx(v[1])
+    res = surface.greeks("C", [110, 120], 0.5)
+    assert res["Price"][0] == pyt.approx(opt.price())